@@ -1,12 +1,12 @@
 import asyncio
 import json
 import re
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy import select, text
 
 from services.api_service.app.db.models import CarMake
 from services.api_service.app.core.config import settings
+from services.api_service.app.core.db_pool import create_pooled_engine
 
 # Database connection details (using settings from config.py)
 DB_USER = settings.POSTGRES_USER
@@ -17,8 +17,9 @@ DB_PORT = settings.POSTGRES_PORT
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_async_engine(DATABASE_URL, echo=False)
-AsyncSessionFactory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# Same pool settings (DB_POOL_*, DB_PREPARED_STATEMENTS) as the services; one session needs one connection
+engine = create_pooled_engine(DATABASE_URL, settings, "populate_car_makes", pool_size=1, max_overflow=0)
+AsyncSessionFactory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 def generate_slug(name: str) -> str:
     s = name.lower().strip()
@@ -129,5 +130,11 @@ async def populate_makes_from_json():
     print(f"Errors during processing: {error_count}")
     print("------------------------")
 
+async def main():
+    try:
+        await populate_makes_from_json()
+    finally:
+        await engine.dispose()
+
 if __name__ == "__main__":
-    asyncio.run(populate_makes_from_json())
+    asyncio.run(main())
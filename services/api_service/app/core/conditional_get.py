@@ -0,0 +1,97 @@
+# services/api_service/app/core/conditional_get.py
+"""
+Условные GET для маршрутов кэша ответов (RESPONSE_CACHE_RULES) по версии данных.
+
+ETag ответа - версии областей данных маршрута (W/"ads-42.stats-7"), Last-Modified -
+время последнего изменения. Версии приходят уведомлениями data_processor (DataChangeListener), поэтому
+запрос с совпадающим If-None-Match (или If-Modified-Since не раньше изменения) получает
+304 без обращения к БД и к кэшу. Пока версия неизвестна (нет подписки), заголовки не
+выставляются и запросы обрабатываются как обычно.
+"""
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Sequence, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.data_changes import DataChangeListener, DataVersion
+from app.core.response_cache import RESPONSE_CACHE_RULES, CacheRule, match_rule
+
+
+def build_etag(versions: Dict[str, DataVersion]) -> str:
+    # Слабый ETag: тело одной версии может отличаться (например, возраст снимка статистики)
+    return 'W/"' + ".".join(f"{scope}-{version.version}" for scope, version in versions.items()) + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    # Сравнение слабое (RFC 9110): префикс W/ не учитывается
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return "*" in candidates or any(
+        (candidate[2:] if candidate.startswith("W/") else candidate) == opaque for candidate in candidates
+    )
+
+
+def not_modified_since(if_modified_since: str, changed_at: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    # В HTTP-дате нет долей секунды
+    return changed_at.replace(microsecond=0) <= since
+
+
+class ConditionalGetMiddleware:
+    """ASGI middleware: ETag/Last-Modified по версии данных и 304 без обращения к БД."""
+
+    def __init__(
+        self, app: ASGIApp, versions: DataChangeListener, rules: Sequence[CacheRule] = RESPONSE_CACHE_RULES
+    ):
+        self.app = app
+        self.versions = versions
+        self.rules = rules
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        rule = None
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            rule = match_rule(scope["path"], self.rules)
+            # Ответ 304 отдается до маршрутизации - метрики помечают его правилом
+            scope["cache_rule"] = rule
+        versions = {name: self.versions.get_version(name) for name in rule.scopes} if rule else {}
+        if not versions or None in versions.values():
+            await self.app(scope, receive, send)
+            return
+
+        etag = build_etag(versions)
+        changed_at = max(version.changed_at for version in versions.values())
+        validators: List[Tuple[bytes, bytes]] = [
+            (b"etag", etag.encode()),
+            (b"last-modified", format_datetime(changed_at, usegmt=True).encode()),
+            # Клиент может хранить ответ, но должен проверять его при каждом запросе
+            (b"cache-control", b"no-cache"),
+        ]
+
+        request_headers = Headers(scope=scope)
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            not_modified = etag_matches(if_none_match, etag)
+        else:
+            if_modified_since = request_headers.get("if-modified-since")
+            not_modified = if_modified_since is not None and not_modified_since(if_modified_since, changed_at)
+
+        if not_modified:
+            await send({"type": "http.response.start", "status": 304, "headers": validators})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_validators(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = [(name, value) for name, value in message.get("headers", [])
+                           if name.lower() not in (b"etag", b"last-modified", b"cache-control")]
+                message = {**message, "headers": headers + validators}
+            await send(message)
+
+        await self.app(scope, receive, send_with_validators)
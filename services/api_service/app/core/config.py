@@ -1,5 +1,5 @@
 # services/api_service/app/core/config.py
-from typing import Optional
+from typing import Literal, Optional
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -24,6 +24,17 @@ class Settings(BaseSettings):
     ASYNC_DATABASE_URL: Optional[str] = Field(default=None, description="Async database URL")
     SYNC_DATABASE_URL: Optional[str] = Field(default=None, description="Sync database URL")
     
+    # Connection pool (same names in data_processor, see app/core/db_pool.py)
+    DB_POOL_SIZE: int = Field(default=10, ge=1, description="Persistent connections per process")
+    DB_MAX_OVERFLOW: int = Field(default=10, ge=0, description="Extra connections opened under peak load")
+    DB_POOL_TIMEOUT: float = Field(default=30, description="Max wait for a free connection, seconds")
+    DB_POOL_RECYCLE: int = Field(default=3600, description="Reopen connections older than this, seconds")
+    DB_POOL_PRE_PING: bool = Field(default=True, description="Check connections with a round trip on checkout")
+    DB_STATEMENT_CACHE_SIZE: int = Field(default=100, ge=0, description="Prepared statements cached per connection")
+    DB_PREPARED_STATEMENTS: bool = Field(
+        default=True, description="Reuse named server-side prepared statements (disable behind PgBouncer transaction pooling)"
+    )
+    
     # API Settings
     API_HOST: str = Field(default="0.0.0.0", description="API host")
     API_PORT: int = Field(default=8000, description="API port")
@@ -31,6 +42,52 @@ class Settings(BaseSettings):
     # Pagination
     DEFAULT_PAGE_SIZE: int = Field(default=20, description="Default page size")
     MAX_PAGE_SIZE: int = Field(default=100, description="Maximum page size")
+
+    # Total count for ad listings
+    ADS_COUNT_MODE: Literal["exact", "estimated", "cached"] = Field(
+        default="exact",
+        description="Default count strategy for ad listings; estimated/cached totals are flagged total_exact=false",
+    )
+    ADS_COUNT_EXACT_THRESHOLD: int = Field(
+        default=10000, description="Estimated counts below this value are recounted exactly"
+    )
+    ADS_COUNT_CACHE_TTL: int = Field(default=60, description="TTL of cached counts, seconds")
+    ADS_COUNT_CACHE_SIZE: int = Field(default=1024, description="Max number of cached filter sets")
+
+    # Full-text search
+    SEARCH_RANK_WINDOW: int = Field(default=1000, description="Newest matches ranked by ts_rank per search")
+    
+    # Independent read queries of one request run concurrently (run_concurrently)
+    CONCURRENT_QUERY_TIMEOUT: float = Field(default=10.0, description="Timeout of each concurrent read query, seconds")
+    
+    # Statistics
+    STATS_MEDIAN_SOURCE: Literal["exact", "histogram"] = Field(
+        default="exact",
+        description="Median price from stats_price_median (exact, full sort on refresh) or stats_price_histogram (within 2%)",
+    )
+    
+    # Streaming export
+    EXPORT_CHUNK_SIZE: int = Field(default=5000, description="Rows fetched from the server-side cursor per chunk")
+    
+    # Response cache for catalog, filter options and stats endpoints
+    RESPONSE_CACHE_ENABLED: bool = Field(default=True, description="Cache responses of read-heavy GET routes")
+    RESPONSE_CACHE_BACKEND: Literal["memory", "redis"] = Field(
+        default="memory", description="memory (per-process LRU) or redis (shared, requires the redis package)"
+    )
+    RESPONSE_CACHE_TTL: int = Field(default=300, description="TTL of cached responses, seconds")
+    RESPONSE_CACHE_MAX_ENTRIES: int = Field(default=2048, description="Max number of responses per data scope in the memory backend")
+    FACET_SNAPSHOT_TTL: int = Field(default=300, description="Max age of the in-memory filter options snapshot, seconds")
+    RESPONSE_CACHE_REDIS_URL: str = Field(default="redis://localhost:6379/0", description="Redis URL for the redis backend")
+    
+    # Access log and Server-Timing
+    ACCESS_LOG_SAMPLE_RATE: float = Field(
+        default=0.01, ge=0, le=1, description="Share of requests written to the access log (5xx and slow ones are always logged)"
+    )
+    ACCESS_LOG_SLOW_MS: float = Field(default=1000, description="Requests slower than this are always logged, milliseconds")
+    SERVER_TIMING_ENABLED: bool = Field(default=True, description="Add Server-Timing header with DB and serialization time")
+    
+    # Prometheus
+    METRICS_ENABLED: bool = Field(default=True, description="Expose /metrics (requires the prometheus_client package)")
     
     @property
     def database_url(self) -> str:
@@ -39,5 +96,10 @@ class Settings(BaseSettings):
             return self.ASYNC_DATABASE_URL
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
+    @property
+    def asyncpg_dsn(self) -> str:
+        """URL для прямого подключения asyncpg (без драйвера SQLAlchemy в схеме)"""
+        return self.database_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
 
 settings = Settings()
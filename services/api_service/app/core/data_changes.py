@@ -0,0 +1,160 @@
+# services/api_service/app/core/data_changes.py
+"""
+Уведомления об изменении данных от data_processor.
+
+data_processor в транзакциях записи вызывает pg_notify(DATA_CHANGED_CHANNEL, область),
+поэтому уведомление приходит только после коммита. Области:
+- ads: записаны объявления или помечены проданные (консьюмеры);
+- stats: обновлены витрины статистики (app.stats_refresh).
+
+Полезная нагрузка - "область:версия:время": версия области из таблицы data_version
+растет в порядке коммитов. API слушает канал отдельным соединением, хранит текущие
+версии (по ним строятся ETag без запросов к БД) и вызывает подписчиков области
+(сброс кэшей) с новой версией. После потери соединения уведомления могли быть пропущены,
+поэтому при подключении версии перечитываются из data_version и вызываются подписчики
+всех областей.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Тот же канал использует data_processor (app/notifications.py)
+DATA_CHANGED_CHANNEL = "euroautodatahub_data_changed"
+
+# Подписчик получает область и ее новую версию (None, если версия неизвестна)
+Subscriber = Callable[[str, Optional["DataVersion"]], Union[None, Awaitable[None]]]
+
+
+@dataclass(frozen=True)
+class DataVersion:
+    version: int
+    changed_at: datetime
+
+
+def parse_payload(payload: str) -> tuple:
+    """'ads:42:1760668800.123' -> ('ads', DataVersion); без версии - ('ads', None)"""
+    scope, _, rest = payload.partition(":")
+    if not rest:
+        return scope, None
+    try:
+        version, _, epoch = rest.partition(":")
+        changed_at = datetime.fromtimestamp(float(epoch), tz=timezone.utc) if epoch else datetime.now(timezone.utc)
+        return scope, DataVersion(int(version), changed_at)
+    except ValueError:
+        logger.warning(f"Некорректное уведомление об изменении данных: {payload!r}")
+        return scope, None
+
+
+class DataChangeListener:
+    """LISTEN на канале изменений с переподключением и подписчиками по областям."""
+
+    def __init__(
+        self,
+        dsn: str,
+        channel: str = DATA_CHANGED_CHANNEL,
+        reconnect_delay: float = 5.0,
+        keepalive_interval: float = 30.0,
+    ):
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.keepalive_interval = keepalive_interval
+        self._subscribers: Dict[str, List[Subscriber]] = defaultdict(list)
+        self._task: Optional[asyncio.Task] = None
+        # Текущие версии областей; пусто, пока подписка не установлена
+        self.versions: Dict[str, DataVersion] = {}
+
+    def subscribe(self, scope: str, callback: Subscriber) -> None:
+        self._subscribers[scope].append(callback)
+
+    def get_version(self, scope: str) -> Optional[DataVersion]:
+        return self.versions.get(scope)
+
+    def update_version(self, scope: str, version: Optional[DataVersion]) -> None:
+        current = self.versions.get(scope)
+        if version is not None and (current is None or version.version > current.version):
+            self.versions[scope] = version
+
+    async def handle_notification(self, payload: str) -> None:
+        scope, version = parse_payload(payload)
+        # Сначала сброс кэшей, потом версия: ответ между ними получит старый ETag
+        # со свежими данными (клиент просто перезапросит), а не наоборот
+        await self.dispatch(scope, version)
+        self.update_version(scope, version)
+
+    async def load_versions(self, connection: asyncpg.Connection) -> Dict[str, DataVersion]:
+        try:
+            rows = await connection.fetch("SELECT scope, version, changed_at FROM data_version")
+        except asyncpg.UndefinedTableError:
+            logger.warning("Таблица data_version не найдена, ETag по версии данных отключены")
+            return {}
+        return {row["scope"]: DataVersion(row["version"], row["changed_at"]) for row in rows}
+
+    async def dispatch(self, scope: str, version: Optional[DataVersion] = None) -> None:
+        for callback in self._subscribers.get(scope, []):
+            try:
+                result = callback(scope, version)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Ошибка обработчика изменения данных '{scope}': {e}", exc_info=True)
+
+    async def dispatch_all(self, versions: Dict[str, DataVersion]) -> None:
+        for scope in list(self._subscribers):
+            await self.dispatch(scope, versions.get(scope))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                lost = loop.create_future()
+                connection.add_termination_listener(lambda _: lost.done() or lost.set_result(None))
+                await connection.add_listener(
+                    self.channel,
+                    lambda _conn, _pid, _channel, payload: loop.create_task(self.handle_notification(payload)),
+                )
+                logger.info(f"Подписка на изменения данных ({self.channel}) установлена")
+                # Пока соединения не было, кэши жили только по TTL
+                versions = await self.load_versions(connection)
+                await self.dispatch_all(versions)
+                for scope, version in versions.items():
+                    self.update_version(scope, version)
+                # Простаивающее соединение может оборваться незаметно - проверяем его запросом
+                while not lost.done():
+                    try:
+                        await asyncio.wait_for(asyncio.shield(lost), timeout=self.keepalive_interval)
+                    except asyncio.TimeoutError:
+                        await connection.fetchval("SELECT 1")
+                logger.warning("Соединение LISTEN потеряно, переподключаемся")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Не удалось подписаться на изменения данных: {e}")
+            finally:
+                # Без подписки версии могут устареть - не отвечаем по ним 304 до переподключения
+                self.versions.clear()
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(self.reconnect_delay)
@@ -1,47 +1,99 @@
 # services/api_service/app/core/middleware.py
-import time
+"""
+Access-лог, обработка ошибок, Server-Timing и гистограмма времени ответа - одним ASGI middleware.
+
+BaseHTTPMiddleware заводит на каждый запрос отдельную задачу и обертку над потоком
+ответа, поэтому middleware написан на чистом ASGI: заголовки добавляются в сообщение
+http.response.start, тело проходит без изменений (в том числе потоковое).
+
+- Server-Timing: db (суммарное время запросов к БД; у одновременных запросов run_concurrently
+  может превышать total), serialize (JSON-кодирование ответа), total.
+- Access-лог: одна строка key=value на запрос, без query-параметров; пишется выборочно
+  (ACCESS_LOG_SAMPLE_RATE), а ответы 5xx и медленные (ACCESS_LOG_SLOW_MS) - всегда.
+"""
 import logging
-from fastapi import Request, Response
-from fastapi.middleware.base import BaseHTTPMiddleware
+import random
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import histogram
+from app.core.request_timing import RequestTimings, current_timings
 
 logger = logging.getLogger(__name__)
 
+HTTP_REQUEST_DURATION = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]
+)
+
+
+def route_label(scope: Scope) -> str:
+    """Шаблон пути маршрута (/api/v1/ads/{ad_id}), чтобы число рядов метрики не зависело от URL"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Ответ из кэша или 304 - маршрут не выбирался
+    rule = scope.get("cache_rule")
+    return f"{rule.path_prefix}*" if rule is not None else "unmatched"
+
+
+def server_timing(timings: RequestTimings, total: float) -> bytes:
+    return (
+        f"db;dur={timings.db * 1000:.1f};desc=\"{timings.db_queries} queries\", "
+        f"serialize;dur={timings.serialize * 1000:.1f}, "
+        f"total;dur={total * 1000:.1f}"
+    ).encode()
+
+
+class AccessLogMiddleware:
+    """ASGI middleware: access-лог, логирование необработанных ошибок, Server-Timing и метрики"""
+
+    def __init__(
+        self, app: ASGIApp, sample_rate: float = 1.0, slow_ms: float = 1000, server_timing: bool = True
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Тело обычного ответа уже отрендерено, так что время известно полностью
+                elapsed = time.perf_counter() - started
+                headers = list(message.get("headers", []))
+                headers.append((b"x-process-time", f"{elapsed:.6f}".encode()))
+                if self.server_timing:
+                    headers.append((b"server-timing", server_timing(timings, elapsed)))
+                message["headers"] = headers
+            await send(message)
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware для логирования запросов"""
-    
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        # Логируем входящий запрос
-        logger.info(f"Incoming request: {request.method} {request.url}")
-        
-        # Обрабатываем запрос
-        response = await call_next(request)
-        
-        # Вычисляем время обработки
-        process_time = time.time() - start_time
-        
-        # Логируем ответ
-        logger.info(
-            f"Request completed: {request.method} {request.url} - "
-            f"Status: {response.status_code} - Time: {process_time:.4f}s"
-        )
-        
-        # Добавляем заголовок с временем обработки
-        response.headers["X-Process-Time"] = str(process_time)
-        
-        return response
-
-
-class ErrorHandlingMiddleware(BaseHTTPMiddleware):
-    """Middleware для обработки ошибок"""
-    
-    async def dispatch(self, request: Request, call_next):
         try:
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send_with_timing)
         except Exception as e:
-            logger.error(f"Unhandled error in request {request.method} {request.url}: {str(e)}")
-            # В реальном приложении здесь можно отправлять ошибки в системы мониторинга
+            # Ответ 500 и трассировку формирует ServerErrorMiddleware снаружи
+            logger.error(f"Unhandled error in request {scope['method']} {scope['path']}: {e}")
             raise
+        finally:
+            current_timings.reset(token)
+            duration = time.perf_counter() - started
+            route = route_label(scope)
+            HTTP_REQUEST_DURATION.labels(scope["method"], route, str(status)).observe(duration)
+            duration_ms = duration * 1000
+            if status >= 500 or duration_ms >= self.slow_ms or random.random() < self.sample_rate:
+                logger.info(
+                    f"method={scope['method']} path={scope['path']} route={route} status={status} "
+                    f"duration_ms={duration_ms:.1f} db_ms={timings.db * 1000:.1f} "
+                    f"db_queries={timings.db_queries} serialize_ms={timings.serialize * 1000:.1f}"
+                )
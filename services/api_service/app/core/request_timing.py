@@ -0,0 +1,50 @@
+# services/api_service/app/core/request_timing.py
+"""
+Разбивка времени запроса на БД и сериализацию для заголовка Server-Timing и access-лога.
+
+AccessLogMiddleware кладет в контекст запроса RequestTimings; запросы к БД (события
+движка SQLAlchemy) и JSON-сериализация ответа добавляют к нему свое время. Вне
+запроса (фоновые задачи, скрипты) учет не ведется.
+"""
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+
+class RequestTimings:
+    __slots__ = ("db", "db_queries", "serialize")
+
+    def __init__(self):
+        self.db = 0.0
+        self.db_queries = 0
+        self.serialize = 0.0
+
+
+# Изменяемый объект, а не значения: контекст копируется в задачи и greenlet драйвера,
+# а время должно попасть в объект запроса
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+
+def add_serialization_time(seconds: float) -> None:
+    timings = current_timings.get()
+    if timings is not None:
+        timings.serialize += seconds
+
+
+def instrument_engine_timing(engine) -> None:
+    """Время выполнения запросов движка (включая ожидание ответа БД) в RequestTimings"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_started", None)
+        timings = current_timings.get()
+        if timings is not None and started is not None:
+            timings.db += time.perf_counter() - started
+            timings.db_queries += 1
@@ -0,0 +1,351 @@
+# services/api_service/app/core/response_cache.py
+"""
+Кэш ответов для GET-эндпоинтов, данные которых меняются только при записи обхода:
+справочники марок/моделей, опции фильтров, фасеты и /stats/*.
+
+- Ключ: области данных маршрута, их поколения, путь и нормализованные query-параметры
+  (пустые значения отброшены, параметры отсортированы).
+- Бэкенд: in-process LRU (по умолчанию) или Redis (RESPONSE_CACHE_BACKEND=redis,
+  нужен пакет redis) - общий для всех воркеров API.
+- Single-flight: одновременные промахи по одному ключу ждут первый запрос, а не
+  выполняют те же агрегаты параллельно.
+- Инвалидация: поколение области - ее версия data_version из уведомления data_processor
+  (app/core/data_changes.py), поэтому все воркеры, получив одно уведомление, переходят
+  на одно и то же поколение и читают общие записи Redis; старые записи больше не
+  читаются. TTL ограничивает устаревание, если уведомление потеряно.
+"""
+import asyncio
+import json
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.data_changes import DataVersion
+from app.core.metrics import counter, gauge
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis-бэкенд необязателен
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_REQUESTS = counter(
+    "api_response_cache_requests_total", "Cached route requests by cache state (hit, shared, miss)", ["state"]
+)
+RESPONSE_CACHE_INVALIDATIONS = counter(
+    "api_response_cache_invalidations_total", "Response cache invalidations by data scope", ["scope"]
+)
+RESPONSE_CACHE_BACKEND_ERRORS = counter(
+    "api_response_cache_backend_errors_total", "Response cache backend errors by operation", ["operation"]
+)
+
+# (статус, заголовки, тело)
+CachedResponse = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    path_prefix: str
+    # Области данных, при изменении любой из которых ответ устаревает
+    scopes: Tuple[str, ...]
+
+
+# Кэшируемые маршруты и области данных, по изменению которых сбрасывается кэш
+RESPONSE_CACHE_RULES = (
+    CacheRule("/api/v1/ads/makes/list", ("ads",)),
+    CacheRule("/api/v1/ads/models/list", ("ads",)),
+    # Без фильтров - снимок из витрин (stats), с фильтрами - запрос по auto_ad (ads)
+    CacheRule("/api/v1/ads/filters/options", ("ads", "stats")),
+    # Популярные наборы фильтров фасетного поиска
+    CacheRule("/api/v1/ads/facets", ("ads",)),
+    CacheRule("/api/v1/stats/", ("stats",)),
+)
+
+
+def match_rule(path: str, rules: Sequence[CacheRule]) -> Optional[CacheRule]:
+    for rule in rules:
+        if path.startswith(rule.path_prefix):
+            return rule
+    return None
+
+
+def normalize_query(query_string: bytes) -> str:
+    params = parse_qsl(query_string.decode("latin-1"), keep_blank_values=False)
+    return urlencode(sorted(params))
+
+
+class MemoryCacheBackend:
+    name = "memory"
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Отдельный LRU на набор областей маршрута: сброс области не трогает записи,
+        # которые от нее не зависят
+        self._caches: Dict[str, TTLCache] = {}
+        self._generations: Dict[str, int] = {}
+
+    def _scope_cache(self, key: str) -> TTLCache:
+        scopes = key.split(":", 1)[0]
+        if scopes not in self._caches:
+            self._caches[scopes] = TTLCache(maxsize=self.maxsize, ttl=self.ttl)
+        return self._caches[scopes]
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        return self._scope_cache(key).get(key)
+
+    async def set(self, key: str, value: CachedResponse, ttl: float) -> None:
+        self._scope_cache(key).set(key, value, ttl)
+
+    async def generation(self, scope: str) -> int:
+        return self._generations.get(scope, 0)
+
+    async def bump(self, scope: str) -> int:
+        return await self.advance(scope, self._generations.get(scope, 0) + 1)
+
+    async def advance(self, scope: str, generation: int) -> int:
+        if generation > self._generations.get(scope, 0):
+            self._generations[scope] = generation
+            # Записи старого поколения уже недостижимы - освобождаем память сразу
+            for scopes, cache in self._caches.items():
+                if scope in scopes.split("+"):
+                    cache.clear()
+        return self._generations.get(scope, 0)
+
+    def __len__(self) -> int:
+        return sum(len(cache) for cache in self._caches.values())
+
+
+# Поколение не уменьшается: уведомления воркеры получают в разное время
+ADVANCE_GENERATION_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local generation = tonumber(ARGV[1])
+if generation > current then
+    redis.call('SET', KEYS[1], generation)
+    return generation
+end
+return current
+"""
+
+
+class RedisCacheBackend:
+    name = "redis"
+
+    def __init__(self, url: str, key_prefix: str = "respcache:"):
+        if aioredis is None:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis требует пакет redis (pip install redis)")
+        self._redis = aioredis.from_url(url)
+        self.key_prefix = key_prefix
+
+    @staticmethod
+    def _dump(value: CachedResponse) -> bytes:
+        status, headers, body = value
+        meta = json.dumps([status, [[name.decode("latin-1"), val.decode("latin-1")] for name, val in headers]])
+        return meta.encode() + b"\n" + body
+
+    @staticmethod
+    def _load(raw: bytes) -> CachedResponse:
+        meta, body = raw.split(b"\n", 1)
+        status, headers = json.loads(meta)
+        return status, [(name.encode("latin-1"), val.encode("latin-1")) for name, val in headers], body
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        raw = await self._redis.get(self.key_prefix + key)
+        return self._load(raw) if raw is not None else None
+
+    async def set(self, key: str, value: CachedResponse, ttl: float) -> None:
+        await self._redis.set(self.key_prefix + key, self._dump(value), ex=max(1, int(ttl)))
+
+    async def generation(self, scope: str) -> int:
+        return int(await self._redis.get(f"{self.key_prefix}gen:{scope}") or 0)
+
+    async def bump(self, scope: str) -> int:
+        # Поколение общее для всех воркеров: записи старого поколения истекут по TTL
+        return await self._redis.incr(f"{self.key_prefix}gen:{scope}")
+
+    async def advance(self, scope: str, generation: int) -> int:
+        # Идемпотентно: каждый воркер выставляет одну и ту же версию из уведомления
+        return int(await self._redis.eval(ADVANCE_GENERATION_SCRIPT, 1, f"{self.key_prefix}gen:{scope}", generation))
+
+
+class ResponseCache:
+    """Кэш ответов поверх бэкенда: поколения областей, single-flight и метрики."""
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.metrics: Counter = Counter()
+        self._generations: Dict[str, int] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def build_key(self, scopes: Sequence[str], path: str, query_string: bytes) -> str:
+        for scope in scopes:
+            if scope not in self._generations:
+                try:
+                    self._generations[scope] = await self.backend.generation(scope)
+                except Exception as e:
+                    self._backend_error("generation", e)
+                    self._generations[scope] = 0
+        generations = ".".join(str(self._generations[scope]) for scope in scopes)
+        return f"{'+'.join(scopes)}:{generations}:{path}?{normalize_query(query_string)}"
+
+    async def invalidate(self, scope: str, version: Optional[DataVersion] = None) -> None:
+        """
+        Переводит область на новое поколение: версию data_version из уведомления, одну
+        для всех воркеров. Без версии (таблицы data_version нет) - счетчик бэкенда.
+        """
+        self.metrics["invalidations"] += 1
+        RESPONSE_CACHE_INVALIDATIONS.labels(scope).inc()
+        try:
+            if version is not None:
+                self._generations[scope] = await self.backend.advance(scope, version.version)
+            else:
+                self._generations[scope] = await self.backend.bump(scope)
+        except Exception as e:
+            self._backend_error("bump", e)
+            fallback = self._generations.get(scope, 0) + 1
+            self._generations[scope] = max(fallback, version.version) if version is not None else fallback
+        logger.info(f"Кэш ответов '{scope}' сброшен (поколение {self._generations[scope]})")
+
+    async def fetch(
+        self, key: str, render: Callable[[], Awaitable[CachedResponse]], ttl: Optional[float] = None
+    ) -> Tuple[CachedResponse, str]:
+        """
+        Возвращает (ответ, состояние кэша): HIT - из кэша, MISS - построен этим запросом,
+        SHARED - получен от одновременного запроса с тем же ключом.
+        """
+        try:
+            cached = await self.backend.get(key)
+        except Exception as e:
+            self._backend_error("get", e)
+            cached = None
+        if cached is not None:
+            self.metrics["hits"] += 1
+            RESPONSE_CACHE_REQUESTS.labels("hit").inc()
+            return cached, "HIT"
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            try:
+                response = await asyncio.shield(in_flight)
+                self.metrics["shared"] += 1
+                RESPONSE_CACHE_REQUESTS.labels("shared").inc()
+                return response, "SHARED"
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+            except Exception:
+                pass
+            # Первый запрос упал или был отменен - строим ответ сами
+
+        self.metrics["misses"] += 1
+        RESPONSE_CACHE_REQUESTS.labels("miss").inc()
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await render()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение передается ожидающим; помечаем его прочитанным, если их нет
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+        future.set_result(response)
+        if response[0] == 200:
+            try:
+                await self.backend.set(key, response, self.ttl if ttl is None else ttl)
+            except Exception as e:
+                self._backend_error("set", e)
+        return response, "MISS"
+
+    def _backend_error(self, operation: str, error: Exception) -> None:
+        # Недоступность кэша не должна ронять запросы - они просто идут в БД
+        self.metrics["backend_errors"] += 1
+        RESPONSE_CACHE_BACKEND_ERRORS.labels(operation).inc()
+        logger.warning(f"Ошибка бэкенда кэша ответов ({operation}): {error}")
+
+    def stats(self) -> Dict[str, object]:
+        served = self.metrics["hits"] + self.metrics["shared"]
+        requests = served + self.metrics["misses"]
+        return {
+            "backend": self.backend.name,
+            "entries": len(self.backend) if hasattr(self.backend, "__len__") else None,
+            "hits": self.metrics["hits"],
+            "shared": self.metrics["shared"],
+            "misses": self.metrics["misses"],
+            "hit_ratio": round(served / requests, 4) if requests else None,
+            "invalidations": self.metrics["invalidations"],
+            "backend_errors": self.metrics["backend_errors"],
+            "generations": dict(self._generations),
+        }
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware: GET-запросы к маршрутам из rules отдаются через ResponseCache."""
+
+    def __init__(self, app: ASGIApp, cache: "ResponseCache", rules: Sequence[CacheRule] = RESPONSE_CACHE_RULES):
+        self.app = app
+        self.cache = cache
+        self.rules = rules
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        rule = match_rule(scope["path"], self.rules) if scope["type"] == "http" and scope["method"] == "GET" else None
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Попадание в кэш отдается до маршрутизации - метрики помечают его правилом
+        scope["cache_rule"] = rule
+        key = await self.cache.build_key(rule.scopes, scope["path"], scope.get("query_string", b""))
+
+        async def render() -> CachedResponse:
+            status = 500
+            headers: List[Tuple[bytes, bytes]] = []
+            body = bytearray()
+
+            async def capture(message: Message) -> None:
+                nonlocal status, headers
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    headers = list(message.get("headers", []))
+                elif message["type"] == "http.response.body":
+                    body.extend(message.get("body", b""))
+
+            await self.app(scope, receive, capture)
+            return status, headers, bytes(body)
+
+        (status, headers, body), cache_state = await self.cache.fetch(key, render)
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": headers + [(b"x-cache", cache_state.encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def build_cache_backend():
+    if settings.RESPONSE_CACHE_BACKEND == "redis":
+        return RedisCacheBackend(settings.RESPONSE_CACHE_REDIS_URL)
+    return MemoryCacheBackend(maxsize=settings.RESPONSE_CACHE_MAX_ENTRIES, ttl=settings.RESPONSE_CACHE_TTL)
+
+
+response_cache = ResponseCache(build_cache_backend(), ttl=settings.RESPONSE_CACHE_TTL)
+
+gauge("api_response_cache_hit_ratio", "Share of cached route requests served without rendering").set_function(
+    lambda: response_cache.stats()["hit_ratio"] or 0
+)
+gauge("api_response_cache_entries", "Responses stored in the memory backend").set_function(
+    lambda: response_cache.stats()["entries"] or 0
+)
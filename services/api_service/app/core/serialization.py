@@ -0,0 +1,55 @@
+# services/api_service/app/core/serialization.py
+"""
+Быстрая JSON-сериализация для горячих эндпоинтов (список объявлений, выгрузка).
+
+Строки запроса сериализуются напрямую, без pydantic-моделей: orjson, если установлен,
+иначе стандартный json. Формат значений совпадает с pydantic: datetime в ISO 8601,
+UTC - с суффиксом Z, не-ASCII символы без экранирования.
+"""
+import json
+import time
+from datetime import date, datetime
+from typing import Any
+
+from starlette.responses import JSONResponse, Response
+
+from app.core.request_timing import add_serialization_time
+
+try:
+    import orjson
+except ImportError:  # без orjson - медленнее, но тот же результат
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+
+class FastJSONResponse(Response):
+    """JSON-ответ через dumps; response_model маршрута при этом не применяется"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        body = dumps(content)
+        add_serialization_time(time.perf_counter() - started)
+        return body
+
+
+class TimedJSONResponse(JSONResponse):
+    """Стандартный JSONResponse с учетом времени сериализации (ответ по умолчанию)"""
+
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        body = super().render(content)
+        add_serialization_time(time.perf_counter() - started)
+        return body
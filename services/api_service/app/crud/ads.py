@@ -1,11 +1,88 @@
 # services/api_service/app/crud/ads.py
-from typing import Optional, List, Tuple
+import json
+from typing import Any, Dict, Optional, List, Sequence, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import func, select, and_, desc, asc
+from sqlalchemy import Row, func, select, and_, desc, asc, text
 from sqlmodel import Session
 
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.crud.filters import MatchMode, build_ad_conditions, text_condition
+from app.crud.pagination import decode_cursor, encode_cursor, keyset_order_by, keyset_segments, resolve_sort_column
 from app.db.models import AutoAd, AutoAdHistory, CarMake, CarModel
-from app.schemas.ads import AdFilters
+from app.schemas.ads import AdFilters, AdResponse
+
+
+# Колонки ответа списка (поля AdResponse): список читает только их, без ORM-объектов
+AD_LIST_FIELDS = tuple(AdResponse.model_fields)
+AD_LIST_COLUMNS = tuple(getattr(AutoAd, name) for name in AD_LIST_FIELDS)
+
+
+def ad_row_to_dict(row: Sequence[Any]) -> Dict[str, Any]:
+    """Строка с колонками AD_LIST_COLUMNS (первыми) -> словарь полей AdResponse"""
+    return dict(zip(AD_LIST_FIELDS, row))
+
+
+# Точные количества по нормализованному набору фильтров
+_count_cache = TTLCache(maxsize=settings.ADS_COUNT_CACHE_SIZE, ttl=settings.ADS_COUNT_CACHE_TTL)
+
+
+def clear_count_cache(scope: str = "ads", version=None) -> None:
+    """Сброс закэшированных количеств (подписчик уведомлений об изменении объявлений)"""
+    _count_cache.clear()
+
+
+def count_cache_key(filters: AdFilters) -> str:
+    """Ключ кэша: заданные фильтры в стабильном порядке"""
+    return json.dumps(filters.model_dump(exclude_none=True), sort_keys=True, default=str)
+
+
+async def estimate_count(session: AsyncSession, conditions: list) -> int:
+    """Оценка числа строк планировщиком (EXPLAIN) без выполнения запроса"""
+    query = select(AutoAd.id_ad)
+    if conditions:
+        query = query.where(and_(*conditions))
+    # Значения фильтров подставляются литералами, чтобы план строился по ним; диалект
+    # соединения учитывает standard_conforming_strings сервера при экранировании
+    connection = await session.connection()
+    sql = str(query.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+    result = await session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def count_ads(
+    session: AsyncSession,
+    filters: AdFilters,
+    conditions: list,
+    count_mode: str = "exact"
+) -> Tuple[int, bool]:
+    """
+    Количество объявлений по фильтрам и признак точности:
+    exact - count(*); estimated - оценка планировщика, небольшие выборки пересчитываются точно;
+    cached - точное значение, сохраненное на ADS_COUNT_CACHE_TTL секунд.
+    """
+    if count_mode == "estimated":
+        estimate = await estimate_count(session, conditions)
+        if estimate >= settings.ADS_COUNT_EXACT_THRESHOLD:
+            return estimate, False
+
+    if count_mode == "cached":
+        key = count_cache_key(filters)
+        cached = _count_cache.get(key)
+        if cached is not None:
+            return cached, False
+
+    count_query = select(func.count(AutoAd.id_ad))
+    if conditions:
+        count_query = count_query.where(and_(*conditions))
+    total = (await session.execute(count_query)).scalar()
+
+    if count_mode == "cached":
+        _count_cache.set(key, total)
+    return total, True
 
 
 async def get_ads_with_filters(
@@ -14,67 +91,22 @@ async def get_ads_with_filters(
     page: int = 1,
     page_size: int = 20,
     sort_by: str = "createdAt",
-    sort_order: str = "desc"
-) -> Tuple[List[AutoAd], int]:
+    sort_order: str = "desc",
+    count_mode: str = "exact"
+) -> Tuple[List[Row], int, bool]:
     """
-    Получение объявлений с фильтрами и пагинацией
+    Получение объявлений с фильтрами и пагинацией.
+    Возвращает (строки с колонками AD_LIST_COLUMNS, всего, точно ли посчитано всего).
     """
     # Базовый запрос
-    query = select(AutoAd)
-    count_query = select(func.count(AutoAd.id_ad))
+    query = select(*AD_LIST_COLUMNS)
     
     # Применение фильтров
-    conditions = []
-    
-    if filters.make_name:
-        conditions.append(AutoAd.make_name.ilike(f"%{filters.make_name}%"))
-    
-    if filters.model_name:
-        conditions.append(AutoAd.model_name.ilike(f"%{filters.model_name}%"))
-    
-    if filters.year_from:
-        conditions.append(AutoAd.year >= filters.year_from)
-    
-    if filters.year_to:
-        conditions.append(AutoAd.year <= filters.year_to)
+    conditions = build_ad_conditions(filters)
     
-    if filters.price_from:
-        conditions.append(AutoAd.price >= filters.price_from)
-    
-    if filters.price_to:
-        conditions.append(AutoAd.price <= filters.price_to)
-    
-    if filters.mileage_from:
-        conditions.append(AutoAd.mileage >= filters.mileage_from)
-    
-    if filters.mileage_to:
-        conditions.append(AutoAd.mileage <= filters.mileage_to)
-    
-    if filters.fuel_type:
-        conditions.append(AutoAd.fuel_type.ilike(f"%{filters.fuel_type}%"))
-    
-    if filters.gearbox:
-        conditions.append(AutoAd.gearbox.ilike(f"%{filters.gearbox}%"))
-    
-    if filters.city:
-        conditions.append(AutoAd.city.ilike(f"%{filters.city}%"))
-    
-    if filters.region:
-        conditions.append(AutoAd.region.ilike(f"%{filters.region}%"))
-    
-    if filters.source_name:
-        conditions.append(AutoAd.source_name == filters.source_name)
-    
-    if filters.sold is not None:
-        if filters.sold:
-            conditions.append(AutoAd.sold_at.isnot(None))
-        else:
-            conditions.append(AutoAd.sold_at.is_(None))
-    
-    # Применяем условия к запросам
+    # Применяем условия к запросу
     if conditions:
         query = query.where(and_(*conditions))
-        count_query = count_query.where(and_(*conditions))
     
     # Сортировка
     sort_column = getattr(AutoAd, sort_by, AutoAd.createdAt)
@@ -89,12 +121,57 @@ async def get_ads_with_filters(
     
     # Выполнение запросов
     result = await session.execute(query)
-    ads = result.scalars().all()
+    ads = result.all()
     
-    count_result = await session.execute(count_query)
-    total = count_result.scalar()
+    total, total_exact = await count_ads(session, filters, conditions, count_mode)
     
-    return list(ads), total
+    return list(ads), total, total_exact
+
+
+async def get_ads_keyset(
+    session: AsyncSession,
+    filters: AdFilters,
+    page_size: int = 20,
+    sort_by: str = "createdAt",
+    sort_order: str = "desc",
+    cursor: Optional[str] = None,
+    count_mode: str = "exact"
+) -> Tuple[List[Row], int, bool, Optional[str]]:
+    """
+    Получение объявлений с фильтрами и keyset-пагинацией.
+    Возвращает (строки с колонками AD_LIST_COLUMNS, всего, точно ли посчитано всего,
+    курсор следующей страницы или None на последней).
+    """
+    conditions = build_ad_conditions(filters)
+    sort_column = resolve_sort_column(sort_by)
+    sort_order = "asc" if sort_order.lower() == "asc" else "desc"
+    descending = sort_order == "desc"
+    after = decode_cursor(cursor, sort_column, sort_order) if cursor else None
+
+    # Лишняя строка показывает, есть ли следующая страница
+    # Колонка сортировки может не входить в ответ - читаем ее отдельно для курсора
+    ads: List[Row] = []
+    for segment in keyset_segments(sort_column, descending, after):
+        query = (
+            select(*AD_LIST_COLUMNS, sort_column.label("sort_value"))
+            .where(and_(*conditions, *segment))
+            .order_by(*keyset_order_by(sort_column, descending))
+            .limit(page_size + 1 - len(ads))
+        )
+        result = await session.execute(query)
+        ads.extend(result.all())
+        if len(ads) > page_size:
+            break
+
+    next_cursor = None
+    if len(ads) > page_size:
+        ads = ads[:page_size]
+        last = ads[-1]
+        next_cursor = encode_cursor(sort_column, sort_order, last.sort_value, last.id_ad)
+
+    total, total_exact = await count_ads(session, filters, conditions, count_mode)
+
+    return ads, total, total_exact, next_cursor
 
 
 async def get_ad_by_id(session: AsyncSession, ad_id: str) -> Optional[AutoAd]:
@@ -122,14 +199,14 @@ async def get_makes_list(session: AsyncSession) -> List[str]:
     return [make for make in result.scalars().all() if make]
 
 
-async def get_models_by_make(session: AsyncSession, make_name: str) -> List[str]:
+async def get_models_by_make(session: AsyncSession, make_name: str, match: MatchMode = "fuzzy") -> List[str]:
     """Получение списка моделей для конкретной марки"""
     query = (
         select(AutoAd.model_name)
         .distinct()
         .where(
             and_(
-                AutoAd.make_name.ilike(f"%{make_name}%"),
+                text_condition(AutoAd.make_name, make_name, match),
                 AutoAd.model_name.isnot(None)
             )
         )
@@ -137,16 +214,3 @@ async def get_models_by_make(session: AsyncSession, make_name: str) -> List[str]
     result = await session.execute(query)
     return [model for model in result.scalars().all() if model]
 
-
-async def search_ads(session: AsyncSession, search_term: str, limit: int = 20) -> List[AutoAd]:
-    """Полнотекстовый поиск по объявлениям"""
-    query = (
-        select(AutoAd)
-        .where(
-            AutoAd.title.ilike(f"%{search_term}%")
-        )
-        .order_by(desc(AutoAd.createdAt))
-        .limit(limit)
-    )
-    result = await session.execute(query)
-    return list(result.scalars().all())
@@ -0,0 +1,152 @@
+# services/api_service/app/crud/export.py
+"""
+Потоковая выгрузка объявлений (NDJSON, CSV, Parquet) для аналитической синхронизации.
+
+Строки читаются серверным курсором (session.stream) пачками по EXPORT_CHUNK_SIZE и
+сразу кодируются в выходной формат: ORM-объекты и pydantic-модели не создаются,
+память не зависит от размера выгрузки. Порядок - по id_ad (индекс первичного ключа).
+Parquet: каждая пачка - отдельная row group; нужен пакет pyarrow.
+"""
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, select
+
+from app.core.config import settings
+from app.core.serialization import dumps
+from app.crud.ads import AD_LIST_COLUMNS, ad_row_to_dict
+from app.crud.filters import build_ad_conditions
+from app.db.database import AsyncSessionLocal
+from app.db.models import AutoAd
+from app.schemas.ads import AdFilters
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet-выгрузка необязательна
+    pa = None
+    pq = None
+
+# Те же поля, что в ответе /ads (AdResponse)
+EXPORT_COLUMNS = AD_LIST_COLUMNS
+
+# (media type, расширение файла)
+EXPORT_FORMATS: Dict[str, Tuple[str, str]] = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+Row = Tuple
+
+
+def export_format_available(export_format: str) -> bool:
+    return export_format != "parquet" or pa is not None
+
+
+async def stream_ad_rows(
+    filters: AdFilters, limit: Optional[int] = None, chunk_size: Optional[int] = None
+) -> AsyncIterator[Sequence[Row]]:
+    """
+    Пачки строк (кортежи колонок EXPORT_COLUMNS) по серверному курсору.
+    Сессия открывается здесь, а не в зависимости маршрута: ответ читается уже после
+    выхода из обработчика, а зависимость к тому времени закрывает свою сессию.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    query = select(*EXPORT_COLUMNS).order_by(AutoAd.id_ad)
+    conditions = build_ad_conditions(filters)
+    if conditions:
+        query = query.where(and_(*conditions))
+    if limit:
+        query = query.limit(limit)
+
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query.execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            yield rows
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+async def encode_ndjson(chunks: AsyncIterator[Sequence[Row]]) -> AsyncIterator[bytes]:
+    async for rows in chunks:
+        yield b"".join(dumps(ad_row_to_dict(row)) + b"\n" for row in rows)
+
+
+async def encode_csv(chunks: AsyncIterator[Sequence[Row]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in EXPORT_COLUMNS])
+    async for rows in chunks:
+        writer.writerows([[_csv_value(value) for value in row] for row in rows])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Только заголовок, если ничего не найдено
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _parquet_schema():
+    types = {
+        int: pa.int64(),
+        str: pa.string(),
+        datetime: pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([(column.name, types[column.type.python_type]) for column in EXPORT_COLUMNS])
+
+
+class _DrainableSink(io.RawIOBase):
+    """Файл для ParquetWriter, из которого записанное забирается по мере отправки"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def encode_parquet(chunks: AsyncIterator[Sequence[Row]]) -> AsyncIterator[bytes]:
+    schema = _parquet_schema()
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for rows in chunks:
+            writer.write_table(pa.Table.from_pylist(
+                [dict(zip(schema.names, row)) for row in rows], schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        # Футер с метаданными row groups пишется при закрытии
+        writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {
+    "ndjson": encode_ndjson,
+    "csv": encode_csv,
+    "parquet": encode_parquet,
+}
+
+
+def export_ads(filters: AdFilters, export_format: str, limit: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Тело ответа выгрузки в формате export_format"""
+    return ENCODERS[export_format](stream_ad_rows(filters, limit))
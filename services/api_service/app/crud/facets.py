@@ -0,0 +1,169 @@
+# services/api_service/app/crud/facets.py
+"""
+Опции фильтров и фасетный поиск: значения фасетов (марка, топливо, коробка, город,
+регион, источник, диапазоны года и цены) с количеством объявлений и диапазоны цены и года.
+
+- Без фильтров: снимок из витрин stats_facet_values и stats_filter_ranges (строятся
+  одним проходом GROUPING SETS при обновлении витрин). Снимок хранится в памяти
+  процесса до уведомления об обновлении витрин (область stats) или FACET_SNAPSHOT_TTL.
+- С фильтрами: один запрос GROUPING SETS по auto_ad с условиями фильтров - все фасеты
+  и диапазоны за один проход вместо отдельного DISTINCT на каждый фасет.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, case, column, func, select, table, tuple_
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.database import run_concurrently
+from app.db.models import AutoAd, StatsSnapshot
+
+# Колонки фасетов; тот же набор - в витрине stats_facet_values (миграция c4e7a9b2d5f3)
+FACET_COLUMNS = {
+    "make_name": AutoAd.make_name,
+    "fuel_type": AutoAd.fuel_type,
+    "gearbox": AutoAd.gearbox,
+    "city": AutoAd.city,
+    "region": AutoAd.region,
+    "source_name": AutoAd.source_name,
+}
+
+# Диапазоны цен - те же, что в /stats/price-distribution
+PRICE_BUCKET_BOUNDS = (5000, 10000, 20000, 30000, 50000, 100000)
+PRICE_BUCKET_LABELS = ("0-5K", "5K-10K", "10K-20K", "20K-30K", "30K-50K", "50K-100K", "100K+")
+YEAR_BUCKET_SIZE = 5
+
+# Фасеты-диапазоны: значение - номер диапазона цены (1..7) или первый год пятилетки
+FACET_BUCKETS = {
+    "price_bucket": case(
+        (AutoAd.price > 0, func.width_bucket(AutoAd.price, array(PRICE_BUCKET_BOUNDS)) + 1)
+    ),
+    "year_bucket": AutoAd.year // YEAR_BUCKET_SIZE * YEAR_BUCKET_SIZE,
+}
+FACET_EXPRESSIONS = {**FACET_COLUMNS, **FACET_BUCKETS}
+# Фасеты /ads/facets по умолчанию
+DEFAULT_FACETS = ("make_name", "fuel_type", "gearbox", "year_bucket", "price_bucket")
+
+stats_facet_values = table("stats_facet_values", column("facet"), column("value"), column("ads_count"))
+stats_filter_ranges = table(
+    "stats_filter_ranges", column("min_price"), column("max_price"), column("min_year"), column("max_year")
+)
+
+
+@dataclass
+class FacetSnapshot:
+    # Значения фасета по убыванию количества объявлений: [(значение, количество), ...]
+    values: Dict[str, List[Tuple[str, int]]] = field(default_factory=dict)
+    min_price: Optional[int] = None
+    max_price: Optional[int] = None
+    min_year: Optional[int] = None
+    max_year: Optional[int] = None
+    # Число объявлений, подходящих под условия (только для count_facets)
+    total: Optional[int] = None
+    refreshed_at: Optional[datetime] = None
+
+
+_snapshot_cache = TTLCache(maxsize=1, ttl=settings.FACET_SNAPSHOT_TTL)
+
+
+def clear_facet_snapshot(scope: str = "stats", version=None) -> None:
+    """Сброс снимка в памяти (подписчик уведомлений об обновлении витрин)"""
+    _snapshot_cache.clear()
+
+
+async def _load_facet_values(session: AsyncSession) -> Dict[str, List[Tuple[str, int]]]:
+    values: Dict[str, List[Tuple[str, int]]] = {}
+    values_query = select(stats_facet_values).order_by(
+        stats_facet_values.c.facet, stats_facet_values.c.ads_count.desc(), stats_facet_values.c.value
+    )
+    for facet, value, ads_count in (await session.execute(values_query)).all():
+        values.setdefault(facet, []).append((value, ads_count))
+    return values
+
+
+async def _load_filter_ranges(session: AsyncSession):
+    return (await session.execute(select(stats_filter_ranges))).first()
+
+
+async def _load_refreshed_at(session: AsyncSession) -> Optional[datetime]:
+    return (await session.execute(
+        select(func.min(StatsSnapshot.refreshed_at))
+        .where(StatsSnapshot.view_name.in_(["stats_facet_values", "stats_filter_ranges"]))
+    )).scalar()
+
+
+async def load_facet_snapshot() -> FacetSnapshot:
+    # Витрины читаются одновременно, каждая в своей сессии
+    values, ranges, refreshed_at = await run_concurrently(
+        _load_facet_values, _load_filter_ranges, _load_refreshed_at,
+        timeout=settings.CONCURRENT_QUERY_TIMEOUT,
+    )
+    snapshot = FacetSnapshot(values=values, refreshed_at=refreshed_at)
+    if ranges:
+        snapshot.min_price, snapshot.max_price = ranges.min_price, ranges.max_price
+        snapshot.min_year, snapshot.max_year = ranges.min_year, ranges.max_year
+    return snapshot
+
+
+async def get_facet_snapshot() -> FacetSnapshot:
+    """Снимок опций фильтров без условий; из памяти, пока витрины не обновлены"""
+    snapshot = _snapshot_cache.get("snapshot")
+    if snapshot is None:
+        snapshot = await load_facet_snapshot()
+        _snapshot_cache.set("snapshot", snapshot)
+    return snapshot
+
+
+async def count_facets(
+    session: AsyncSession, conditions: list, facets: Sequence[str] = tuple(FACET_COLUMNS)
+) -> FacetSnapshot:
+    """
+    Значения фасетов и диапазоны по объявлениям, подходящим под условия, за один проход.
+    Фасеты-колонки упорядочены по убыванию количества, фасеты-диапазоны - по диапазону.
+    """
+    expressions = [FACET_EXPRESSIONS[name] for name in facets]
+    query = select(
+        *expressions,
+        *[func.grouping(expression) for expression in expressions],
+        func.count().label("ads_count"),
+        func.min(AutoAd.price), func.max(AutoAd.price),
+        func.min(AutoAd.year), func.max(AutoAd.year),
+    )
+    if conditions:
+        query = query.where(and_(*conditions))
+    # Пустой набор () - итоговая строка с диапазонами по всем подходящим объявлениям
+    query = query.group_by(func.grouping_sets(*[tuple_(expression) for expression in expressions], tuple_()))
+
+    snapshot = FacetSnapshot()
+    facet_count = len(expressions)
+    for row in (await session.execute(query)).all():
+        values, groupings = row[:facet_count], row[facet_count:2 * facet_count]
+        ads_count, min_price, max_price, min_year, max_year = row[2 * facet_count:]
+        grouped = [index for index, grouping in enumerate(groupings) if grouping == 0]
+        if not grouped:
+            snapshot.total = ads_count
+            snapshot.min_price, snapshot.max_price = min_price, max_price
+            snapshot.min_year, snapshot.max_year = min_year, max_year
+            continue
+        value = values[grouped[0]]
+        if value is not None:
+            snapshot.values.setdefault(facets[grouped[0]], []).append((value, ads_count))
+
+    for facet, facet_values in snapshot.values.items():
+        if facet in FACET_BUCKETS:
+            facet_values.sort()
+        else:
+            facet_values.sort(key=lambda item: (-item[1], item[0]))
+    return snapshot
+
+
+def price_bucket_label(bucket: int) -> str:
+    return PRICE_BUCKET_LABELS[bucket - 1]
+
+
+def year_bucket_range(bucket: int) -> Tuple[int, int]:
+    return bucket, bucket + YEAR_BUCKET_SIZE - 1
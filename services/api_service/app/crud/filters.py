@@ -0,0 +1,77 @@
+# services/api_service/app/crud/filters.py
+"""
+Условия фильтров по объявлениям.
+
+Режим каждого текстового фильтра задается полем <фильтр>_match, для остальных - полем
+match фильтров:
+- fuzzy (по умолчанию): ILIKE '%значение%' (подстрока без учета регистра), GIN-индекс pg_trgm;
+- exact: lower(колонка) = lower(значение), индекс по lower(колонка).
+Оба индекса есть у каждой колонки TEXT_FILTER_FIELDS.
+"""
+from typing import Literal
+
+from sqlalchemy import func
+
+from app.db.models import AUTO_AD_TEXT_FILTER_COLUMNS, AutoAd
+from app.schemas.ads import AdFilters
+
+MatchMode = Literal["exact", "fuzzy"]
+
+# Поиск по подстроке, как и раньше; точное совпадение клиент запрашивает явно (match=exact)
+DEFAULT_MATCH_MODE: MatchMode = "fuzzy"
+
+TEXT_FILTER_FIELDS = AUTO_AD_TEXT_FILTER_COLUMNS
+
+
+def match_mode(filters: AdFilters, field: str) -> MatchMode:
+    return getattr(filters, f"{field}_match") or filters.match or DEFAULT_MATCH_MODE
+
+
+def escape_like(value: str) -> str:
+    """Экранирует спецсимволы LIKE, чтобы значение искалось как подстрока"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def text_condition(column, value: str, mode: MatchMode):
+    if mode == "exact":
+        return func.lower(column) == value.lower()
+    return column.ilike(f"%{escape_like(value)}%", escape="\\")
+
+
+def build_ad_conditions(filters: AdFilters) -> list:
+    """Условия WHERE для фильтров списка объявлений"""
+    conditions = []
+
+    for field in TEXT_FILTER_FIELDS:
+        value = getattr(filters, field)
+        if value:
+            conditions.append(text_condition(getattr(AutoAd, field), value, match_mode(filters, field)))
+
+    if filters.year_from:
+        conditions.append(AutoAd.year >= filters.year_from)
+
+    if filters.year_to:
+        conditions.append(AutoAd.year <= filters.year_to)
+
+    if filters.price_from:
+        conditions.append(AutoAd.price >= filters.price_from)
+
+    if filters.price_to:
+        conditions.append(AutoAd.price <= filters.price_to)
+
+    if filters.mileage_from:
+        conditions.append(AutoAd.mileage >= filters.mileage_from)
+
+    if filters.mileage_to:
+        conditions.append(AutoAd.mileage <= filters.mileage_to)
+
+    if filters.source_name:
+        conditions.append(AutoAd.source_name == filters.source_name)
+
+    if filters.sold is not None:
+        if filters.sold:
+            conditions.append(AutoAd.sold_at.isnot(None))
+        else:
+            conditions.append(AutoAd.sold_at.is_(None))
+
+    return conditions
@@ -0,0 +1,91 @@
+# services/api_service/app/crud/pagination.py
+"""
+Keyset-пагинация: следующая страница выбирается условием (sort_column, id_ad) > последней
+строки предыдущей страницы вместо OFFSET, поэтому страница N стоит столько же, сколько первая.
+
+Курсор непрозрачен для клиента: base64 от JSON [sort_by, sort_order, значение, id_ad].
+Порядок строк совпадает с offset-режимом (NULL в конце при asc и в начале при desc,
+как по умолчанию в PostgreSQL), id_ad разрешает равенство значений.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import Column, DateTime, and_, asc, desc, tuple_
+
+from app.db.models import AutoAd
+
+
+class InvalidCursorError(ValueError):
+    """Курсор поврежден или выдан для другой сортировки."""
+
+
+def resolve_sort_column(sort_by: str) -> Column:
+    """Колонка сортировки auto_ad; неизвестное поле - как в offset-режиме, createdAt."""
+    return AutoAd.__table__.c.get(sort_by, AutoAd.__table__.c.createdAt)
+
+
+def encode_cursor(sort_column: Column, sort_order: str, value: Any, id_ad: str) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort_column.name, sort_order, value, id_ad], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_column: Column, sort_order: str) -> Tuple[Any, str]:
+    """Возвращает (значение колонки сортировки, id_ad) последней строки предыдущей страницы."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_by, order, value, id_ad = json.loads(payload)
+        if value is not None and isinstance(sort_column.type, DateTime):
+            value = datetime.fromisoformat(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise InvalidCursorError("Некорректный курсор") from e
+
+    if sort_by != sort_column.name or order != sort_order or not isinstance(id_ad, str):
+        raise InvalidCursorError("Курсор выдан для другой сортировки")
+    return value, id_ad
+
+
+def keyset_order_by(sort_column: Column, descending: bool) -> list:
+    direction = desc if descending else asc
+    return [direction(sort_column), direction(AutoAd.__table__.c.id_ad)]
+
+
+def keyset_segments(sort_column: Column, descending: bool, cursor: Optional[Tuple[Any, str]] = None) -> List[list]:
+    """
+    Условия для частей выборки в порядке сортировки: строки с NULL в колонке сортировки
+    и остальные читаются отдельными запросами, чтобы каждое условие оставалось
+    диапазоном по индексу (OR с IS NULL вынудил бы читать таблицу с начала).
+    """
+    id_column = AutoAd.__table__.c.id_ad
+    if not sort_column.nullable:
+        segments = [("values", [])]
+    else:
+        values = ("values", [sort_column.isnot(None)])
+        nulls = ("nulls", [sort_column.is_(None)])
+        # PostgreSQL: NULLS LAST при asc и NULLS FIRST при desc
+        segments = [nulls, values] if descending else [values, nulls]
+
+    if cursor is None:
+        return [conditions for _, conditions in segments]
+
+    value, last_id = cursor
+    cursor_segment = "nulls" if value is None else "values"
+    names = [name for name, _ in segments]
+    if cursor_segment not in names:
+        raise InvalidCursorError("Курсор выдан для другой сортировки")
+    segments = segments[names.index(cursor_segment):]
+
+    if value is None:
+        after = id_column < last_id if descending else id_column > last_id
+    elif descending:
+        # Первое условие - диапазон по индексу колонки сортировки, второе - точная граница
+        after = and_(sort_column <= value, tuple_(sort_column, id_column) < tuple_(value, last_id))
+    else:
+        after = and_(sort_column >= value, tuple_(sort_column, id_column) > tuple_(value, last_id))
+
+    _, first_conditions = segments[0]
+    return [first_conditions + [after]] + [conditions for _, conditions in segments[1:]]
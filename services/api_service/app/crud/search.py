@@ -0,0 +1,91 @@
+# services/api_service/app/crud/search.py
+"""
+Полнотекстовый поиск по объявлениям.
+
+Колонка auto_ad.search_vector (марка и модель, заголовок, версия, город с весами A-D)
+поддерживается триггером при записи объявлений и индексирована GIN. В ORM-модели она
+загружается отложенно (deferred), чтобы не читаться в списках объявлений.
+
+Встроенного польского словаря в PostgreSQL нет: польский текст индексируется конфигурацией
+simple (без стемминга и диакритики, функция auto_ad_search_fold), а окончания покрываются
+префиксным поиском; английский - english.
+
+Ранжируется не больше SEARCH_RANK_WINDOW совпадений из GIN-индекса: для обычных запросов
+это все совпадения, а запрос по очень частому слову не читает и не сортирует десятки тысяч строк.
+"""
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy import desc, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from app.core.config import settings
+from app.db.models import AutoAd
+
+search_vector = AutoAd.search_vector
+
+# Конфигурации текстового поиска по языку запроса; без языка запрос ищется в обеих
+SEARCH_CONFIGS: Dict[str, str] = {
+    "pl": "simple",
+    "en": "english",
+}
+
+# Слова запроса: буквы (включая польские) и цифры, остальное - разделители
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def build_prefix_query(search_term: str) -> Optional[str]:
+    """
+    Текст запроса для to_tsquery: все слова обязательны, каждое ищется как префикс.
+    Спецсимволы tsquery отбрасываются, поэтому ввод пользователя не ломает запрос.
+    """
+    words = _WORD_RE.findall(search_term.lower())
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def build_tsquery(search_term: str, lang: Optional[str] = None):
+    query_text = build_prefix_query(search_term)
+    if query_text is None:
+        return None
+    configs = [SEARCH_CONFIGS[lang]] if lang else list(SEARCH_CONFIGS.values())
+    tsquery = None
+    for config in configs:
+        # Лексемы simple в индексе хранятся без диакритики - запрос приводится так же
+        config_query = func.to_tsquery(
+            config, func.auto_ad_search_fold(query_text) if config == "simple" else query_text
+        )
+        tsquery = config_query if tsquery is None else tsquery.op("||")(config_query)
+    return tsquery
+
+
+async def search_ads(
+    session: AsyncSession,
+    search_term: str,
+    limit: int = 20,
+    lang: Optional[str] = None
+) -> List[AutoAd]:
+    """Полнотекстовый поиск по объявлениям с ранжированием по ts_rank"""
+    tsquery = build_tsquery(search_term, lang)
+    if tsquery is None:
+        return []
+
+    # Окно кандидатов без сортировки: план всегда идет от GIN-индекса и останавливается
+    # на SEARCH_RANK_WINDOW строках (сортировка по createdAt провоцировала обход всей таблицы
+    # по индексу даты, если планировщик переоценивал число совпадений префиксного запроса)
+    candidates = (
+        select(AutoAd.id_ad, AutoAd.createdAt, func.ts_rank(search_vector, tsquery).label("rank"))
+        .where(search_vector.op("@@")(tsquery))
+        .limit(settings.SEARCH_RANK_WINDOW)
+        .subquery("candidates")
+    )
+    query = (
+        select(AutoAd)
+        .join(candidates, candidates.c.id_ad == AutoAd.id_ad)
+        .order_by(desc(candidates.c.rank), desc(candidates.c.createdAt))
+        .limit(limit)
+    )
+    result = await session.execute(query)
+    return list(result.scalars().all())
@@ -1,123 +1,154 @@
 # services/api_service/app/crud/stats.py
-from typing import List, Dict, Any
+"""
+Статистика объявлений из материализованных витрин stats_* (миграция a1c4e7b9d3f2).
+
+Витрины обновляет data_processor (python -m app.stats_refresh), поэтому запросы
+дашборда читают десятки-сотни строк агрегатов и не сканируют auto_ad. Средние
+считаются из сумм и количеств, время обновления витрин хранится в stats_snapshot.
+
+Медиана цены (STATS_MEDIAN_SOURCE): exact - витрина stats_price_median (полная
+сортировка цен при обновлении), histogram - интерполяция по логарифмической
+гистограмме stats_price_histogram (погрешность до 2%, без сортировки).
+"""
+from typing import List, Dict, Any, Sequence
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import func, select, and_, text, case
+from sqlalchemy import func, literal, select, column, table
 from datetime import datetime, timedelta
 
-from app.db.models import AutoAd, AutoAdHistory
+from app.core.config import settings
+from app.crud.filters import MatchMode, text_condition
+from app.db.models import StatsSnapshot
 
+stats_global = table(
+    "stats_global",
+    column("total_ads"), column("active_ads"), column("avg_price"), column("avg_mileage"),
+)
+stats_price_median = table("stats_price_median", column("median_price"))
+# Интервал bucket - цены [gamma^bucket, gamma^(bucket + 1)), миграция e8b3f6a1c9d4
+stats_price_histogram = table("stats_price_histogram", column("bucket"), column("ads_count"))
+PRICE_HISTOGRAM_GAMMA = 1.02
+stats_make = table(
+    "stats_make",
+    column("make_name"), column("ads_count"), column("priced_count"),
+    column("price_sum"), column("min_price"), column("max_price"),
+)
+stats_make_model = table(
+    "stats_make_model",
+    column("make_name"), column("model_name"), column("ads_count"), column("priced_count"),
+    column("price_sum"), column("min_price"), column("max_price"),
+)
+stats_region = table("stats_region", column("region"), column("priced_count"), column("price_sum"))
+stats_price_bucket = table("stats_price_bucket", column("bucket"), column("price_range"), column("ads_count"))
+stats_year = table("stats_year", column("year"), column("ads_count"))
+stats_daily = table("stats_daily", column("day"), column("priced_count"), column("price_sum"))
 
-async def get_general_stats(session: AsyncSession) -> Dict[str, Any]:
-    """Получение общей статистики"""
-    
-    # Общее количество объявлений
-    total_ads_query = select(func.count(AutoAd.id_ad))
-    total_ads_result = await session.execute(total_ads_query)
-    total_ads = total_ads_result.scalar()
-    
-    # Активные объявления
-    active_ads_query = select(func.count(AutoAd.id_ad)).where(AutoAd.sold_at.is_(None))
-    active_ads_result = await session.execute(active_ads_query)
-    active_ads = active_ads_result.scalar()
-    
-    # Проданные объявления
-    sold_ads = total_ads - active_ads
-    
-    # Средняя цена
-    avg_price_query = select(func.avg(AutoAd.price)).where(
-        and_(AutoAd.price.isnot(None), AutoAd.price > 0)
-    )
-    avg_price_result = await session.execute(avg_price_query)
-    avg_price = avg_price_result.scalar() or 0
-    
-    # Медианная цена (приблизительно через percentile)
-    median_price_query = select(
-        func.percentile_cont(0.5).within_group(AutoAd.price.asc())
-    ).where(and_(AutoAd.price.isnot(None), AutoAd.price > 0))
-    median_price_result = await session.execute(median_price_query)
-    median_price = median_price_result.scalar() or 0
-    
-    # Средний пробег
-    avg_mileage_query = select(func.avg(AutoAd.mileage)).where(
-        and_(AutoAd.mileage.isnot(None), AutoAd.mileage > 0)
+
+def _avg(price_sum, count) -> float:
+    return round(price_sum / count, 2) if count else 0
+
+
+async def get_snapshot_info(session: AsyncSession, view_names: Sequence[str]) -> Dict[str, Any]:
+    """Время обновления самой старой из витрин ответа и ее возраст в секундах"""
+    query = select(
+        func.min(StatsSnapshot.refreshed_at),
+        func.extract("epoch", func.now() - func.min(StatsSnapshot.refreshed_at)),
+    ).where(StatsSnapshot.view_name.in_(view_names))
+    refreshed_at, age = (await session.execute(query)).one()
+    return {
+        "snapshot_refreshed_at": refreshed_at.isoformat() if refreshed_at else None,
+        "snapshot_age_seconds": round(float(age), 1) if age is not None else None,
+    }
+
+
+MEDIAN_VIEWS = {"exact": "stats_price_median", "histogram": "stats_price_histogram"}
+
+# Витрины, из которых собирается get_general_stats
+GENERAL_STATS_VIEWS = ["stats_global", "stats_make", "stats_make_model", MEDIAN_VIEWS[settings.STATS_MEDIAN_SOURCE]]
+
+
+def histogram_median():
+    """
+    Медиана по гистограмме: первый интервал, где накопленное число объявлений достигает
+    половины, и линейная интерполяция внутри него.
+    """
+    histogram = select(
+        stats_price_histogram.c.bucket,
+        stats_price_histogram.c.ads_count,
+        func.sum(stats_price_histogram.c.ads_count).over(order_by=stats_price_histogram.c.bucket).label("cumulative"),
+        (func.sum(stats_price_histogram.c.ads_count).over() / 2.0).label("half"),
+    ).subquery()
+    lower = func.power(literal(PRICE_HISTOGRAM_GAMMA), histogram.c.bucket)
+    share = (histogram.c.half - (histogram.c.cumulative - histogram.c.ads_count)) / histogram.c.ads_count
+    return (
+        select(lower + lower * (PRICE_HISTOGRAM_GAMMA - 1) * share)
+        .where(histogram.c.cumulative >= histogram.c.half)
+        .order_by(histogram.c.bucket)
+        .limit(1)
+        .scalar_subquery()
     )
-    avg_mileage_result = await session.execute(avg_mileage_query)
-    avg_mileage = avg_mileage_result.scalar() or 0
+
+
+def median_price():
+    if settings.STATS_MEDIAN_SOURCE == "histogram":
+        return histogram_median()
+    return select(stats_price_median.c.median_price).scalar_subquery()
+
+
+async def get_general_stats(session: AsyncSession) -> Dict[str, Any]:
+    """Получение общей статистики одним запросом к витринам"""
     
     # Самая популярная марка
-    popular_make_query = (
-        select(AutoAd.make_name, func.count(AutoAd.id_ad).label('count'))
-        .where(AutoAd.make_name.isnot(None))
-        .group_by(AutoAd.make_name)
-        .order_by(func.count(AutoAd.id_ad).desc())
+    popular_make = (
+        select(stats_make.c.make_name)
+        .order_by(stats_make.c.ads_count.desc(), stats_make.c.make_name)
         .limit(1)
+        .scalar_subquery()
     )
-    popular_make_result = await session.execute(popular_make_query)
-    popular_make_row = popular_make_result.first()
-    most_popular_make = popular_make_row[0] if popular_make_row else "N/A"
     
     # Самая популярная модель
-    popular_model_query = (
-        select(
-            AutoAd.make_name,
-            AutoAd.model_name,
-            func.count(AutoAd.id_ad).label('count')
-        )
-        .where(and_(AutoAd.make_name.isnot(None), AutoAd.model_name.isnot(None)))
-        .group_by(AutoAd.make_name, AutoAd.model_name)
-        .order_by(func.count(AutoAd.id_ad).desc())
+    popular_model = (
+        select(stats_make_model.c.make_name + " " + stats_make_model.c.model_name)
+        .order_by(stats_make_model.c.ads_count.desc(), stats_make_model.c.make_name, stats_make_model.c.model_name)
         .limit(1)
+        .scalar_subquery()
+    )
+    
+    query = select(
+        stats_global.c.total_ads,
+        stats_global.c.active_ads,
+        stats_global.c.avg_price,
+        median_price().label("median_price"),
+        stats_global.c.avg_mileage,
+        popular_make.label("most_popular_make"),
+        popular_model.label("most_popular_model"),
     )
-    popular_model_result = await session.execute(popular_model_query)
-    popular_model_row = popular_model_result.first()
-    most_popular_model = f"{popular_model_row[0]} {popular_model_row[1]}" if popular_model_row else "N/A"
+    totals = (await session.execute(query)).one()
     
     return {
-        "total_ads": total_ads,
-        "active_ads": active_ads,
-        "sold_ads": sold_ads,
-        "avg_price": round(avg_price, 2),
-        "median_price": round(median_price, 2),
-        "avg_mileage": round(avg_mileage, 2),
-        "most_popular_make": most_popular_make,
-        "most_popular_model": most_popular_model
+        "total_ads": totals.total_ads,
+        "active_ads": totals.active_ads,
+        "sold_ads": totals.total_ads - totals.active_ads,
+        "avg_price": round(totals.avg_price or 0, 2),
+        "median_price": round(totals.median_price or 0, 2),
+        "avg_mileage": round(totals.avg_mileage or 0, 2),
+        "most_popular_make": totals.most_popular_make or "N/A",
+        "most_popular_model": totals.most_popular_model or "N/A"
     }
 
 
 async def get_price_distribution(session: AsyncSession) -> List[Dict[str, Any]]:
     """Получение распределения цен по диапазонам"""
     
-    price_ranges_query = select(
-        case(
-            (AutoAd.price < 5000, "0-5K"),
-            (AutoAd.price < 10000, "5K-10K"),
-            (AutoAd.price < 20000, "10K-20K"),
-            (AutoAd.price < 30000, "20K-30K"),
-            (AutoAd.price < 50000, "30K-50K"),
-            (AutoAd.price < 100000, "50K-100K"),
-            else_="100K+"
-        ).label("price_range"),
-        func.count(AutoAd.id_ad).label("count")
-    ).where(
-        and_(AutoAd.price.isnot(None), AutoAd.price > 0)
-    ).group_by("price_range")
-    
-    result = await session.execute(price_ranges_query)
+    query = select(stats_price_bucket.c.price_range, stats_price_bucket.c.ads_count).order_by(stats_price_bucket.c.bucket)
+    result = await session.execute(query)
     return [{"price_range": row[0], "count": row[1]} for row in result.fetchall()]
 
 
 async def get_year_distribution(session: AsyncSession) -> List[Dict[str, Any]]:
     """Получение распределения по годам выпуска"""
     
-    year_query = (
-        select(AutoAd.year, func.count(AutoAd.id_ad).label("count"))
-        .where(and_(AutoAd.year.isnot(None), AutoAd.year > 1990))
-        .group_by(AutoAd.year)
-        .order_by(AutoAd.year.desc())
-        .limit(20)
-    )
-    
-    result = await session.execute(year_query)
+    query = select(stats_year.c.year, stats_year.c.ads_count).order_by(stats_year.c.year.desc()).limit(20)
+    result = await session.execute(query)
     return [{"year": row[0], "count": row[1]} for row in result.fetchall()]
 
 
@@ -125,14 +156,8 @@ async def get_region_stats(session: AsyncSession, limit: int = 10) -> List[Dict[
     """Получение статистики по регионам"""
     
     region_query = (
-        select(
-            AutoAd.region,
-            func.count(AutoAd.id_ad).label("count"),
-            func.avg(AutoAd.price).label("avg_price")
-        )
-        .where(and_(AutoAd.region.isnot(None), AutoAd.price.isnot(None), AutoAd.price > 0))
-        .group_by(AutoAd.region)
-        .order_by(func.count(AutoAd.id_ad).desc())
+        select(stats_region.c.region, stats_region.c.priced_count, stats_region.c.price_sum)
+        .order_by(stats_region.c.priced_count.desc(), stats_region.c.region)
         .limit(limit)
     )
     
@@ -141,7 +166,7 @@ async def get_region_stats(session: AsyncSession, limit: int = 10) -> List[Dict[
         {
             "region": row[0],
             "count": row[1],
-            "avg_price": round(row[2], 2) if row[2] else 0
+            "avg_price": _avg(row[2], row[1])
         }
         for row in result.fetchall()
     ]
@@ -152,15 +177,14 @@ async def get_make_stats(session: AsyncSession, limit: int = 10) -> List[Dict[st
     
     make_query = (
         select(
-            AutoAd.make_name,
-            func.count(AutoAd.id_ad).label("count"),
-            func.avg(AutoAd.price).label("avg_price"),
-            func.min(AutoAd.price).label("min_price"),
-            func.max(AutoAd.price).label("max_price")
+            stats_make.c.make_name,
+            stats_make.c.priced_count,
+            stats_make.c.price_sum,
+            stats_make.c.min_price,
+            stats_make.c.max_price
         )
-        .where(and_(AutoAd.make_name.isnot(None), AutoAd.price.isnot(None), AutoAd.price > 0))
-        .group_by(AutoAd.make_name)
-        .order_by(func.count(AutoAd.id_ad).desc())
+        .where(stats_make.c.priced_count > 0)
+        .order_by(stats_make.c.priced_count.desc(), stats_make.c.make_name)
         .limit(limit)
     )
     
@@ -169,7 +193,7 @@ async def get_make_stats(session: AsyncSession, limit: int = 10) -> List[Dict[st
         {
             "make_name": row[0],
             "count": row[1],
-            "avg_price": round(row[2], 2) if row[2] else 0,
+            "avg_price": _avg(row[2], row[1]),
             "min_price": row[3] or 0,
             "max_price": row[4] or 0
         }
@@ -177,35 +201,29 @@ async def get_make_stats(session: AsyncSession, limit: int = 10) -> List[Dict[st
     ]
 
 
-async def get_model_stats(session: AsyncSession, make_name: str = None, limit: int = 10) -> List[Dict[str, Any]]:
+async def get_model_stats(
+    session: AsyncSession, make_name: str = None, limit: int = 10, match: MatchMode = "fuzzy"
+) -> List[Dict[str, Any]]:
     """Получение статистики по моделям"""
     
     query = (
         select(
-            AutoAd.make_name,
-            AutoAd.model_name,
-            func.count(AutoAd.id_ad).label("count"),
-            func.avg(AutoAd.price).label("avg_price"),
-            func.min(AutoAd.price).label("min_price"),
-            func.max(AutoAd.price).label("max_price")
-        )
-        .where(
-            and_(
-                AutoAd.make_name.isnot(None),
-                AutoAd.model_name.isnot(None),
-                AutoAd.price.isnot(None),
-                AutoAd.price > 0
-            )
+            stats_make_model.c.make_name,
+            stats_make_model.c.model_name,
+            stats_make_model.c.priced_count,
+            stats_make_model.c.price_sum,
+            stats_make_model.c.min_price,
+            stats_make_model.c.max_price
         )
+        .where(stats_make_model.c.priced_count > 0)
     )
     
     if make_name:
-        query = query.where(AutoAd.make_name.ilike(f"%{make_name}%"))
+        query = query.where(text_condition(stats_make_model.c.make_name, make_name, match))
     
     query = (
         query
-        .group_by(AutoAd.make_name, AutoAd.model_name)
-        .order_by(func.count(AutoAd.id_ad).desc())
+        .order_by(stats_make_model.c.priced_count.desc(), stats_make_model.c.make_name, stats_make_model.c.model_name)
         .limit(limit)
     )
     
@@ -215,7 +233,7 @@ async def get_model_stats(session: AsyncSession, make_name: str = None, limit: i
             "make_name": row[0],
             "model_name": row[1],
             "count": row[2],
-            "avg_price": round(row[3], 2) if row[3] else 0,
+            "avg_price": _avg(row[3], row[2]),
             "min_price": row[4] or 0,
             "max_price": row[5] or 0
         }
@@ -236,32 +254,27 @@ async def get_market_trends(session: AsyncSession, period: str = "daily", days:
     else:
         date_trunc = "day"
     
-    # Дата начала периода
+    # Витрина хранит итоги по дням, поэтому период начинается с полуночи первого дня
     start_date = datetime.now() - timedelta(days=days)
     
+    period_column = func.date_trunc(date_trunc, stats_daily.c.day)
     trends_query = (
         select(
-            func.date_trunc(date_trunc, AutoAd.createdAt).label("period"),
-            func.count(AutoAd.id_ad).label("count"),
-            func.avg(AutoAd.price).label("avg_price")
+            period_column.label("period"),
+            func.sum(stats_daily.c.priced_count).label("count"),
+            func.sum(stats_daily.c.price_sum).label("price_sum")
         )
-        .where(
-            and_(
-                AutoAd.createdAt >= start_date,
-                AutoAd.price.isnot(None),
-                AutoAd.price > 0
-            )
-        )
-        .group_by(func.date_trunc(date_trunc, AutoAd.createdAt))
-        .order_by(func.date_trunc(date_trunc, AutoAd.createdAt))
+        .where(stats_daily.c.day >= func.date_trunc("day", start_date))
+        .group_by(period_column)
+        .order_by(period_column)
     )
     
     result = await session.execute(trends_query)
     return [
         {
             "date": row[0].isoformat() if row[0] else None,
-            "count": row[1],
-            "avg_price": round(row[2], 2) if row[2] else 0
+            "count": int(row[1]),
+            "avg_price": _avg(row[2], row[1])
         }
         for row in result.fetchall()
     ]
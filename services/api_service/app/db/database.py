@@ -1,17 +1,19 @@
 # services/api_service/app/db/database.py
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+import asyncio
+from functools import partial
+from typing import Any, Awaitable, Callable, List, Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from sqlmodel import SQLModel
 
 from app.core.config import settings
+from app.core.db_pool import create_pooled_engine
+from app.core.request_timing import instrument_engine_timing
 
-# Создание асинхронного движка
-engine = create_async_engine(
-    settings.database_url,
-    echo=False,  # В продакшене лучше отключить
-    future=True,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-)
+# Создание асинхронного движка; пул и метрики пула - DB_POOL_* (app/core/db_pool.py)
+engine = create_pooled_engine(settings.database_url, settings, "api")
+# Время запросов к БД для Server-Timing
+instrument_engine_timing(engine)
 
 # Создание фабрики сессий
 AsyncSessionLocal = async_sessionmaker(
@@ -30,6 +32,43 @@ async def get_session() -> AsyncSession:
             await session.close()
 
 
+class QueryTimeoutError(Exception):
+    """Запрос run_concurrently не уложился в отведенное время"""
+
+
+Query = Callable[[AsyncSession], Awaitable[Any]]
+
+
+def _query_name(query: Query) -> str:
+    function = query.func if isinstance(query, partial) else query
+    return getattr(function, "__name__", repr(function))
+
+
+async def _run_query(query: Query, timeout: Optional[float]) -> Any:
+    async with AsyncSessionLocal() as session:
+        try:
+            return await asyncio.wait_for(query(session), timeout)
+        except asyncio.TimeoutError:
+            raise QueryTimeoutError(f"Запрос {_query_name(query)} не выполнен за {timeout} с") from None
+
+
+async def run_concurrently(*queries: Query, timeout: Optional[float] = None) -> List[Any]:
+    """
+    Выполняет независимые запросы на чтение одновременно, каждый в своей сессии (и
+    соединении из пула), и возвращает их результаты в том же порядке. Время ответа -
+    самый долгий запрос, а не сумма. Запрос, не уложившийся в timeout секунд,
+    отменяется с QueryTimeoutError; при ошибке одного запроса остальные отменяются.
+    """
+    tasks = [asyncio.ensure_future(_run_query(query, timeout)) for query in queries]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
 async def create_db_and_tables():
     """Создание таблиц в базе данных (если нужно)"""
     async with engine.begin() as conn:
@@ -1,12 +1,21 @@
 # services/api_service/app/main.py
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 from app.core.config import settings
 from app.core.security import get_cors_origins
-from app.core.middleware import LoggingMiddleware, ErrorHandlingMiddleware
+from app.core.middleware import AccessLogMiddleware
+from app.core.conditional_get import ConditionalGetMiddleware
+from app.core.data_changes import DataChangeListener
+from app.core.metrics import METRICS_AVAILABLE, render_metrics
+from app.core.response_cache import ResponseCacheMiddleware, response_cache
+from app.core.serialization import TimedJSONResponse
+from app.crud.ads import clear_count_cache
+from app.crud.facets import clear_facet_snapshot
+from app.db.database import QueryTimeoutError
 from app.routers import ads, stats, health
 
 # Настройка логирования
@@ -20,11 +29,29 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=TimedJSONResponse,
 )
 
+# Версии данных и сброс кэшей по уведомлениям data_processor
+data_change_listener = DataChangeListener(settings.asyncpg_dsn)
+data_change_listener.subscribe("ads", response_cache.invalidate)
+data_change_listener.subscribe("ads", clear_count_cache)
+data_change_listener.subscribe("stats", response_cache.invalidate)
+data_change_listener.subscribe("stats", clear_facet_snapshot)
+
 # Добавление middleware
-app.add_middleware(ErrorHandlingMiddleware)
-app.add_middleware(LoggingMiddleware)
+# Кэш ответов добавляется первым, чтобы быть ближе всех к роутам: CORS-заголовки
+# зависят от Origin запроса и не должны попадать в кэш
+if settings.RESPONSE_CACHE_ENABLED:
+    app.add_middleware(ResponseCacheMiddleware, cache=response_cache)
+# Условные GET снаружи кэша: 304 отдается без обращения к кэшу и БД
+app.add_middleware(ConditionalGetMiddleware, versions=data_change_listener)
+app.add_middleware(
+    AccessLogMiddleware,
+    sample_rate=settings.ACCESS_LOG_SAMPLE_RATE,
+    slow_ms=settings.ACCESS_LOG_SLOW_MS,
+    server_timing=settings.SERVER_TIMING_ENABLED,
+)
 
 # Настройка CORS
 app.add_middleware(
@@ -40,6 +67,12 @@ app.include_router(health.router, prefix="/health", tags=["Health"])
 app.include_router(ads.router, prefix="/api/v1/ads", tags=["Ads"])
 app.include_router(stats.router, prefix="/api/v1/stats", tags=["Statistics"])
 
+@app.exception_handler(QueryTimeoutError)
+async def query_timeout_handler(request: Request, exc: QueryTimeoutError):
+    """Запрос к БД не уложился в CONCURRENT_QUERY_TIMEOUT"""
+    logger.warning(f"{request.method} {request.url.path}: {exc}")
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 @app.get("/")
 async def root():
     """Корневой эндпоинт API"""
@@ -55,16 +88,25 @@ async def root():
         }
     }
 
+if settings.METRICS_ENABLED and METRICS_AVAILABLE:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Метрики Prometheus"""
+        body, content_type = render_metrics()
+        return Response(content=body, media_type=content_type)
+
 @app.on_event("startup")
 async def startup_event():
     """События при запуске приложения"""
     logger.info("Starting EuroAutoDataHub API...")
     logger.info(f"Database URL: {settings.database_url.split('@')[1] if '@' in settings.database_url else 'masked'}")
+    data_change_listener.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """События при остановке приложения"""
     logger.info("Shutting down EuroAutoDataHub API...")
+    await data_change_listener.stop()
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -1,18 +1,33 @@
 # services/api_service/app/routers/ads.py
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 import math
 
 from app.db.database import get_session
 from app.crud.ads import (
+    ad_row_to_dict,
     get_ads_with_filters,
+    get_ads_keyset,
     get_ad_by_id,
     get_ad_history,
     get_makes_list,
-    get_models_by_make,
-    search_ads
+    get_models_by_make
 )
+from app.crud.export import EXPORT_FORMATS, export_ads, export_format_available
+from app.crud.facets import (
+    DEFAULT_FACETS,
+    FACET_BUCKETS,
+    FACET_EXPRESSIONS,
+    count_facets,
+    get_facet_snapshot,
+    price_bucket_label,
+    year_bucket_range
+)
+from app.crud.filters import build_ad_conditions
+from app.crud.search import search_ads
+from app.crud.pagination import InvalidCursorError
 from app.schemas.ads import (
     AdResponse,
     AdListResponse,
@@ -21,18 +36,12 @@ from app.schemas.ads import (
     AdPriceHistory
 )
 from app.core.config import settings
+from app.core.serialization import FastJSONResponse
 
 router = APIRouter()
 
 
-@router.get("/", response_model=AdListResponse)
-async def get_ads(
-    page: int = Query(1, ge=1, description="Номер страницы"),
-    page_size: int = Query(20, ge=1, le=100, description="Размер страницы"),
-    sort_by: str = Query("createdAt", description="Поле для сортировки"),
-    sort_order: str = Query("desc", regex="^(asc|desc)$", description="Порядок сортировки"),
-    
-    # Фильтры
+def get_ad_filters(
     make_name: Optional[str] = Query(None, description="Марка автомобиля"),
     model_name: Optional[str] = Query(None, description="Модель автомобиля"),
     year_from: Optional[int] = Query(None, ge=1900, le=2030, description="Год выпуска от"),
@@ -47,16 +56,20 @@ async def get_ads(
     region: Optional[str] = Query(None, description="Регион"),
     source_name: Optional[str] = Query(None, description="Источник данных"),
     sold: Optional[bool] = Query(None, description="Статус продажи (true - проданные, false - активные)"),
-    
-    session: AsyncSession = Depends(get_session)
-):
-    """Получение списка объявлений с фильтрами"""
-    
-    # Ограничиваем размер страницы
-    page_size = min(page_size, settings.MAX_PAGE_SIZE)
-    
-    # Создаем объект фильтров
-    filters = AdFilters(
+    match: Optional[str] = Query(None, regex="^(exact|fuzzy)$",
+                                 description="Сравнение текстовых фильтров: exact (без учета регистра) или "
+                                             "fuzzy (подстрока, по умолчанию)"),
+    make_name_match: Optional[str] = Query(None, regex="^(exact|fuzzy)$", description="Сравнение марки (вместо match)"),
+    model_name_match: Optional[str] = Query(None, regex="^(exact|fuzzy)$", description="Сравнение модели (вместо match)"),
+    fuel_type_match: Optional[str] = Query(None, regex="^(exact|fuzzy)$",
+                                           description="Сравнение типа топлива (вместо match)"),
+    gearbox_match: Optional[str] = Query(None, regex="^(exact|fuzzy)$",
+                                         description="Сравнение коробки передач (вместо match)"),
+    city_match: Optional[str] = Query(None, regex="^(exact|fuzzy)$", description="Сравнение города (вместо match)"),
+    region_match: Optional[str] = Query(None, regex="^(exact|fuzzy)$", description="Сравнение региона (вместо match)"),
+) -> AdFilters:
+    """Фильтры объявлений из query-параметров (общие для списка, опций фильтров и фасетов)"""
+    return AdFilters(
         make_name=make_name,
         model_name=model_name,
         year_from=year_from,
@@ -70,31 +83,146 @@ async def get_ads(
         city=city,
         region=region,
         source_name=source_name,
-        sold=sold
+        sold=sold,
+        match=match,
+        make_name_match=make_name_match,
+        model_name_match=model_name_match,
+        fuel_type_match=fuel_type_match,
+        gearbox_match=gearbox_match,
+        city_match=city_match,
+        region_match=region_match,
     )
+
+
+@router.get("/", response_model=AdListResponse)
+async def get_ads(
+    page: int = Query(1, ge=1, description="Номер страницы"),
+    page_size: int = Query(20, ge=1, le=100, description="Размер страницы"),
+    sort_by: str = Query("createdAt", description="Поле для сортировки"),
+    sort_order: str = Query("desc", regex="^(asc|desc)$", description="Порядок сортировки"),
+    pagination: str = Query("offset", regex="^(offset|cursor)$",
+                            description="Режим пагинации: offset (по номеру страницы) или cursor (по курсору)"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из next_cursor (режим cursor)"),
+    count: Optional[str] = Query(None, regex="^(exact|estimated|cached)$",
+                                 description="Подсчет total: exact, estimated (оценка планировщика) или cached; "
+                                             "по умолчанию из настроек"),
+    
+    filters: AdFilters = Depends(get_ad_filters),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Получение списка объявлений с фильтрами. Строки сериализуются напрямую в JSON
+    (схема ответа - AdListResponse, но без валидации каждой строки моделью)
+    """
+    
+    # Ограничиваем размер страницы
+    page_size = min(page_size, settings.MAX_PAGE_SIZE)
+    
+    count_mode = count or settings.ADS_COUNT_MODE
     
     # Получаем данные
-    ads, total = await get_ads_with_filters(
-        session=session,
-        filters=filters,
-        page=page,
-        page_size=page_size,
-        sort_by=sort_by,
-        sort_order=sort_order
-    )
+    next_cursor = None
+    if pagination == "cursor" or cursor:
+        # Keyset-пагинация: стоимость страницы не зависит от ее номера
+        try:
+            ads, total, total_exact, next_cursor = await get_ads_keyset(
+                session=session,
+                filters=filters,
+                page_size=page_size,
+                sort_by=sort_by,
+                sort_order=sort_order,
+                cursor=cursor,
+                count_mode=count_mode
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        ads, total, total_exact = await get_ads_with_filters(
+            session=session,
+            filters=filters,
+            page=page,
+            page_size=page_size,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            count_mode=count_mode
+        )
     
     # Вычисляем общее количество страниц
     total_pages = math.ceil(total / page_size) if total > 0 else 0
     
-    return AdListResponse(
-        items=[AdResponse.model_validate(ad) for ad in ads],
-        total=total,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages
+    return FastJSONResponse({
+        "items": [ad_row_to_dict(ad) for ad in ads],
+        "total": total,
+        "total_exact": total_exact,
+        "page": page,
+        "page_size": page_size,
+        "total_pages": total_pages,
+        "next_cursor": next_cursor
+    })
+
+
+# Объявлен до /{ad_id}, иначе путь /export попадет в карточку объявления
+@router.get("/export")
+async def export_ads_stream(
+    filters: AdFilters = Depends(get_ad_filters),
+    format: str = Query("ndjson", regex="^(ndjson|csv|parquet)$", description="Формат: ndjson, csv или parquet"),
+    limit: Optional[int] = Query(None, ge=1, description="Максимальное число строк (по умолчанию - все)")
+):
+    """Потоковая выгрузка объявлений по фильтрам (серверный курсор, постоянная память)"""
+    
+    if not export_format_available(format):
+        raise HTTPException(status_code=400, detail="Формат parquet недоступен: не установлен пакет pyarrow")
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        export_ads(filters, format, limit),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="ads.{extension}"'}
     )
 
 
+# Объявлен до /{ad_id}, иначе путь /facets попадет в карточку объявления
+@router.get("/facets")
+async def get_ad_facets(
+    filters: AdFilters = Depends(get_ad_filters),
+    facets: Optional[str] = Query(None, description="Фасеты через запятую: " + ", ".join(FACET_EXPRESSIONS) +
+                                                    "; по умолчанию " + ",".join(DEFAULT_FACETS)),
+    limit: int = Query(50, ge=1, le=1000, description="Сколько самых частых значений вернуть по каждому фасету"),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Количество объявлений по значениям фасетов для текущего набора фильтров.
+    Все запрошенные фасеты считаются одним запросом (GROUPING SETS)
+    """
+    
+    requested = list(dict.fromkeys(name.strip() for name in (facets or "").split(",") if name.strip()))
+    requested = requested or list(DEFAULT_FACETS)
+    unknown = [name for name in requested if name not in FACET_EXPRESSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные фасеты: {', '.join(unknown)}")
+    
+    snapshot = await count_facets(session, build_ad_conditions(filters), requested)
+    
+    def facet_item(facet: str, value, count: int) -> dict:
+        if facet == "price_bucket":
+            return {"value": price_bucket_label(value), "count": count}
+        if facet == "year_bucket":
+            year_from, year_to = year_bucket_range(value)
+            return {"value": f"{year_from}-{year_to}", "year_from": year_from, "year_to": year_to, "count": count}
+        return {"value": value, "count": count}
+    
+    return {
+        "total": snapshot.total or 0,
+        "facets": {
+            facet: [
+                facet_item(facet, value, count)
+                for value, count in snapshot.values.get(facet, [])[:None if facet in FACET_BUCKETS else limit]
+            ]
+            for facet in requested
+        }
+    }
+
+
 @router.get("/{ad_id}", response_model=AdDetailResponse)
 async def get_ad_detail(
     ad_id: str,
@@ -121,11 +249,13 @@ async def get_ad_detail(
 async def search_ads_text(
     q: str = Query(..., min_length=2, description="Поисковый запрос"),
     limit: int = Query(20, ge=1, le=100, description="Количество результатов"),
+    lang: Optional[str] = Query(None, regex="^(pl|en)$",
+                                description="Язык запроса: pl, en; по умолчанию поиск по обоим"),
     session: AsyncSession = Depends(get_session)
 ):
-    """Полнотекстовый поиск по объявлениям"""
+    """Полнотекстовый поиск по объявлениям (ранжирование по релевантности, поиск по префиксам слов)"""
     
-    ads = await search_ads(session, q, limit)
+    ads = await search_ads(session, q, limit, lang)
     
     return {
         "query": q,
@@ -149,11 +279,13 @@ async def get_makes(session: AsyncSession = Depends(get_session)):
 @router.get("/models/list")
 async def get_models(
     make_name: str = Query(..., description="Название марки"),
+    match: str = Query("fuzzy", regex="^(exact|fuzzy)$",
+                       description="Сравнение марки: fuzzy (подстрока) или exact (без учета регистра)"),
     session: AsyncSession = Depends(get_session)
 ):
     """Получение списка моделей для конкретной марки"""
     
-    models = await get_models_by_make(session, make_name)
+    models = await get_models_by_make(session, make_name, match)
     
     return {
         "make_name": make_name,
@@ -163,60 +295,48 @@ async def get_models(
 
 
 @router.get("/filters/options")
-async def get_filter_options(session: AsyncSession = Depends(get_session)):
-    """Получение доступных опций для фильтров"""
-    
-    from sqlalchemy import select, func
-    from app.db.models import AutoAd
-    
-    # Получаем уникальные значения для фильтров
-    fuel_types_query = select(AutoAd.fuel_type).distinct().where(AutoAd.fuel_type.isnot(None))
-    fuel_types_result = await session.execute(fuel_types_query)
-    fuel_types = [ft for ft in fuel_types_result.scalars().all() if ft]
-    
-    gearbox_query = select(AutoAd.gearbox).distinct().where(AutoAd.gearbox.isnot(None))
-    gearbox_result = await session.execute(gearbox_query)
-    gearboxes = [gb for gb in gearbox_result.scalars().all() if gb]
-    
-    cities_query = select(AutoAd.city).distinct().where(AutoAd.city.isnot(None)).limit(50)
-    cities_result = await session.execute(cities_query)
-    cities = [city for city in cities_result.scalars().all() if city]
-    
-    regions_query = select(AutoAd.region).distinct().where(AutoAd.region.isnot(None))
-    regions_result = await session.execute(regions_query)
-    regions = [region for region in regions_result.scalars().all() if region]
-    
-    sources_query = select(AutoAd.source_name).distinct().where(AutoAd.source_name.isnot(None))
-    sources_result = await session.execute(sources_query)
-    sources = [source for source in sources_result.scalars().all() if source]
-    
-    # Диапазоны цен и годов
-    price_range_query = select(
-        func.min(AutoAd.price).label("min_price"),
-        func.max(AutoAd.price).label("max_price")
-    ).where(AutoAd.price.isnot(None))
-    price_range_result = await session.execute(price_range_query)
-    price_range = price_range_result.first()
-    
-    year_range_query = select(
-        func.min(AutoAd.year).label("min_year"),
-        func.max(AutoAd.year).label("max_year")
-    ).where(AutoAd.year.isnot(None))
-    year_range_result = await session.execute(year_range_query)
-    year_range = year_range_result.first()
+async def get_filter_options(
+    filters: AdFilters = Depends(get_ad_filters),
+    counts: bool = Query(False, description="Добавить количество объявлений по каждому значению (facet_counts)"),
+    cities_limit: int = Query(50, ge=1, le=1000, description="Сколько самых частых городов вернуть"),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Получение доступных опций для фильтров. Без фильтров - из снимка в памяти;
+    с фильтрами - опции и количества среди подходящих объявлений (один запрос)
+    """
     
-    return {
-        "fuel_types": sorted(fuel_types),
-        "gearboxes": sorted(gearboxes),
-        "cities": sorted(cities),
-        "regions": sorted(regions),
-        "sources": sorted(sources),
+    conditions = build_ad_conditions(filters)
+    if conditions:
+        snapshot = await count_facets(session, conditions)
+    else:
+        snapshot = await get_facet_snapshot()
+    
+    def facet_values(facet: str, limit: Optional[int] = None) -> List[str]:
+        return sorted(value for value, _ in snapshot.values.get(facet, [])[:limit])
+    
+    response = {
+        "fuel_types": facet_values("fuel_type"),
+        "gearboxes": facet_values("gearbox"),
+        "cities": facet_values("city", cities_limit),
+        "regions": facet_values("region"),
+        "sources": facet_values("source_name"),
         "price_range": {
-            "min": price_range[0] if price_range and price_range[0] else 0,
-            "max": price_range[1] if price_range and price_range[1] else 0
+            "min": snapshot.min_price or 0,
+            "max": snapshot.max_price or 0
         },
         "year_range": {
-            "min": year_range[0] if year_range and year_range[0] else 1990,
-            "max": year_range[1] if year_range and year_range[1] else 2024
-        }
+            "min": snapshot.min_year or 1990,
+            "max": snapshot.max_year or 2024
+        },
+        "snapshot_refreshed_at": snapshot.refreshed_at.isoformat() if snapshot.refreshed_at else None
     }
+    if counts:
+        response["facet_counts"] = {
+            facet: [
+                {"value": value, "count": count}
+                for value, count in (values[:cities_limit] if facet == "city" else values)
+            ]
+            for facet, values in snapshot.values.items()
+        }
+    return response
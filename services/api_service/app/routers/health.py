@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from datetime import datetime
 
+from app.core.response_cache import response_cache
 from app.db.database import get_session
 from app.schemas.common import HealthCheck
 
@@ -58,3 +59,12 @@ async def database_health(session: AsyncSession = Depends(get_session)):
         
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Database unhealthy: {str(e)}")
+
+
+@router.get("/cache")
+async def cache_health():
+    """Метрики кэша ответов: попадания, промахи, доля попаданий, сбросы"""
+    return {
+        **response_cache.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
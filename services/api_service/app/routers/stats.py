@@ -1,9 +1,11 @@
 # services/api_service/app/routers/stats.py
+from functools import partial
 from typing import Optional
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import get_session
+from app.core.config import settings
+from app.db.database import get_session, run_concurrently
 from app.crud.stats import (
     get_general_stats,
     get_price_distribution,
@@ -11,7 +13,9 @@ from app.crud.stats import (
     get_region_stats,
     get_make_stats,
     get_model_stats,
-    get_market_trends
+    get_market_trends,
+    get_snapshot_info,
+    GENERAL_STATS_VIEWS
 )
 from app.schemas.stats import (
     GeneralStats,
@@ -24,22 +28,28 @@ router = APIRouter()
 
 
 @router.get("/general")
-async def get_general_statistics(session: AsyncSession = Depends(get_session)):
+async def get_general_statistics():
     """Получение общей статистики по всем объявлениям"""
     
-    # Получаем основную статистику
-    stats = await get_general_stats(session)
-    
-    # Дополняем распределениями
-    price_distribution = await get_price_distribution(session)
-    year_distribution = await get_year_distribution(session)
-    region_stats = await get_region_stats(session, limit=10)
+    # Основная статистика и распределения - независимые запросы, выполняются одновременно
+    stats, price_distribution, year_distribution, region_stats, snapshot = await run_concurrently(
+        get_general_stats,
+        get_price_distribution,
+        get_year_distribution,
+        partial(get_region_stats, limit=10),
+        partial(
+            get_snapshot_info,
+            view_names=GENERAL_STATS_VIEWS + ["stats_price_bucket", "stats_year", "stats_region"],
+        ),
+        timeout=settings.CONCURRENT_QUERY_TIMEOUT,
+    )
     
     return {
         **stats,
         "price_distribution": price_distribution,
         "year_distribution": year_distribution,
-        "region_stats": region_stats
+        "region_stats": region_stats,
+        **snapshot
     }
 
 
@@ -52,9 +62,12 @@ async def get_makes_statistics(
     
     stats = await get_make_stats(session, limit)
     
+    snapshot = await get_snapshot_info(session, ["stats_make"])
+    
     return {
         "make_stats": stats,
-        "count": len(stats)
+        "count": len(stats),
+        **snapshot
     }
 
 
@@ -62,16 +75,21 @@ async def get_makes_statistics(
 async def get_models_statistics(
     make_name: Optional[str] = Query(None, description="Фильтр по марке"),
     limit: int = Query(10, ge=1, le=50, description="Количество моделей в результате"),
+    match: str = Query("fuzzy", regex="^(exact|fuzzy)$",
+                       description="Сравнение марки: fuzzy (подстрока) или exact (без учета регистра)"),
     session: AsyncSession = Depends(get_session)
 ):
     """Получение статистики по моделям автомобилей"""
     
-    stats = await get_model_stats(session, make_name, limit)
+    stats = await get_model_stats(session, make_name, limit, match)
+    
+    snapshot = await get_snapshot_info(session, ["stats_make_model"])
     
     return {
         "model_stats": stats,
         "make_filter": make_name,
-        "count": len(stats)
+        "count": len(stats),
+        **snapshot
     }
 
 
@@ -84,12 +102,14 @@ async def get_market_trends_data(
     """Получение трендов рынка за указанный период"""
     
     trends = await get_market_trends(session, period, days)
+    snapshot = await get_snapshot_info(session, ["stats_daily"])
     
     return {
         "period": period,
         "days": days,
         "data": trends,
-        "count": len(trends)
+        "count": len(trends),
+        **snapshot
     }
 
 
@@ -99,9 +119,12 @@ async def get_price_distribution_data(session: AsyncSession = Depends(get_sessio
     
     distribution = await get_price_distribution(session)
     
+    snapshot = await get_snapshot_info(session, ["stats_price_bucket"])
+    
     return {
         "price_distribution": distribution,
-        "total_ranges": len(distribution)
+        "total_ranges": len(distribution),
+        **snapshot
     }
 
 
@@ -111,9 +134,12 @@ async def get_year_distribution_data(session: AsyncSession = Depends(get_session
     
     distribution = await get_year_distribution(session)
     
+    snapshot = await get_snapshot_info(session, ["stats_year"])
+    
     return {
         "year_distribution": distribution,
-        "total_years": len(distribution)
+        "total_years": len(distribution),
+        **snapshot
     }
 
 
@@ -126,21 +152,28 @@ async def get_regions_statistics(
     
     stats = await get_region_stats(session, limit)
     
+    snapshot = await get_snapshot_info(session, ["stats_region"])
+    
     return {
         "region_stats": stats,
-        "count": len(stats)
+        "count": len(stats),
+        **snapshot
     }
 
 
 @router.get("/summary")
-async def get_dashboard_summary(session: AsyncSession = Depends(get_session)):
+async def get_dashboard_summary():
     """Получение сводной информации для дашборда"""
     
-    # Получаем различные типы статистики
-    general = await get_general_stats(session)
-    top_makes = await get_make_stats(session, limit=5)
-    top_regions = await get_region_stats(session, limit=5)
-    recent_trends = await get_market_trends(session, "daily", 7)
+    # Различные типы статистики - независимые запросы, выполняются одновременно
+    general, top_makes, top_regions, recent_trends, snapshot = await run_concurrently(
+        get_general_stats,
+        partial(get_make_stats, limit=5),
+        partial(get_region_stats, limit=5),
+        partial(get_market_trends, period="daily", days=7),
+        partial(get_snapshot_info, view_names=GENERAL_STATS_VIEWS + ["stats_region", "stats_daily"]),
+        timeout=settings.CONCURRENT_QUERY_TIMEOUT,
+    )
     
     return {
         "general": general,
@@ -153,5 +186,6 @@ async def get_dashboard_summary(session: AsyncSession = Depends(get_session)):
             "avg_price": general["avg_price"],
             "most_popular_make": general["most_popular_make"],
             "data_sources": len(set([make["make_name"] for make in top_makes]))
-        }
+        },
+        **snapshot
     }
@@ -1,6 +1,6 @@
 # services/api_service/app/schemas/ads.py
 from datetime import datetime
-from typing import Optional, List
+from typing import Literal, Optional, List
 from pydantic import BaseModel, Field, ConfigDict
 
 
@@ -40,9 +40,11 @@ class AdListResponse(BaseModel):
     """Схема для списка объявлений с пагинацией"""
     items: List[AdResponse]
     total: int
+    total_exact: bool = True  # False - оценка планировщика или значение из кэша
     page: int
     page_size: int
     total_pages: int
+    next_cursor: Optional[str] = None  # Только в режиме pagination=cursor; None на последней странице
 
 
 class AdFilters(BaseModel):
@@ -61,6 +63,15 @@ class AdFilters(BaseModel):
     region: Optional[str] = None
     source_name: Optional[str] = None
     sold: Optional[bool] = None  # True - проданные, False - активные, None - все
+    # Режим текстовых фильтров: exact или fuzzy для всех (match) и для отдельного фильтра
+    # (<фильтр>_match, важнее match); None - fuzzy
+    match: Optional[Literal["exact", "fuzzy"]] = None
+    make_name_match: Optional[Literal["exact", "fuzzy"]] = None
+    model_name_match: Optional[Literal["exact", "fuzzy"]] = None
+    fuel_type_match: Optional[Literal["exact", "fuzzy"]] = None
+    gearbox_match: Optional[Literal["exact", "fuzzy"]] = None
+    city_match: Optional[Literal["exact", "fuzzy"]] = None
+    region_match: Optional[Literal["exact", "fuzzy"]] = None
 
 
 class AdPriceHistory(BaseModel):
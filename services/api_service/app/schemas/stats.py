@@ -1,5 +1,5 @@
 # services/api_service/app/schemas/stats.py
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 
 
@@ -54,6 +54,9 @@ class GeneralStats(BaseModel):
     price_distribution: List[PriceDistribution]
     year_distribution: List[YearDistribution]
     region_stats: List[RegionStats]
+    # Время обновления витрин статистики и возраст снимка в секундах
+    snapshot_refreshed_at: Optional[str] = None
+    snapshot_age_seconds: Optional[float] = None
 
 
 class MarketTrends(BaseModel):
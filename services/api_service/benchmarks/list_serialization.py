@@ -0,0 +1,107 @@
+# services/api_service/benchmarks/list_serialization.py
+"""
+Бенчмарк страницы списка объявлений: ORM-объекты + pydantic против колонок AdResponse
+и прямой JSON-сериализации (app.core.serialization).
+
+- orm: select(AutoAd) -> AutoAd -> AdResponse.model_validate -> AdListResponse, затем
+  как FastAPI с response_model: повторная валидация, dump в JSON-типы и json.dumps;
+- lean: select(*AD_LIST_COLUMNS) -> строки -> ad_row_to_dict -> dumps (orjson, если есть).
+
+Для каждого варианта печатается медиана процессорного времени на запрос (чтение
+строк и сериализация; ожидание БД не входит) и отдельно только сериализации.
+Подсчет total в обоих вариантах одинаковый и не измеряется.
+
+Запуск из services/api_service (нужна БД с объявлениями):
+    python -m benchmarks.list_serialization --page-size 100 --repeat 200
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from pydantic import TypeAdapter
+from sqlalchemy import desc, select
+
+from app.core.serialization import dumps, orjson
+from app.crud.ads import AD_LIST_COLUMNS, ad_row_to_dict
+from app.db.database import AsyncSessionLocal
+from app.db.models import AutoAd
+from app.schemas.ads import AdListResponse, AdResponse
+
+response_adapter = TypeAdapter(AdListResponse)
+
+
+def list_body(items, page_size: int) -> dict:
+    return {"items": items, "total": 0, "total_exact": True, "page": 1,
+            "page_size": page_size, "total_pages": 0, "next_cursor": None}
+
+
+def serialize_orm(ads, page_size: int) -> bytes:
+    response = AdListResponse(**list_body([AdResponse.model_validate(ad) for ad in ads], page_size))
+    # fastapi.routing.serialize_response + JSONResponse.render
+    value = response_adapter.validate_python(response, from_attributes=True)
+    content = response_adapter.dump_python(value, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def serialize_lean(rows, page_size: int) -> bytes:
+    return dumps(list_body([ad_row_to_dict(row) for row in rows], page_size))
+
+
+async def fetch_orm(session, offset: int, page_size: int):
+    query = select(AutoAd).order_by(desc(AutoAd.createdAt)).offset(offset).limit(page_size)
+    return (await session.execute(query)).scalars().all()
+
+
+async def fetch_lean(session, offset: int, page_size: int):
+    query = select(*AD_LIST_COLUMNS).order_by(desc(AutoAd.createdAt)).offset(offset).limit(page_size)
+    return (await session.execute(query)).all()
+
+
+VARIANTS = {
+    "orm": (fetch_orm, serialize_orm),
+    "lean": (fetch_lean, serialize_lean),
+}
+
+
+async def run_variant(name: str, page_size: int, repeat: int, pages: int):
+    fetch, serialize = VARIANTS[name]
+    request_cpu, serialize_cpu = [], []
+    size = 0
+    for i in range(repeat):
+        # Новая сессия на запрос, как в get_session; страницы чередуются, чтобы
+        # identity map и кэши не переиспользовали строки
+        async with AsyncSessionLocal() as session:
+            started = time.process_time()
+            rows = await fetch(session, (i % pages) * page_size, page_size)
+            serialize_started = time.process_time()
+            body = serialize(rows, page_size)
+            finished = time.process_time()
+        request_cpu.append(finished - started)
+        serialize_cpu.append(finished - serialize_started)
+        size = len(body)
+    return statistics.median(request_cpu), statistics.median(serialize_cpu), size
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=20, help="сколько разных страниц перебирать")
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"JSON: {'orjson' if orjson is not None else 'json'}, страница {args.page_size} строк")
+    print(f"{'вариант':<10}{'CPU запроса, мс':>18}{'сериализация, мс':>20}{'ответ, байт':>14}")
+    results = {}
+    for name in VARIANTS:
+        await run_variant(name, args.page_size, args.warmup, args.pages)
+        results[name] = await run_variant(name, args.page_size, args.repeat, args.pages)
+        request_cpu, serialize_cpu, size = results[name]
+        print(f"{name:<10}{request_cpu * 1000:>18.2f}{serialize_cpu * 1000:>20.2f}{size:>14}")
+    print(f"CPU на запрос: x{results['orm'][0] / results['lean'][0]:.1f} меньше")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+# services/api_service/benchmarks/middleware_overhead.py
+"""
+Бенчмарк middleware: прежние LoggingMiddleware + ErrorHandlingMiddleware на
+BaseHTTPMiddleware против одного ASGI AccessLogMiddleware (app.core.middleware).
+
+Приложение app.main вызывается напрямую как ASGI-приложение (без HTTP-сервера и
+клиента), с тем же стеком middleware, что в продакшене; меняется только пара
+middleware логирования. Лог пишется в /dev/null, чтобы стоимость форматирования
+строк учитывалась, а вывод не мешал. Для каждого пути печатаются запросы в секунду,
+медиана времени запроса и процессорное время на запрос: у путей с БД пропускная
+способность ограничена пулом соединений, а стоимость middleware видна по CPU;
+"/" - без БД.
+
+Запуск из services/api_service (для /api/v1/ads/ нужна БД с объявлениями):
+    python -m benchmarks.middleware_overhead --requests 2000 --concurrency 10
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.middleware import AccessLogMiddleware, HTTP_REQUEST_DURATION, route_label
+from app.main import app
+
+PATHS = {
+    "/": b"",
+    "/health/": b"",
+    "/api/v1/ads/": b"page_size=20",
+}
+
+logger = logging.getLogger("app.core.middleware")
+
+# Стек middleware из app.main, в котором подменяется AccessLogMiddleware
+MIDDLEWARE = list(app.user_middleware)
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    """LoggingMiddleware до перехода на ASGI"""
+
+    async def dispatch(self, request, call_next):
+        start_time = time.perf_counter()
+        logger.info(f"Incoming request: {request.method} {request.url}")
+        response = await call_next(request)
+        process_time = time.perf_counter() - start_time
+        HTTP_REQUEST_DURATION.labels(request.method, route_label(request.scope), str(response.status_code)).observe(process_time)
+        logger.info(
+            f"Request completed: {request.method} {request.url} - "
+            f"Status: {response.status_code} - Time: {process_time:.4f}s"
+        )
+        response.headers["X-Process-Time"] = str(process_time)
+        return response
+
+
+class LegacyErrorHandlingMiddleware(BaseHTTPMiddleware):
+    """ErrorHandlingMiddleware до перехода на ASGI"""
+
+    async def dispatch(self, request, call_next):
+        try:
+            return await call_next(request)
+        except Exception as e:
+            logger.error(f"Unhandled error in request {request.method} {request.url}: {str(e)}")
+            raise
+
+
+def use_middleware(variant: str) -> None:
+    """Заменяет AccessLogMiddleware в стеке app на вариант variant"""
+    stack = []
+    for middleware in MIDDLEWARE:
+        if middleware.cls is not AccessLogMiddleware:
+            stack.append(middleware)
+        elif variant == "asgi":
+            stack.append(middleware)
+        else:
+            # Порядок как в прежнем main.py: Logging снаружи ErrorHandling
+            stack.extend([Middleware(LegacyLoggingMiddleware), Middleware(LegacyErrorHandlingMiddleware)])
+    app.user_middleware = stack
+    app.middleware_stack = None
+
+
+async def call(path: str, query_string: bytes) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query_string, "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run(path: str, query_string: bytes, requests: int, concurrency: int):
+    latencies = []
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            status = await call(path, query_string)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                raise RuntimeError(f"{path}: статус {status}")
+
+    started, cpu_started = time.perf_counter(), time.process_time()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    return requests / elapsed, statistics.median(latencies), cpu / requests
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--sample-rate", type=float, default=None, help="ACCESS_LOG_SAMPLE_RATE для asgi")
+    args = parser.parse_args()
+
+    # Те же уровни логирования, вывод - в /dev/null
+    root = logging.getLogger()
+    for handler in root.handlers:
+        root.removeHandler(handler)
+    root.addHandler(logging.StreamHandler(open(os.devnull, "w")))
+    if args.sample_rate is not None:
+        for middleware in MIDDLEWARE:
+            if middleware.cls is AccessLogMiddleware:
+                middleware.kwargs["sample_rate"] = args.sample_rate
+
+    print(f"{args.requests} запросов, {args.concurrency} одновременно")
+    print(f"{'путь':<16}{'вариант':<10}{'запросов/с':>12}{'медиана, мс':>14}{'CPU, мс':>10}")
+    for path, query_string in PATHS.items():
+        results = {}
+        # Каждый вариант дважды вперемешку, берется лучший прогон
+        for variant in ("legacy", "asgi", "legacy", "asgi"):
+            use_middleware(variant)
+            await run(path, query_string, args.warmup, args.concurrency)
+            result = await run(path, query_string, args.requests, args.concurrency)
+            if variant not in results or result[0] > results[variant][0]:
+                results[variant] = result
+        for variant, (rps, latency, cpu) in results.items():
+            print(f"{path:<16}{variant:<10}{rps:>12.0f}{latency * 1000:>14.2f}{cpu * 1000:>10.3f}")
+        print(f"{path:<16}{'':<10}{'x' + format(results['asgi'][0] / results['legacy'][0], '.2f'):>12}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""add materialized views for statistics
+
+Revision ID: a1c4e7b9d3f2
+Revises: f7c3d8e4b1a6
+Create Date: 2026-10-17 18:12:41.503318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c4e7b9d3f2'
+down_revision: Union[str, None] = 'f7c3d8e4b1a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Витрины статистики: data_processor обновляет их через REFRESH ... CONCURRENTLY
+# (для этого у каждой есть уникальный индекс без условий), эндпоинты /stats читают
+# только их. Средние цены хранятся как сумма и число строк, чтобы их можно было
+# складывать (марки из моделей, недели и месяцы из дней)
+STATS_VIEWS = {
+    # Одна строка: общие итоги, медиана цены и средний пробег
+    'stats_global': ("""
+        SELECT
+            1 AS id,
+            count(*) AS total_ads,
+            count(*) FILTER (WHERE sold_at IS NULL) AS active_ads,
+            avg(price) FILTER (WHERE price > 0) AS avg_price,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY price) FILTER (WHERE price > 0) AS median_price,
+            avg(mileage) FILTER (WHERE mileage > 0) AS avg_mileage
+        FROM auto_ad
+    """, ['id']),
+    # ads_count - все объявления марки (самая популярная марка), priced_* - с ценой
+    'stats_make': ("""
+        SELECT
+            make_name,
+            count(*) AS ads_count,
+            count(*) FILTER (WHERE price > 0) AS priced_count,
+            coalesce(sum(price) FILTER (WHERE price > 0), 0) AS price_sum,
+            min(price) FILTER (WHERE price > 0) AS min_price,
+            max(price) FILTER (WHERE price > 0) AS max_price
+        FROM auto_ad
+        WHERE make_name IS NOT NULL
+        GROUP BY make_name
+    """, ['make_name']),
+    'stats_make_model': ("""
+        SELECT
+            make_name,
+            model_name,
+            count(*) AS ads_count,
+            count(*) FILTER (WHERE price > 0) AS priced_count,
+            coalesce(sum(price) FILTER (WHERE price > 0), 0) AS price_sum,
+            min(price) FILTER (WHERE price > 0) AS min_price,
+            max(price) FILTER (WHERE price > 0) AS max_price
+        FROM auto_ad
+        WHERE make_name IS NOT NULL AND model_name IS NOT NULL
+        GROUP BY make_name, model_name
+    """, ['make_name', 'model_name']),
+    'stats_region': ("""
+        SELECT
+            region,
+            count(*) AS priced_count,
+            sum(price) AS price_sum
+        FROM auto_ad
+        WHERE region IS NOT NULL AND price > 0
+        GROUP BY region
+    """, ['region']),
+    # bucket задает порядок диапазонов, price_range - подпись как в API
+    'stats_price_bucket': ("""
+        SELECT
+            bucket,
+            (ARRAY['0-5K', '5K-10K', '10K-20K', '20K-30K', '30K-50K', '50K-100K', '100K+'])[bucket] AS price_range,
+            count(*) AS ads_count
+        FROM (
+            SELECT width_bucket(price, ARRAY[5000, 10000, 20000, 30000, 50000, 100000]) + 1 AS bucket
+            FROM auto_ad
+            WHERE price > 0
+        ) priced
+        GROUP BY bucket
+    """, ['bucket']),
+    'stats_year': ("""
+        SELECT
+            year,
+            count(*) AS ads_count
+        FROM auto_ad
+        WHERE year > 1990
+        GROUP BY year
+    """, ['year']),
+    # Дневные итоги по дате публикации - из них собираются тренды за любой период
+    'stats_daily': ("""
+        SELECT
+            date_trunc('day', "createdAt") AS day,
+            count(*) AS priced_count,
+            sum(price) AS price_sum
+        FROM auto_ad
+        WHERE "createdAt" IS NOT NULL AND price > 0
+        GROUP BY date_trunc('day', "createdAt")
+    """, ['day']),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'stats_snapshot',
+        sa.Column('view_name', sa.String(), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('duration_ms', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('view_name'),
+    )
+
+    for view_name, (query, unique_columns) in STATS_VIEWS.items():
+        op.execute(f'CREATE MATERIALIZED VIEW {view_name} AS {query} WITH DATA')
+        op.create_index(f'ux_{view_name}', view_name, unique_columns, unique=True)
+        op.execute(
+            sa.text(
+                "INSERT INTO stats_snapshot (view_name, refreshed_at, duration_ms) "
+                "VALUES (:view_name, now(), 0)"
+            ).bindparams(view_name=view_name)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for view_name in reversed(list(STATS_VIEWS)):
+        op.execute(f'DROP MATERIALIZED VIEW IF EXISTS {view_name}')
+    op.drop_table('stats_snapshot')
@@ -0,0 +1,55 @@
+"""index every text filter mode: pg_trgm for fuel_type/gearbox, lower() for city/region
+
+Revision ID: a9e4c2f7b5d1
+Revises: e8b3f6a1c9d4
+Create Date: 2026-10-18 10:12:41.275904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9e4c2f7b5d1'
+down_revision: Union[str, None] = 'e8b3f6a1c9d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Режим сравнения выбирается для каждого текстового фильтра, поэтому у каждой колонки
+# фильтра есть оба индекса; e5b2c7d3a9f4 создал их не для всех колонок
+LOWER_INDEX_COLUMNS = ('city', 'region')
+TRGM_INDEX_COLUMNS = ('fuel_type', 'gearbox')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in LOWER_INDEX_COLUMNS:
+            op.create_index(
+                f'ix_auto_ad_{name}_lower',
+                'auto_ad',
+                [sa.text(f'lower({name})')],
+                unique=False,
+                postgresql_concurrently=True,
+            )
+        for name in TRGM_INDEX_COLUMNS:
+            op.create_index(
+                f'ix_auto_ad_{name}_trgm',
+                'auto_ad',
+                [name],
+                unique=False,
+                postgresql_using='gin',
+                postgresql_ops={name: 'gin_trgm_ops'},
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in TRGM_INDEX_COLUMNS:
+            op.drop_index(f'ix_auto_ad_{name}_trgm', table_name='auto_ad', postgresql_concurrently=True)
+        for name in LOWER_INDEX_COLUMNS:
+            op.drop_index(f'ix_auto_ad_{name}_lower', table_name='auto_ad', postgresql_concurrently=True)
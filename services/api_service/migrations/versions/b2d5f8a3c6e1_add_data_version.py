@@ -0,0 +1,43 @@
+"""add data_version for conditional GET
+
+Revision ID: b2d5f8a3c6e1
+Revises: a1c4e7b9d3f2
+Create Date: 2026-10-17 19:05:12.284410
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d5f8a3c6e1'
+down_revision: Union[str, None] = 'a1c4e7b9d3f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Области данных: ads - объявления (консьюмеры), stats - витрины статистики (stats_refresh)
+DATA_SCOPES = ('ads', 'stats')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'data_version',
+        sa.Column('scope', sa.String(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('scope'),
+    )
+    for scope in DATA_SCOPES:
+        op.execute(
+            sa.text(
+                "INSERT INTO data_version (scope, version, changed_at) VALUES (:scope, 1, now())"
+            ).bindparams(scope=scope)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('data_version')
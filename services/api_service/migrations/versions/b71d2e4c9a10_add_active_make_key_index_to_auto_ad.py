@@ -0,0 +1,42 @@
+"""add active (source_name, make key) index to auto_ad
+
+Revision ID: b71d2e4c9a10
+Revises: f6c594b769f2
+Create Date: 2026-10-17 09:40:12.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71d2e4c9a10'
+down_revision: Union[str, None] = 'f6c594b769f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Индекс строится CONCURRENTLY, чтобы не блокировать запись консьюмера на большой таблице
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_auto_ad_active_source_make_key',
+            'auto_ad',
+            ['source_name', sa.text("lower(replace(make_name, ' ', '-'))")],
+            unique=False,
+            postgresql_where=sa.text('sold_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_auto_ad_active_source_make_key',
+            table_name='auto_ad',
+            postgresql_concurrently=True,
+        )
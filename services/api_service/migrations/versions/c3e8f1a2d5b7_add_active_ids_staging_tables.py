@@ -0,0 +1,51 @@
+"""add active ids staging tables
+
+Revision ID: c3e8f1a2d5b7
+Revises: b71d2e4c9a10
+Create Date: 2026-10-17 11:05:47.902113
+
+"""
+from typing import Sequence, Union
+
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8f1a2d5b7'
+down_revision: Union[str, None] = 'b71d2e4c9a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'active_ids_chunk',
+        sa.Column('run_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('source_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('make_key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('chunk_index', sa.Integer(), nullable=False),
+        sa.Column('id_count', sa.Integer(), nullable=False),
+        sa.Column('received_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('run_id', 'source_name', 'make_key', 'chunk_index'),
+        prefixes=['UNLOGGED'],
+    )
+    op.create_index(op.f('ix_active_ids_chunk_received_at'), 'active_ids_chunk', ['received_at'], unique=False)
+    op.create_table(
+        'active_ids_staging',
+        sa.Column('run_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('source_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('make_key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('ad_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.PrimaryKeyConstraint('run_id', 'source_name', 'make_key', 'ad_id'),
+        prefixes=['UNLOGGED'],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('active_ids_staging')
+    op.drop_index(op.f('ix_active_ids_chunk_received_at'), table_name='active_ids_chunk')
+    op.drop_table('active_ids_chunk')
@@ -0,0 +1,64 @@
+"""add materialized views for filter options
+
+Revision ID: c4e7a9b2d5f3
+Revises: b2d5f8a3c6e1
+Create Date: 2026-10-17 20:21:37.915064
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e7a9b2d5f3'
+down_revision: Union[str, None] = 'b2d5f8a3c6e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Колонки-фасеты опций фильтров; значения всех фасетов считаются одним проходом (GROUPING SETS)
+FACET_COLUMNS = ('make_name', 'fuel_type', 'gearbox', 'city', 'region', 'source_name')
+
+STATS_VIEWS = {
+    # Значение фасета и число объявлений с ним
+    'stats_facet_values': (f"""
+        SELECT
+            CASE {' '.join(f"WHEN grouping({name}) = 0 THEN '{name}'" for name in FACET_COLUMNS)} END AS facet,
+            coalesce({', '.join(FACET_COLUMNS)}) AS value,
+            count(*) AS ads_count
+        FROM auto_ad
+        GROUP BY GROUPING SETS ({', '.join(f'({name})' for name in FACET_COLUMNS)})
+        HAVING coalesce({', '.join(FACET_COLUMNS)}) IS NOT NULL
+    """, ['facet', 'value']),
+    # Диапазоны цены и года для ползунков фильтров
+    'stats_filter_ranges': ("""
+        SELECT
+            1 AS id,
+            min(price) AS min_price,
+            max(price) AS max_price,
+            min(year) AS min_year,
+            max(year) AS max_year
+        FROM auto_ad
+    """, ['id']),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for view_name, (query, unique_columns) in STATS_VIEWS.items():
+        op.execute(f'CREATE MATERIALIZED VIEW {view_name} AS {query} WITH DATA')
+        op.create_index(f'ux_{view_name}', view_name, unique_columns, unique=True)
+        op.execute(
+            sa.text(
+                "INSERT INTO stats_snapshot (view_name, refreshed_at, duration_ms) "
+                "VALUES (:view_name, now(), 0)"
+            ).bindparams(view_name=view_name)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for view_name in reversed(list(STATS_VIEWS)):
+        op.execute(f'DROP MATERIALIZED VIEW IF EXISTS {view_name}')
+        op.execute(sa.text("DELETE FROM stats_snapshot WHERE view_name = :view_name").bindparams(view_name=view_name))
@@ -0,0 +1,38 @@
+"""add keyset pagination indexes to auto_ad
+
+Revision ID: d4a9b6e2f1c8
+Revises: c3e8f1a2d5b7
+Create Date: 2026-10-17 13:05:41.502917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a9b6e2f1c8'
+down_revision: Union[str, None] = 'c3e8f1a2d5b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Основные сортировки списка объявлений; id_ad - вторая колонка ключа курсора
+KEYSET_INDEXES = {
+    'ix_auto_ad_created_at_id_ad': ['createdAt', 'id_ad'],
+    'ix_auto_ad_price_id_ad': ['price', 'id_ad'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, columns in KEYSET_INDEXES.items():
+            op.create_index(name, 'auto_ad', columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in KEYSET_INDEXES:
+            op.drop_index(name, table_name='auto_ad', postgresql_concurrently=True)
@@ -0,0 +1,59 @@
+"""add lower() and pg_trgm indexes for text filters on auto_ad
+
+Revision ID: e5b2c7d3a9f4
+Revises: d4a9b6e2f1c8
+Create Date: 2026-10-17 14:22:08.913540
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b2c7d3a9f4'
+down_revision: Union[str, None] = 'd4a9b6e2f1c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Точные фильтры: lower(колонка) = lower(значение)
+LOWER_INDEX_COLUMNS = ('make_name', 'model_name', 'fuel_type', 'gearbox')
+# Поиск подстроки (ILIKE '%...%'): GIN-индексы pg_trgm
+TRGM_INDEX_COLUMNS = ('make_name', 'model_name', 'city', 'region', 'title')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # Индексы строятся CONCURRENTLY, чтобы не блокировать запись консьюмера на большой таблице
+    with op.get_context().autocommit_block():
+        for name in LOWER_INDEX_COLUMNS:
+            op.create_index(
+                f'ix_auto_ad_{name}_lower',
+                'auto_ad',
+                [sa.text(f'lower({name})')],
+                unique=False,
+                postgresql_concurrently=True,
+            )
+        for name in TRGM_INDEX_COLUMNS:
+            op.create_index(
+                f'ix_auto_ad_{name}_trgm',
+                'auto_ad',
+                [name],
+                unique=False,
+                postgresql_using='gin',
+                postgresql_ops={name: 'gin_trgm_ops'},
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in TRGM_INDEX_COLUMNS:
+            op.drop_index(f'ix_auto_ad_{name}_trgm', table_name='auto_ad', postgresql_concurrently=True)
+        for name in LOWER_INDEX_COLUMNS:
+            op.drop_index(f'ix_auto_ad_{name}_lower', table_name='auto_ad', postgresql_concurrently=True)
+    # Расширение не удаляется: его могут использовать другие объекты БД
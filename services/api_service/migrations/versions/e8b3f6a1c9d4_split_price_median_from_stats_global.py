@@ -0,0 +1,97 @@
+"""split price median from stats_global, add price histogram view
+
+Revision ID: e8b3f6a1c9d4
+Revises: c4e7a9b2d5f3
+Create Date: 2026-10-17 22:47:09.613528
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3f6a1c9d4'
+down_revision: Union[str, None] = 'c4e7a9b2d5f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Основание логарифмических интервалов гистограммы цен: ширина интервала - 2% от его
+# нижней границы, поэтому медиана по гистограмме отличается от точной не больше чем на 2%
+PRICE_HISTOGRAM_GAMMA = 1.02
+
+# stats_global без медианы: все показатели считаются одним проходом по auto_ad без сортировки
+STATS_GLOBAL = ("""
+    SELECT
+        1 AS id,
+        count(*) AS total_ads,
+        count(*) FILTER (WHERE sold_at IS NULL) AS active_ads,
+        avg(price) FILTER (WHERE price > 0) AS avg_price,
+        avg(mileage) FILTER (WHERE mileage > 0) AS avg_mileage
+    FROM auto_ad
+""", ['id'])
+
+STATS_VIEWS = {
+    # Точная медиана цены - полная сортировка цен; data_processor обновляет ее, только
+    # если STATS_EXACT_MEDIAN включен
+    'stats_price_median': ("""
+        SELECT
+            1 AS id,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY price) AS median_price
+        FROM auto_ad
+        WHERE price > 0
+    """, ['id']),
+    # Число объявлений в интервале [gamma^bucket, gamma^(bucket + 1)) цены - агрегат
+    # хешированием, без сортировки; из нее API считает приближенную медиану
+    'stats_price_histogram': (f"""
+        SELECT
+            floor(ln(price) / ln({PRICE_HISTOGRAM_GAMMA}))::int AS bucket,
+            count(*) AS ads_count
+        FROM auto_ad
+        WHERE price > 0
+        GROUP BY 1
+    """, ['bucket']),
+}
+
+# Прежнее определение stats_global (a1c4e7b9d3f2) для downgrade
+STATS_GLOBAL_WITH_MEDIAN = ("""
+    SELECT
+        1 AS id,
+        count(*) AS total_ads,
+        count(*) FILTER (WHERE sold_at IS NULL) AS active_ads,
+        avg(price) FILTER (WHERE price > 0) AS avg_price,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY price) FILTER (WHERE price > 0) AS median_price,
+        avg(mileage) FILTER (WHERE mileage > 0) AS avg_mileage
+    FROM auto_ad
+""", ['id'])
+
+
+def create_view(view_name: str, query: str, unique_columns) -> None:
+    op.execute(f'CREATE MATERIALIZED VIEW {view_name} AS {query} WITH DATA')
+    op.create_index(f'ux_{view_name}', view_name, unique_columns, unique=True)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS stats_global')
+    create_view('stats_global', *STATS_GLOBAL)
+
+    for view_name, (query, unique_columns) in STATS_VIEWS.items():
+        create_view(view_name, query, unique_columns)
+        op.execute(
+            sa.text(
+                "INSERT INTO stats_snapshot (view_name, refreshed_at, duration_ms) "
+                "VALUES (:view_name, now(), 0)"
+            ).bindparams(view_name=view_name)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for view_name in reversed(list(STATS_VIEWS)):
+        op.execute(f'DROP MATERIALIZED VIEW IF EXISTS {view_name}')
+        op.execute(sa.text("DELETE FROM stats_snapshot WHERE view_name = :view_name").bindparams(view_name=view_name))
+
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS stats_global')
+    create_view('stats_global', *STATS_GLOBAL_WITH_MEDIAN)
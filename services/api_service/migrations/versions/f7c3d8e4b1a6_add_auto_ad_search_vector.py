@@ -0,0 +1,137 @@
+"""add full-text search_vector to auto_ad
+
+Revision ID: f7c3d8e4b1a6
+Revises: e5b2c7d3a9f4
+Create Date: 2026-10-17 15:48:30.127764
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7c3d8e4b1a6'
+down_revision: Union[str, None] = 'e5b2c7d3a9f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_SOURCE_COLUMNS = ('title', 'version', 'make_name', 'model_name', 'city')
+BACKFILL_BATCH_SIZE = 10000
+
+# Нижний регистр без диакритики ("Škoda Kraków" -> "skoda krakow"); translate вместо
+# unaccent, чтобы функция оставалась IMMUTABLE и не требовала расширений
+SEARCH_FOLD_FUNCTION = """
+CREATE OR REPLACE FUNCTION auto_ad_search_fold(value text) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT translate(lower(value), 'ąćęłńóśźżáäčďéěíňöřšťúůüýž', 'acelnoszzaacdeeinorstuuuyz')
+$$
+"""
+
+# Марка и модель - вес A, заголовок - B, версия - C, город - D. Польского словаря
+# в PostgreSQL нет, поэтому слова хранятся без диакритики как есть (simple) и
+# дополнительно со стеммингом english для заголовка и версии
+SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION auto_ad_search_vector(
+    title text, version text, make_name text, model_name text, city text
+) RETURNS tsvector
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT
+        setweight(to_tsvector('simple'::regconfig,
+                              auto_ad_search_fold(coalesce(make_name, '') || ' ' || coalesce(model_name, ''))), 'A')
+        || setweight(to_tsvector('simple'::regconfig, auto_ad_search_fold(coalesce(title, ''))), 'B')
+        || setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'B')
+        || setweight(to_tsvector('simple'::regconfig, auto_ad_search_fold(coalesce(version, ''))), 'C')
+        || setweight(to_tsvector('english'::regconfig, coalesce(version, '')), 'C')
+        || setweight(to_tsvector('simple'::regconfig, auto_ad_search_fold(coalesce(city, ''))), 'D')
+$$
+"""
+
+# Вектор пересчитывается при вставке и только при изменении исходных колонок,
+# поэтому upsert консьюмера без изменений текста его не трогает
+SEARCH_VECTOR_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION auto_ad_search_vector_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.search_vector IS NOT NULL
+       AND (NEW.title, NEW.version, NEW.make_name, NEW.model_name, NEW.city)
+           IS NOT DISTINCT FROM (OLD.title, OLD.version, OLD.make_name, OLD.model_name, OLD.city) THEN
+        NEW.search_vector := OLD.search_vector;
+        RETURN NEW;
+    END IF;
+    NEW.search_vector := auto_ad_search_vector(NEW.title, NEW.version, NEW.make_name, NEW.model_name, NEW.city);
+    RETURN NEW;
+END
+$$
+"""
+
+BACKFILL_BATCH = sa.text("""
+    WITH batch AS (
+        SELECT id_ad FROM auto_ad WHERE id_ad > :last_id ORDER BY id_ad LIMIT :batch_size
+    )
+    UPDATE auto_ad
+    SET search_vector = auto_ad_search_vector(title, version, make_name, model_name, city)
+    FROM batch
+    WHERE auto_ad.id_ad = batch.id_ad
+    RETURNING auto_ad.id_ad
+""")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Колонка без значения по умолчанию добавляется без перезаписи таблицы
+    op.add_column('auto_ad', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.execute(SEARCH_FOLD_FUNCTION)
+    op.execute(SEARCH_VECTOR_FUNCTION)
+    op.execute(SEARCH_VECTOR_TRIGGER_FUNCTION)
+    op.execute(
+        "CREATE TRIGGER auto_ad_search_vector_update "
+        f"BEFORE INSERT OR UPDATE OF {', '.join(SEARCH_SOURCE_COLUMNS)} ON auto_ad "
+        "FOR EACH ROW EXECUTE FUNCTION auto_ad_search_vector_trigger()"
+    )
+
+    with op.get_context().autocommit_block():
+        # Существующие строки заполняются пачками по id_ad, каждая пачка - своя транзакция
+        bind = op.get_bind()
+        last_id = ''
+        while True:
+            updated = bind.execute(BACKFILL_BATCH, {"last_id": last_id, "batch_size": BACKFILL_BATCH_SIZE})
+            ids = updated.scalars().all()
+            if not ids:
+                break
+            last_id = max(ids)
+
+        op.create_index(
+            'ix_auto_ad_search_vector',
+            'auto_ad',
+            ['search_vector'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+        # Поиск по заголовку теперь полнотекстовый, trigram-индекс заголовка не нужен
+        op.drop_index('ix_auto_ad_title_trgm', table_name='auto_ad', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_auto_ad_title_trgm',
+            'auto_ad',
+            ['title'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={'title': 'gin_trgm_ops'},
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_auto_ad_search_vector', table_name='auto_ad', postgresql_concurrently=True)
+
+    op.execute('DROP TRIGGER IF EXISTS auto_ad_search_vector_update ON auto_ad')
+    op.execute('DROP FUNCTION IF EXISTS auto_ad_search_vector_trigger()')
+    op.execute('DROP FUNCTION IF EXISTS auto_ad_search_vector(text, text, text, text, text)')
+    op.execute('DROP FUNCTION IF EXISTS auto_ad_search_fold(text)')
+    op.drop_column('auto_ad', 'search_vector')
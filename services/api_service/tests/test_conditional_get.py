@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.conditional_get import ConditionalGetMiddleware, build_etag, etag_matches, not_modified_since
+from app.core.data_changes import DataChangeListener, DataVersion, parse_payload
+
+CHANGED_AT = datetime(2025, 10, 17, 12, 0, 0, 500000, tzinfo=timezone.utc)
+
+
+class TestParsePayload:
+    """Тесты разбора уведомления об изменении данных."""
+
+    def test_scope_version_and_epoch(self):
+        scope, version = parse_payload("ads:42:1760702400.5")
+
+        assert scope == "ads"
+        assert version == DataVersion(42, datetime(2025, 10, 17, 12, 0, 0, 500000, tzinfo=timezone.utc))
+
+    def test_scope_only(self):
+        assert parse_payload("stats") == ("stats", None)
+
+    def test_invalid_version_ignored(self):
+        assert parse_payload("ads:x:1760702400") == ("ads", None)
+
+    def test_older_version_not_applied(self):
+        listener = DataChangeListener("postgresql://unused")
+
+        asyncio.run(listener.handle_notification("ads:5:1760702400"))
+        asyncio.run(listener.handle_notification("ads:4:1760702500"))
+
+        assert listener.get_version("ads").version == 5
+        assert listener.get_version("stats") is None
+
+
+class TestEtag:
+    """Тесты сравнения ETag и If-Modified-Since."""
+
+    etag = build_etag({"ads": DataVersion(42, CHANGED_AT), "stats": DataVersion(7, CHANGED_AT)})
+
+    def test_etag_from_scope_versions(self):
+        assert self.etag == 'W/"ads-42.stats-7"'
+
+    @pytest.mark.parametrize("if_none_match", [
+        'W/"ads-42.stats-7"',
+        '"ads-42.stats-7"',
+        '"other", W/"ads-42.stats-7"',
+        "*",
+    ])
+    def test_matches(self, if_none_match):
+        assert etag_matches(if_none_match, self.etag)
+
+    @pytest.mark.parametrize("if_none_match", ['W/"ads-41.stats-7"', '"other", "ads-42"', ""])
+    def test_does_not_match(self, if_none_match):
+        assert not etag_matches(if_none_match, self.etag)
+
+    def test_not_modified_since_ignores_fractions(self):
+        assert not_modified_since("Fri, 17 Oct 2025 12:00:00 GMT", CHANGED_AT)
+        assert not not_modified_since("Fri, 17 Oct 2025 11:59:59 GMT", CHANGED_AT)
+
+    def test_invalid_date_is_modified(self):
+        assert not not_modified_since("yesterday", CHANGED_AT)
+
+
+class TestConditionalGetMiddleware:
+    """Тесты ответа 304 по версии данных."""
+
+    def setup_method(self):
+        self.listener = DataChangeListener("postgresql://unused")
+        self.app_calls = 0
+
+        async def app(scope, receive, send):
+            self.app_calls += 1
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        self.middleware = ConditionalGetMiddleware(app, versions=self.listener)
+
+    def request(self, path: str, headers=()):
+        messages = []
+        scope = {"type": "http", "method": "GET", "path": path, "headers": list(headers)}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(self.middleware(scope, None, send))
+        return messages[0]
+
+    def test_matching_etag_is_not_modified(self):
+        self.listener.update_version("stats", DataVersion(7, CHANGED_AT))
+
+        response = self.request("/api/v1/stats/general", [(b"if-none-match", b'W/"stats-7"')])
+
+        assert response["status"] == 304
+        assert self.app_calls == 0
+
+    def test_new_version_is_rendered_with_validators(self):
+        self.listener.update_version("stats", DataVersion(8, CHANGED_AT))
+
+        response = self.request("/api/v1/stats/general", [(b"if-none-match", b'W/"stats-7"')])
+
+        assert response["status"] == 200
+        assert (b"etag", b'W/"stats-8"') in response["headers"]
+
+    def test_unknown_version_passes_through(self):
+        response = self.request("/api/v1/stats/general", [(b"if-none-match", b"*")])
+
+        assert response["status"] == 200
+        assert not any(name == b"etag" for name, _ in response["headers"])
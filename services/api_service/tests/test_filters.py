@@ -0,0 +1,96 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.crud.filters import TEXT_FILTER_FIELDS, build_ad_conditions, escape_like, text_condition
+from app.db.models import AutoAd
+from app.schemas.ads import AdFilters
+
+
+def compile_sql(condition) -> str:
+    return str(condition.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+class TestEscapeLike:
+    """Тесты экранирования спецсимволов LIKE."""
+
+    def test_wildcards_escaped(self):
+        assert escape_like("100%") == "100\\%"
+        assert escape_like("a_b") == "a\\_b"
+
+    def test_backslash_escaped_first(self):
+        assert escape_like("a\\%") == "a\\\\\\%"
+
+    def test_plain_value_unchanged(self):
+        assert escape_like("Škoda Octavia") == "Škoda Octavia"
+
+
+class TestTextCondition:
+    """Тесты условий текстовых фильтров."""
+
+    def test_fuzzy_is_escaped_substring(self):
+        compiled = text_condition(AutoAd.city, "50%_off", "fuzzy").compile(dialect=postgresql.dialect())
+
+        assert str(compiled).startswith("auto_ad.city ILIKE %(city_1)s ESCAPE")
+        assert compiled.params == {"city_1": "%50\\%\\_off%"}
+
+    def test_exact_is_case_insensitive_equality(self):
+        sql = compile_sql(text_condition(AutoAd.make_name, "BMW", "exact"))
+
+        assert sql == "lower(auto_ad.make_name) = 'bmw'"
+
+
+class TestBuildAdConditions:
+    """Тесты режима текстовых фильтров списка объявлений."""
+
+    def test_fuzzy_by_default(self):
+        conditions = build_ad_conditions(AdFilters(make_name="Audi", fuel_type="Diesel"))
+
+        assert all("ILIKE" in compile_sql(condition) for condition in conditions)
+
+    def test_exact_on_request(self):
+        conditions = build_ad_conditions(AdFilters(make_name="Audi", city="Kraków", match="exact"))
+
+        assert [compile_sql(condition) for condition in conditions] == [
+            "lower(auto_ad.make_name) = 'audi'",
+            "lower(auto_ad.city) = 'kraków'",
+        ]
+
+    def test_mode_per_filter_overrides_match(self):
+        filters = AdFilters(make_name="Audi", fuel_type="Diesel", city="Kraków", match="exact", city_match="fuzzy")
+
+        assert [compile_sql(condition) for condition in build_ad_conditions(filters)[:2]] == [
+            "lower(auto_ad.make_name) = 'audi'",
+            "lower(auto_ad.fuel_type) = 'diesel'",
+        ]
+        assert compile_sql(build_ad_conditions(filters)[2]).startswith("auto_ad.city ILIKE '%%Kraków%%'")
+
+    @pytest.mark.parametrize("field", TEXT_FILTER_FIELDS)
+    @pytest.mark.parametrize("mode", ["exact", "fuzzy"])
+    def test_each_filter_and_mode(self, field, mode):
+        filters = AdFilters(**{field: "Value", f"{field}_match": mode})
+
+        (condition,) = build_ad_conditions(filters)
+
+        if mode == "exact":
+            assert compile_sql(condition) == f"lower(auto_ad.{field}) = 'value'"
+        else:
+            assert compile_sql(condition).startswith(f"auto_ad.{field} ILIKE '%%Value%%'")
+
+
+class TestTextFilterIndexes:
+    """Тесты индексов под каждый режим текстовых фильтров."""
+
+    indexes = {index.name: index for index in AutoAd.__table__.indexes}
+
+    @pytest.mark.parametrize("field", TEXT_FILTER_FIELDS)
+    def test_exact_mode_has_lower_index(self, field):
+        index = self.indexes[f"ix_auto_ad_{field}_lower"]
+
+        assert [str(expression) for expression in index.expressions] == [f"lower({field})"]
+
+    @pytest.mark.parametrize("field", TEXT_FILTER_FIELDS)
+    def test_fuzzy_mode_has_trigram_index(self, field):
+        index = self.indexes[f"ix_auto_ad_{field}_trgm"]
+
+        assert index.dialect_options["postgresql"]["using"] == "gin"
+        assert index.dialect_options["postgresql"]["ops"] == {field: "gin_trgm_ops"}
@@ -0,0 +1,142 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+
+from app.crud.pagination import (
+    InvalidCursorError,
+    decode_cursor,
+    encode_cursor,
+    keyset_order_by,
+    keyset_segments,
+    resolve_sort_column,
+)
+from app.db.database import get_session
+from app.main import app
+
+created_at = resolve_sort_column("createdAt")
+price = resolve_sort_column("price")
+
+
+def compile_sql(clause) -> str:
+    return str(clause.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def compile_segments(segments) -> list:
+    return [[compile_sql(condition) for condition in conditions] for conditions in segments]
+
+
+class TestCursor:
+    """Тесты кодирования курсора."""
+
+    def test_round_trip_datetime(self):
+        value = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+        cursor = encode_cursor(created_at, "desc", value, "ad-1")
+
+        assert "=" not in cursor
+        assert decode_cursor(cursor, created_at, "desc") == (value, "ad-1")
+
+    def test_round_trip_number_and_null(self):
+        assert decode_cursor(encode_cursor(price, "asc", 45000, "ad-2"), price, "asc") == (45000, "ad-2")
+        assert decode_cursor(encode_cursor(price, "asc", None, "ad-3"), price, "asc") == (None, "ad-3")
+
+    def test_unknown_sort_column_falls_back_to_created_at(self):
+        assert resolve_sort_column("no_such_column") is created_at
+
+    @pytest.mark.parametrize("cursor", ["not base64!", "bm90IGpzb24", encode_cursor(price, "asc", 1, "x")[:-3]])
+    def test_garbage_rejected(self, cursor):
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(cursor, price, "asc")
+
+    def test_cursor_for_other_sort_rejected(self):
+        cursor = encode_cursor(price, "asc", 45000, "ad-1")
+
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(cursor, price, "desc")
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(cursor, created_at, "asc")
+
+    def test_tampered_id_rejected(self):
+        tampered = encode_cursor(price, "asc", 45000, 1)
+
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(tampered, price, "asc")
+
+
+class TestKeysetSegments:
+    """Тесты условий keyset-пагинации."""
+
+    def test_order_by_sort_column_then_id(self):
+        assert [compile_sql(clause) for clause in keyset_order_by(price, descending=True)] == [
+            "auto_ad.price DESC", "auto_ad.id_ad DESC",
+        ]
+
+    def test_first_page_nulls_last_when_ascending(self):
+        assert compile_segments(keyset_segments(price, descending=False)) == [
+            ["auto_ad.price IS NOT NULL"], ["auto_ad.price IS NULL"],
+        ]
+
+    def test_first_page_nulls_first_when_descending(self):
+        assert compile_segments(keyset_segments(price, descending=True)) == [
+            ["auto_ad.price IS NULL"], ["auto_ad.price IS NOT NULL"],
+        ]
+
+    def test_after_value_ascending(self):
+        assert compile_segments(keyset_segments(price, False, (45000, "ad-1"))) == [
+            [
+                "auto_ad.price IS NOT NULL",
+                "auto_ad.price >= 45000 AND (auto_ad.price, auto_ad.id_ad) > (45000, 'ad-1')",
+            ],
+            ["auto_ad.price IS NULL"],
+        ]
+
+    def test_after_value_descending_skips_nulls(self):
+        assert compile_segments(keyset_segments(price, True, (45000, "ad-1"))) == [
+            [
+                "auto_ad.price IS NOT NULL",
+                "auto_ad.price <= 45000 AND (auto_ad.price, auto_ad.id_ad) < (45000, 'ad-1')",
+            ],
+        ]
+
+    def test_after_null_descending_continues_to_values(self):
+        assert compile_segments(keyset_segments(price, True, (None, "ad-1"))) == [
+            ["auto_ad.price IS NULL", "auto_ad.id_ad < 'ad-1'"],
+            ["auto_ad.price IS NOT NULL"],
+        ]
+
+    def test_after_null_ascending_is_last_segment(self):
+        assert compile_segments(keyset_segments(price, False, (None, "ad-1"))) == [
+            ["auto_ad.price IS NULL", "auto_ad.id_ad > 'ad-1'"],
+        ]
+
+    def test_null_cursor_for_not_null_column_rejected(self):
+        with pytest.raises(InvalidCursorError):
+            keyset_segments(resolve_sort_column("id_ad"), False, (None, "ad-1"))
+
+
+class TestCursorEndpoint:
+    """Тесты ответа API на некорректный курсор."""
+
+    def setup_method(self):
+        async def session_without_db():
+            yield MagicMock()
+
+        app.dependency_overrides[get_session] = session_without_db
+        self.client = TestClient(app)
+
+    def teardown_method(self):
+        app.dependency_overrides.pop(get_session, None)
+
+    def test_invalid_cursor_is_bad_request(self):
+        response = self.client.get("/api/v1/ads/", params={"cursor": "not-a-cursor"})
+
+        assert response.status_code == 400
+
+    def test_cursor_for_other_sort_is_bad_request(self):
+        cursor = encode_cursor(price, "asc", 45000, "ad-1")
+
+        response = self.client.get("/api/v1/ads/", params={"cursor": cursor, "sort_by": "createdAt"})
+
+        assert response.status_code == 400
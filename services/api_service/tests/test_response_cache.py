@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+from app.core.data_changes import DataChangeListener
+from app.core.response_cache import MemoryCacheBackend, ResponseCache, normalize_query
+
+OK = (200, [(b"content-type", b"application/json")], b"{}")
+
+
+def make_cache() -> ResponseCache:
+    return ResponseCache(MemoryCacheBackend(maxsize=100, ttl=60), ttl=60)
+
+
+class TestResponseCache:
+    """Тесты кэша ответов."""
+
+    def test_query_normalized(self):
+        assert normalize_query(b"b=2&a=1&empty=") == normalize_query(b"a=1&b=2")
+
+    def test_concurrent_misses_render_once(self):
+        cache = make_cache()
+        calls = 0
+
+        async def render():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return OK
+
+        async def run():
+            key = await cache.build_key(("stats",), "/api/v1/stats/general", b"")
+            return await asyncio.gather(*(cache.fetch(key, render) for _ in range(5)))
+
+        results = asyncio.run(run())
+
+        assert calls == 1
+        assert sorted(state for _, state in results) == ["MISS"] + ["SHARED"] * 4
+        assert all(response == OK for response, _ in results)
+
+    def test_failed_render_not_cached(self):
+        cache = make_cache()
+
+        async def fail():
+            raise RuntimeError("db down")
+
+        async def render():
+            return OK
+
+        async def run():
+            key = await cache.build_key(("ads",), "/api/v1/ads/makes/list", b"")
+            with pytest.raises(RuntimeError):
+                await cache.fetch(key, fail)
+            return await cache.fetch(key, render)
+
+        assert asyncio.run(run()) == (OK, "MISS")
+
+    def test_error_response_not_cached(self):
+        cache = make_cache()
+
+        async def render():
+            return 500, [], b""
+
+        async def run():
+            key = await cache.build_key(("ads",), "/api/v1/ads/makes/list", b"")
+            await cache.fetch(key, render)
+            return await cache.fetch(key, render)
+
+        assert asyncio.run(run())[1] == "MISS"
+
+
+class TestInvalidation:
+    """Тесты сброса кэша ответов по уведомлению об изменении данных."""
+
+    def test_notification_invalidates_only_its_scope(self):
+        cache = make_cache()
+        listener = DataChangeListener("postgresql://unused")
+        listener.subscribe("ads", cache.invalidate)
+        listener.subscribe("stats", cache.invalidate)
+
+        async def render():
+            return OK
+
+        async def fetch_states():
+            states = {}
+            for scopes, path in ((("ads",), "/api/v1/ads/makes/list"), (("stats",), "/api/v1/stats/general")):
+                key = await cache.build_key(scopes, path, b"")
+                _, states[scopes[0]] = await cache.fetch(key, render)
+            return states
+
+        async def run():
+            await fetch_states()
+            await listener.handle_notification("stats:7:1760668800.5")
+            return await fetch_states()
+
+        assert asyncio.run(run()) == {"ads": "HIT", "stats": "MISS"}
+        # Поколение области - версия из уведомления
+        assert cache.stats()["generations"] == {"ads": 0, "stats": 7}
+
+    def test_workers_sharing_backend_stay_on_one_generation(self):
+        backend = MemoryCacheBackend(maxsize=100, ttl=60)
+        workers = [ResponseCache(backend, ttl=60), ResponseCache(backend, ttl=60)]
+        listeners = []
+        for cache in workers:
+            listener = DataChangeListener("postgresql://unused")
+            listener.subscribe("stats", cache.invalidate)
+            listeners.append(listener)
+        calls = 0
+
+        async def render():
+            nonlocal calls
+            calls += 1
+            return OK
+
+        async def run():
+            states = []
+            for _ in range(2):
+                # Каждый воркер получает то же уведомление, что и остальные
+                for listener in listeners:
+                    await listener.handle_notification("stats:8:1760668800.5")
+                for cache in workers:
+                    key = await cache.build_key(("stats",), "/api/v1/stats/general", b"")
+                    _, state = await cache.fetch(key, render)
+                    states.append(state)
+            return states
+
+        assert asyncio.run(run()) == ["MISS", "HIT", "HIT", "HIT"]
+        assert calls == 1
+        assert [cache.stats()["generations"]["stats"] for cache in workers] == [8, 8]
+
+    def test_notification_without_version_still_invalidates(self):
+        cache = make_cache()
+
+        async def render():
+            return OK
+
+        async def run():
+            key = await cache.build_key(("ads",), "/api/v1/ads/makes/list", b"")
+            await cache.fetch(key, render)
+            await cache.invalidate("ads")
+            key = await cache.build_key(("ads",), "/api/v1/ads/makes/list", b"")
+            return await cache.fetch(key, render)
+
+        assert asyncio.run(run())[1] == "MISS"
+
+    def test_multi_scope_route_invalidated_by_either_scope(self):
+        cache = make_cache()
+
+        async def render():
+            return OK
+
+        async def run():
+            key = await cache.build_key(("ads", "stats"), "/api/v1/ads/filters/options", b"")
+            await cache.fetch(key, render)
+            await cache.invalidate("ads")
+            return await cache.build_key(("ads", "stats"), "/api/v1/ads/filters/options", b""), key
+
+        new_key, old_key = asyncio.run(run())
+
+        assert new_key != old_key
+        assert len(cache.backend) == 0
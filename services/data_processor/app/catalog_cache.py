@@ -0,0 +1,129 @@
+# services/data_processor/app/catalog_cache.py
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import select
+
+from app.core.config import settings
+from app.db_session import get_session
+from app.models import CarMake, CarModel
+
+logger = logging.getLogger(__name__)
+
+
+def make_slug(make_name: str) -> str:
+    return make_name.lower().replace(" ", "-")
+
+
+def model_slug(make_name: str, model_name: str) -> str:
+    return f"{make_slug(make_name)}-{model_name.lower().replace(' ', '-')}"
+
+
+class CatalogCache:
+    """
+    Ограниченный LRU-кэш slug -> id для справочников car_make и car_model.
+
+    Промах обрабатывается вставкой INSERT ... ON CONFLICT DO NOTHING RETURNING в отдельной
+    короткой транзакции: так запись справочника не теряется при откате пачки объявлений,
+    а параллельные консьюмеры не конфликтуют при создании одной и той же марки.
+    """
+
+    def __init__(self, max_size: int, session_factory=get_session):
+        self.max_size = max_size
+        self._session_factory = session_factory
+        self._makes: "OrderedDict[str, int]" = OrderedDict()
+        self._models: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, store: "OrderedDict[str, int]", slug: str) -> Optional[int]:
+        entry_id = store.get(slug)
+        if entry_id is None:
+            self.misses += 1
+            return None
+        store.move_to_end(slug)
+        self.hits += 1
+        return entry_id
+
+    def _put(self, store: "OrderedDict[str, int]", slug: str, entry_id: int):
+        store[slug] = entry_id
+        store.move_to_end(slug)
+        while len(store) > self.max_size:
+            store.popitem(last=False)
+
+    async def warm(self):
+        """Загружает справочники в кэш при старте сервиса."""
+        async with self._session_factory() as session:
+            makes = await session.execute(select(CarMake.slug, CarMake.id).order_by(CarMake.id).limit(self.max_size))
+            for slug, entry_id in makes.all():
+                self._put(self._makes, slug, entry_id)
+
+            models = await session.execute(select(CarModel.slug, CarModel.id).order_by(CarModel.id).limit(self.max_size))
+            for slug, entry_id in models.all():
+                self._put(self._models, slug, entry_id)
+
+        logger.info(f"Кэш справочников прогрет: марок {len(self._makes)}, моделей {len(self._models)}")
+
+    def invalidate(self, slug: Optional[str] = None):
+        """Сбрасывает весь кэш или одну запись (по slug марки или модели)."""
+        if slug is None:
+            self._makes.clear()
+            self._models.clear()
+            logger.info("Кэш справочников полностью сброшен")
+            return
+        self._makes.pop(slug, None)
+        self._models.pop(slug, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "makes": len(self._makes),
+            "models": len(self._models),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    async def _insert_or_fetch(self, model_class, values: dict) -> int:
+        table = model_class.__table__
+        async with self._session_factory() as session:
+            result = await session.execute(
+                pg_insert(table)
+                .values(**values)
+                .on_conflict_do_nothing(index_elements=[table.c.slug])
+                .returning(table.c.id)
+            )
+            entry_id = result.scalar()
+            if entry_id is None:
+                # Запись уже создана другим процессом
+                result = await session.execute(select(table.c.id).where(table.c.slug == values["slug"]))
+                entry_id = result.scalar_one()
+            else:
+                logger.info(f"Создана новая запись {table.name}: {values['name']}")
+        return entry_id
+
+    async def get_make_id(self, make_name: Optional[str]) -> Optional[int]:
+        if not make_name:
+            return None
+        slug = make_slug(make_name)
+        make_id = self._get(self._makes, slug)
+        if make_id is None:
+            make_id = await self._insert_or_fetch(CarMake, {"name": make_name, "slug": slug})
+            self._put(self._makes, slug, make_id)
+        return make_id
+
+    async def get_model_id(self, make_name: Optional[str], model_name: Optional[str]) -> Optional[int]:
+        if not make_name or not model_name:
+            return None
+        slug = model_slug(make_name, model_name)
+        model_id = self._get(self._models, slug)
+        if model_id is None:
+            make_id = await self.get_make_id(make_name)
+            model_id = await self._insert_or_fetch(CarModel, {"name": model_name, "slug": slug, "make_id": make_id})
+            self._put(self._models, slug, model_id)
+        return model_id
+
+
+catalog_cache = CatalogCache(max_size=settings.CATALOG_CACHE_MAX_SIZE)
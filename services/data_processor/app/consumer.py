@@ -3,15 +3,16 @@ import asyncio
 import json
 import logging
 import sys
+from typing import Dict, List, Tuple
 
-from kafka import KafkaConsumer
-from pydantic import ValidationError
-from sqlalchemy.exc import IntegrityError, DatabaseError
-from asyncpg.exceptions import UniqueViolationError
-
+from app.catalog_cache import catalog_cache
 from app.core.config import settings
 from app.db_session import get_session
-from app.db_writer import process_ad_data
+from app.db_writer import process_ad_batch
+from app.dlq import DeadLetterSink, Producer, start_kafka_producer
+from app.kafka_runtime import AIOKafkaSource, ConsumerRuntime, KafkaRecord, MessageSource
+from app.metrics import start_metrics_server
+from app.retry import db_retry_policy
 from app.schemas import ScrapedAdSchema
 
 # Настройка логирования
@@ -20,43 +21,82 @@ logging.basicConfig(stream=sys.stdout, level=logging.INFO,
 logger = logging.getLogger(__name__)
 
 
+def deserialize_ad(record: KafkaRecord) -> ScrapedAdSchema:
+    """Стадия десериализации: JSON -> ScrapedAdSchema. Невалидное сообщение уходит в DLQ."""
+    return ScrapedAdSchema.model_validate(json.loads(record.value))
+
+
+def deduplicate_ads(items: List[Tuple[KafkaRecord, ScrapedAdSchema]]) -> List[ScrapedAdSchema]:
+    """
+    Дубликаты одного объявления внутри пачки схлопываются: остается последняя версия,
+    так как сообщения одного ключа приходят из одной партиции по порядку.
+    """
+    ads_by_id: Dict[str, ScrapedAdSchema] = {}
+    for _, ad_data in items:
+        ads_by_id[ad_data.source_ad_id] = ad_data
+    return list(ads_by_id.values())
+
+
+async def write_ads(items: List[Tuple[KafkaRecord, ScrapedAdSchema]]):
+    """
+    Стадия записи: одна транзакция на пачку рантайма. Исключения обрабатывает рантайм:
+    временные ошибки повторяются, а при постоянной пачка разбивается на отдельные
+    объявления, и в DLQ попадают только те, что не записываются поодиночке.
+    """
+    async with get_session() as session:
+        await process_ad_batch(session, deduplicate_ads(items))
+
+
+def ad_key(ad_data: ScrapedAdSchema) -> str:
+    return ad_data.source_ad_id
+
+
+def build_runtime(source: MessageSource, dlq_producer: Producer) -> ConsumerRuntime:
+    # Без пакетного режима каждое сообщение пишется своей транзакцией
+    batch_size = settings.CONSUMER_BATCH_SIZE if settings.CONSUMER_BATCH_ENABLED else 1
+    # В режиме пула воркеров обновления одного объявления всегда попадают к одному воркеру
+    # и пишутся по порядку, а разные объявления - параллельно в отдельных соединениях;
+    # без пула пишет один воркер, тоже по порядку
+    key = ad_key if settings.CONSUMER_WORKER_POOL_ENABLED else None
+    return ConsumerRuntime(
+        source,
+        deserialize_ad,
+        write_ads,
+        batch_size=batch_size,
+        max_wait_ms=settings.CONSUMER_BATCH_MAX_WAIT_MS,
+        max_in_flight=settings.CONSUMER_MAX_IN_FLIGHT,
+        queue_size=settings.CONSUMER_QUEUE_SIZE,
+        key=key,
+        retry=db_retry_policy(),
+        dead_letters=DeadLetterSink(dlq_producer, settings.KAFKA_TOPIC_ADS_DLQ),
+        name="ads",
+    )
+
+
 async def main():
     """Главная асинхронная функция запуска консьюмера."""
     logger.info("Запуск Kafka Consumer...")
     logger.info(f"Подключение к Kafka: {settings.KAFKA_BOOTSTRAP_SERVERS}")
     logger.info(f"Прослушивание топика: {settings.KAFKA_TOPIC_ADS}")
 
-    consumer = KafkaConsumer(
+    if settings.METRICS_ENABLED:
+        start_metrics_server(settings.METRICS_PORT)
+
+    await catalog_cache.warm()
+
+    source = AIOKafkaSource(
         settings.KAFKA_TOPIC_ADS,
-        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS.split(','),
         group_id=settings.KAFKA_CONSUMER_GROUP,
-        auto_offset_reset='earliest',
-        value_deserializer=lambda x: json.loads(x.decode('utf-8')),
-        enable_auto_commit=True,
+        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+        max_poll_records=settings.CONSUMER_BATCH_SIZE,
     )
-
-    for message in consumer:
-        logger.info(f"Получено сообщение из partition {message.partition} с offset {message.offset}")
-        try:
-            ad_data = ScrapedAdSchema.model_validate(message.value)
-
-            async with get_session() as session:
-                await process_ad_data(session, ad_data)
-
-        except ValidationError as e:
-            logger.error(f"Ошибка валидации данных: {e.errors()}")
-            logger.error(f"Проблемное сообщение: {message.value}")
-            # TODO: Отправить в DLQ (Dead Letter Queue)
-        except (IntegrityError, UniqueViolationError) as e:
-            logger.warning(f"Дублирующиеся данные (возможно, повторная обработка): {e}")
-            # Это нормально для idempotent операций
-        except DatabaseError as e:
-            logger.error(f"Ошибка базы данных: {e}")
-            # TODO: Реализовать retry логику
-        except Exception as e:
-            logger.exception(f"Произошла непредвиденная ошибка при обработке сообщения: {e}")
-            # TODO: Отправить в DLQ
+    dlq_producer = await start_kafka_producer(settings.KAFKA_BOOTSTRAP_SERVERS)
+    try:
+        await build_runtime(source, dlq_producer).run()
+    finally:
+        await dlq_producer.stop()
+    logger.info(f"Кэш справочников: {catalog_cache.stats()}")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -1,5 +1,7 @@
 # services/data_processor/app/core/config.py
 import os
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
@@ -28,10 +30,61 @@ class Settings(BaseSettings):
         return (f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@"
                 f"{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}")
 
+    # Пул соединений (те же имена, что в api_service, см. app/db_pool.py); один процесс
+    # держит до CONSUMER_MAX_IN_FLIGHT транзакций консьюмера одновременно
+    DB_POOL_SIZE: int = Field(default=5, ge=1, validation_alias="DB_POOL_SIZE")
+    DB_MAX_OVERFLOW: int = Field(default=10, ge=0, validation_alias="DB_MAX_OVERFLOW")
+    DB_POOL_TIMEOUT: float = Field(default=30, validation_alias="DB_POOL_TIMEOUT")
+    DB_POOL_RECYCLE: int = Field(default=3600, validation_alias="DB_POOL_RECYCLE")
+    DB_POOL_PRE_PING: bool = Field(default=False, validation_alias="DB_POOL_PRE_PING")
+    DB_STATEMENT_CACHE_SIZE: int = Field(default=100, ge=0, validation_alias="DB_STATEMENT_CACHE_SIZE")
+    # false - для PgBouncer в режиме transaction
+    DB_PREPARED_STATEMENTS: bool = Field(default=True, validation_alias="DB_PREPARED_STATEMENTS")
+
     # Настройки Kafka
     KAFKA_BOOTSTRAP_SERVERS: str = Field(default="localhost:9092", validation_alias="KAFKA_BOOTSTRAP_SERVERS")
     KAFKA_TOPIC_ADS: str = Field(default="scraped_ads", validation_alias="KAFKA_TOPIC_ADS")
     KAFKA_CONSUMER_GROUP: str = Field(default="ad-processor-group", validation_alias="KAFKA_CONSUMER_GROUP")
+    # Dead Letter Queue для сообщений, которые не удалось провалидировать или записать
+    KAFKA_TOPIC_ADS_DLQ: str = Field(default="scraped_ads.dlq", validation_alias="KAFKA_TOPIC_ADS_DLQ")
+    KAFKA_TOPIC_ACTIVE_IDS_DLQ: str = Field(default="active_car_ids.dlq", validation_alias="KAFKA_TOPIC_ACTIVE_IDS_DLQ")
+
+    # Пакетная обработка объявлений
+    CONSUMER_BATCH_ENABLED: bool = Field(default=True, validation_alias="CONSUMER_BATCH_ENABLED")
+    CONSUMER_BATCH_SIZE: int = Field(default=500, ge=1, validation_alias="CONSUMER_BATCH_SIZE")
+    CONSUMER_BATCH_MAX_WAIT_MS: int = Field(default=1000, ge=1, validation_alias="CONSUMER_BATCH_MAX_WAIT_MS")
+
+    # Асинхронный рантайм консьюмеров: число параллельных транзакций и емкость очередей между стадиями
+    CONSUMER_MAX_IN_FLIGHT: int = Field(default=4, ge=1, validation_alias="CONSUMER_MAX_IN_FLIGHT")
+    CONSUMER_QUEUE_SIZE: int = Field(default=8, ge=1, validation_alias="CONSUMER_QUEUE_SIZE")
+    # Пул воркеров с маршрутизацией по source_ad_id (CONSUMER_MAX_IN_FLIGHT воркеров);
+    # выключен - один воркер записи
+    CONSUMER_WORKER_POOL_ENABLED: bool = Field(default=True, validation_alias="CONSUMER_WORKER_POOL_ENABLED")
+
+    # Повтор транзакций при временных ошибках БД (экспоненциальная задержка)
+    DB_RETRY_MAX_ATTEMPTS: int = Field(default=6, ge=1, validation_alias="DB_RETRY_MAX_ATTEMPTS")
+    DB_RETRY_BASE_DELAY_MS: int = Field(default=200, ge=0, validation_alias="DB_RETRY_BASE_DELAY_MS")
+    DB_RETRY_MAX_DELAY_MS: int = Field(default=10000, ge=0, validation_alias="DB_RETRY_MAX_DELAY_MS")
+
+    # Поиск проданных объявлений: temp_table - COPY во временную таблицу и разница на сервере,
+    # in_memory - прежний расчет разницы множеств в Python
+    STATUS_UPDATE_MODE: Literal["temp_table", "in_memory"] = Field(default="temp_table", validation_alias="STATUS_UPDATE_MODE")
+
+    # Части списков активных ID без финального маркера (прерванные запуски) удаляются через это время
+    ACTIVE_IDS_STAGING_TTL_HOURS: int = Field(default=48, ge=1, validation_alias="ACTIVE_IDS_STAGING_TTL_HOURS")
+
+    # Период обновления материализованных витрин статистики (python -m app.stats_refresh)
+    STATS_REFRESH_INTERVAL_SECONDS: int = Field(default=300, ge=1, validation_alias="STATS_REFRESH_INTERVAL_SECONDS")
+    # Точная медиана цены (stats_price_median) сортирует все цены при каждом обновлении;
+    # без нее API должен брать медиану из гистограммы (STATS_MEDIAN_SOURCE=histogram)
+    STATS_EXACT_MEDIAN: bool = Field(default=True, validation_alias="STATS_EXACT_MEDIAN")
+
+    # Кэш справочников марок/моделей (максимум записей на каждый справочник)
+    CATALOG_CACHE_MAX_SIZE: int = Field(default=20000, ge=1, validation_alias="CATALOG_CACHE_MAX_SIZE")
+
+    # Метрики Prometheus (/metrics отдельным HTTP-сервером консьюмера)
+    METRICS_ENABLED: bool = Field(default=True, validation_alias="METRICS_ENABLED")
+    METRICS_PORT: int = Field(default=8001, validation_alias="METRICS_PORT")
 
 
 # Создаем экземпляр настроек, который будет использоваться в других модулях
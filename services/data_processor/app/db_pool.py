@@ -0,0 +1,101 @@
+# services/data_processor/app/db_pool.py
+"""
+Движок SQLAlchemy с пулом соединений, общий для api_service, data_processor и scrapy_runner.
+
+Как и metrics.py, модуль копируется в data_processor (app/db_pool.py): изменения
+вносятся в обе копии. Параметры пула берутся из настроек сервиса, имена одинаковы
+во всех сервисах:
+
+- DB_POOL_SIZE, DB_MAX_OVERFLOW - постоянные соединения и сверх них при пиках;
+- DB_POOL_TIMEOUT - сколько ждать свободное соединение, прежде чем вернуть ошибку;
+- DB_POOL_RECYCLE, DB_POOL_PRE_PING - пересоздание старых и проверка соединений;
+- DB_STATEMENT_CACHE_SIZE - prepared statements в кэше каждого соединения;
+- DB_PREPARED_STATEMENTS=false - без именованных prepared statements, которые
+  переживают транзакцию (PgBouncer в режиме transaction).
+
+Метрики: время получения соединения (db_pool_checkout_seconds), таймауты ожидания,
+соединения по состояниям и загрузка пула.
+"""
+import time
+from uuid import uuid4
+
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .metrics import counter, gauge, histogram, instrument_engine
+
+POOL_CHECKOUT_SECONDS = histogram(
+    "db_pool_checkout_seconds", "Time to get a usable connection: waiting, connecting, pre-ping", ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+POOL_CHECKOUT_TIMEOUTS = counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that waited DB_POOL_TIMEOUT without a free connection", ["pool"]
+)
+POOL_CONNECTIONS = gauge("db_pool_connections", "Pool connections by state", ["pool", "state"])
+POOL_UTILIZATION = gauge("db_pool_utilization", "Checked out connections / (pool size + max overflow)", ["pool"])
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool со временем получения соединения; метка - имя пула (pool_logging_name)"""
+
+    def connect(self):
+        label = self._orig_logging_name or "default"
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.labels(label).inc()
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.labels(label).observe(time.perf_counter() - started)
+
+
+def _unique_statement_name() -> str:
+    return f"__asyncpg_{uuid4()}__"
+
+
+def engine_options(settings) -> dict:
+    """Аргументы create_async_engine для пула из настроек сервиса"""
+    if settings.DB_PREPARED_STATEMENTS:
+        connect_args = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    else:
+        # Одноразовые имена: у соединения за PgBouncer от транзакции к транзакции
+        # меняется серверный процесс, и повторно использовать statement нельзя
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": _unique_statement_name,
+        }
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
+def instrument_pool(engine: AsyncEngine, name: str) -> None:
+    """Соединения пула по состояниям и его загрузка для /metrics"""
+    # engine.pool читается при каждом сборе: после engine.dispose() пул новый
+    def utilization() -> float:
+        pool = engine.pool
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        return pool.checkedout() / capacity if capacity else 0
+
+    POOL_CONNECTIONS.labels(name, "checked_out").set_function(lambda: engine.pool.checkedout())
+    POOL_CONNECTIONS.labels(name, "idle").set_function(lambda: engine.pool.checkedin())
+    POOL_CONNECTIONS.labels(name, "overflow").set_function(lambda: max(engine.pool.overflow(), 0))
+    POOL_UTILIZATION.labels(name).set_function(utilization)
+
+
+def create_pooled_engine(url: str, settings, name: str, **kwargs) -> AsyncEngine:
+    """Асинхронный движок с пулом из настроек сервиса и метриками; name - метка пула в метриках"""
+    engine = create_async_engine(url, pool_logging_name=name, **{**engine_options(settings), **kwargs})
+    # Счетчик SQL-запросов по типу
+    instrument_engine(engine)
+    instrument_pool(engine, name)
+    return engine
@@ -1,13 +1,17 @@
 # services/data_processor/app/db_session.py
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlmodel import SQLModel
 
 from app.core.config import settings
+from app.db_pool import create_pooled_engine
 
-engine = create_async_engine(settings.database_url, echo=False, future=True)
+# Пул и метрики пула - DB_POOL_* (app/db_pool.py)
+engine = create_pooled_engine(settings.database_url, settings, "data_processor")
+
+# Фабрика сессий создается один раз на процесс
+AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
 @asynccontextmanager
@@ -15,10 +19,7 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
     """
     Генератор асинхронных сессий, обернутый в менеджер контекста.
     """
-    async_session = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
-    async with async_session() as session:
+    async with AsyncSessionLocal() as session:
         try:
             yield session
             await session.commit()
@@ -26,4 +27,4 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
             await session.rollback()
             raise
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
@@ -1,20 +1,228 @@
 # services/data_processor/app/db_updater.py
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
 
-from sqlalchemy import update
+from sqlalchemy import column, delete, exists, func, insert, literal, literal_column, table, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 
-from app.models import AutoAd, AutoAdHistory
+from app.catalog_cache import make_slug
+from app.core.config import settings
+from app.models import AUTO_AD_MAKE_KEY_SQL, ActiveIdsChunk, ActiveIdsStaging, AutoAd, AutoAdHistory
+from app.notifications import SCOPE_ADS, notify_data_changed
 from app.schemas import ActiveIdsSchema
 
 logger = logging.getLogger(__name__)
 
+# Временная таблица с активными ID текущей марки (живет до конца транзакции)
+ACTIVE_IDS_TEMP_TABLE = "tmp_active_ad_ids"
+active_ids_tmp = table(ACTIVE_IDS_TEMP_TABLE, column("id_ad"))
+
+# Выражение подставляется в SQL как есть (без bind-параметров), иначе планировщик
+# не сопоставит его с индексом ix_auto_ad_active_source_make_key
+auto_ad_make_key = literal_column(AUTO_AD_MAKE_KEY_SQL)
+
+
+def make_condition(make_str: str):
+    """Точное совпадение марки по нормализованному ключу (вместо ILIKE '%марка%')."""
+    return auto_ad_make_key == make_slug(make_str)
+
 
 async def update_sold_ads(session: AsyncSession, active_data: ActiveIdsSchema):
     """
     Основная функция для обновления статуса проданных/неактивных объявлений для конкретной марки.
+    Режим выбирается настройкой STATUS_UPDATE_MODE: temp_table (по умолчанию) или in_memory.
+    """
+    if settings.STATUS_UPDATE_MODE == "temp_table":
+        return await update_sold_ads_set_based(session, active_data)
+    return await update_sold_ads_in_memory(session, active_data)
+
+
+async def copy_active_ids(session: AsyncSession, ad_ids: Iterable[str]) -> int:
+    """
+    Загружает активные ID во временную таблицу через COPY в рамках текущей транзакции сессии.
+    Возвращает число загруженных строк.
+    """
+    await session.execute(text(
+        f"CREATE TEMP TABLE IF NOT EXISTS {ACTIVE_IDS_TEMP_TABLE} (id_ad varchar PRIMARY KEY) ON COMMIT DROP"
+    ))
+    await session.execute(text(f"TRUNCATE {ACTIVE_IDS_TEMP_TABLE}"))
+
+    # COPY выполняется напрямую через asyncpg, в той же транзакции, что и сессия
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    status = await raw_connection.driver_connection.copy_records_to_table(
+        ACTIVE_IDS_TEMP_TABLE,
+        records=((str(ad_id),) for ad_id in ad_ids),
+        columns=["id_ad"],
+    )
+    # Для временных таблиц нет автоанализа: без статистики планировщик ошибается с anti join
+    await session.execute(text(f"ANALYZE {ACTIVE_IDS_TEMP_TABLE}"))
+    return int(status.split()[-1])
+
+
+def build_mark_sold_statement(source: str, make_str: str, sold_timestamp: datetime, make_clause=None,
+                              active_ids=None):
+    """
+    Один запрос на сервере: UPDATE ... RETURNING помечает проданными активные объявления
+    марки, которых нет среди active_ids (по умолчанию временная таблица), а INSERT ... SELECT
+    пишет по ним историю. make_clause позволяет подменить условие по марке (используется в бенчмарке).
+    """
+    if active_ids is None:
+        active_ids = active_ids_tmp
+    sold = (
+        update(AutoAd)
+        .where(AutoAd.source_name == source)
+        .where(AutoAd.sold_at.is_(None))
+        .where(make_clause if make_clause is not None else make_condition(make_str))
+        .where(~exists().where(active_ids.c.id_ad == AutoAd.id_ad))
+        .values(sold_at=sold_timestamp)
+        .returning(AutoAd.id_ad, AutoAd.price, AutoAd.currencyCode)
+        .cte("sold")
+    )
+    return (
+        insert(AutoAdHistory)
+        .from_select(
+            ["auto_ad_id", "timestamp", "status", "price", "currencyCode"],
+            select(sold.c.id_ad, literal(sold_timestamp), literal("sold"), sold.c.price, sold.c.currencyCode),
+        )
+    )
+
+
+async def update_sold_ads_set_based(session: AsyncSession, active_data: ActiveIdsSchema) -> int:
+    """
+    Разница множеств считается в Postgres: активные ID из сообщения загружаются через COPY
+    во временную таблицу, затем одним запросом помечаются проданные и пишется история.
+    Возвращает число объявлений, помеченных как проданные.
+    """
+    source = active_data.source_name
+    make_str = active_data.make_str
+
+    active_count = await copy_active_ids(session, active_data.ad_ids)
+    logger.info(f"Марка '{make_str}' ({source}): загружено {active_count} активных ID во временную таблицу")
+
+    sold_timestamp = datetime.utcnow()
+    result = await session.execute(build_mark_sold_statement(source, make_str, sold_timestamp))
+    sold_count = result.rowcount
+    if sold_count:
+        await notify_data_changed(session, SCOPE_ADS)
+
+    logger.info(f"Марка '{make_str}' ({source}): помечено проданными {sold_count} объявлений")
+    return sold_count
+
+
+def _run_filter(model, active_data: ActiveIdsSchema, make_key: str):
+    return (
+        (model.run_id == active_data.run_id)
+        & (model.source_name == active_data.source_name)
+        & (model.make_key == make_key)
+    )
+
+
+async def process_active_ids_chunk(session: AsyncSession, active_data: ActiveIdsSchema) -> Optional[int]:
+    """
+    Chunked-протокол: части складываются в active_ids_staging, разница считается только
+    по финальному маркеру. Возвращает число проданных объявлений (None для обычной части).
+    """
+    make_key = make_slug(active_data.make_str)
+    if active_data.is_final:
+        return await finalize_active_ids_run(session, active_data, make_key)
+
+    # Повторно доставленная часть пропускается: запись о части и ее ID коммитятся вместе
+    registered = await session.execute(
+        pg_insert(ActiveIdsChunk)
+        .values(
+            run_id=active_data.run_id,
+            source_name=active_data.source_name,
+            make_key=make_key,
+            chunk_index=active_data.chunk_index,
+            id_count=len(active_data.ad_ids),
+            received_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing()
+        .returning(ActiveIdsChunk.chunk_index)
+    )
+    if registered.scalar() is None:
+        logger.info(f"Часть {active_data.chunk_index} марки '{active_data.make_str}' "
+                    f"(запуск {active_data.run_id}) уже получена, пропускаем")
+        return None
+
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        ActiveIdsStaging.__tablename__,
+        records=((active_data.run_id, active_data.source_name, make_key, ad_id) for ad_id in active_data.ad_ids),
+        columns=["run_id", "source_name", "make_key", "ad_id"],
+    )
+    logger.info(f"Марка '{active_data.make_str}' (запуск {active_data.run_id}): "
+                f"часть {active_data.chunk_index}, {len(active_data.ad_ids)} ID")
+    return None
+
+
+async def finalize_active_ids_run(session: AsyncSession, active_data: ActiveIdsSchema, make_key: str) -> int:
+    """
+    Финальный маркер: если обход марки полный и получены все части, помечает проданными
+    активные объявления, которых нет в staging. Иначе ничего не меняет - прерванный или
+    неполный обход не должен помечать живые объявления проданными.
+    """
+    make_str = active_data.make_str
+    received = (await session.execute(
+        select(func.count()).select_from(ActiveIdsChunk).where(_run_filter(ActiveIdsChunk, active_data, make_key))
+    )).scalar_one()
+
+    sold_count = 0
+    if not active_data.is_complete:
+        logger.warning(f"Марка '{make_str}' (запуск {active_data.run_id}) обойдена не полностью, "
+                       f"проданные объявления не определяются")
+    elif received == 0:
+        # Пустая марка - скорее сбой выдачи, чем продажа всех объявлений
+        logger.error(f"Марка '{make_str}' (запуск {active_data.run_id}): не получено ни одного активного ID, "
+                     f"проданные объявления не определяются")
+    elif received != active_data.chunk_count:
+        logger.error(f"Марка '{make_str}' (запуск {active_data.run_id}): получено частей {received} "
+                     f"из {active_data.chunk_count}, проданные объявления не определяются")
+    else:
+        staged = (
+            select(ActiveIdsStaging.ad_id.label("id_ad"))
+            .where(_run_filter(ActiveIdsStaging, active_data, make_key))
+            .subquery("staged")
+        )
+        result = await session.execute(
+            build_mark_sold_statement(active_data.source_name, make_str, datetime.utcnow(), active_ids=staged)
+        )
+        sold_count = result.rowcount
+        logger.info(f"Марка '{make_str}' ({active_data.source_name}, запуск {active_data.run_id}): "
+                    f"частей {received}, помечено проданными {sold_count} объявлений")
+
+    await session.execute(delete(ActiveIdsStaging).where(_run_filter(ActiveIdsStaging, active_data, make_key)))
+    await session.execute(delete(ActiveIdsChunk).where(_run_filter(ActiveIdsChunk, active_data, make_key)))
+    await cleanup_stale_active_ids(session)
+    if sold_count:
+        # Последним запросом транзакции (см. app/notifications.py)
+        await notify_data_changed(session, SCOPE_ADS)
+    return sold_count
+
+
+async def cleanup_stale_active_ids(session: AsyncSession):
+    """Удаляет части запусков, финальный маркер которых так и не пришел."""
+    stale_before = datetime.utcnow() - timedelta(hours=settings.ACTIVE_IDS_STAGING_TTL_HOURS)
+    stale_runs = (
+        select(ActiveIdsChunk.run_id, ActiveIdsChunk.source_name, ActiveIdsChunk.make_key)
+        .where(ActiveIdsChunk.received_at < stale_before)
+    )
+    await session.execute(
+        delete(ActiveIdsStaging).where(
+            func.row(ActiveIdsStaging.run_id, ActiveIdsStaging.source_name, ActiveIdsStaging.make_key).in_(stale_runs)
+        )
+    )
+    await session.execute(delete(ActiveIdsChunk).where(ActiveIdsChunk.received_at < stale_before))
+
+
+async def update_sold_ads_in_memory(session: AsyncSession, active_data: ActiveIdsSchema):
+    """
+    Прежний режим: разница множеств считается в Python, обновление через IN со списком ID.
     """
     source = active_data.source_name
     make_str = active_data.make_str
@@ -30,7 +238,7 @@ async def update_sold_ads(session: AsyncSession, active_data: ActiveIdsSchema):
         select(AutoAd.id_ad)
         .where(AutoAd.source_name == source)
         .where(AutoAd.sold_at.is_(None))
-        .where(AutoAd.make_name.ilike(f"%{make_str}%"))  # Используем make_name вместо join с CarMake
+        .where(make_condition(make_str))  # Ключ марки из make_name вместо join с CarMake
     )
     
     result = await session.execute(query)
@@ -125,6 +333,8 @@ async def update_sold_ads(session: AsyncSession, active_data: ActiveIdsSchema):
 
         if history_entries_to_add:
             session.add_all(history_entries_to_add)
+            await session.flush()
+            await notify_data_changed(session, SCOPE_ADS)
             await session.commit()
             logger.info(f"Успешно обновлено {updated_count} объявлений марки '{make_str}'.")
         else:
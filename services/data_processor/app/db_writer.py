@@ -1,106 +1,171 @@
 # services/data_processor/app/db_writer.py
 import logging
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
+from sqlalchemy import and_, case, func, insert, literal, literal_column, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select, Session
 
 from app.schemas import ScrapedAdSchema
-from app.models import AutoAd, CarMake, CarModel, AutoAdHistory
+from app.catalog_cache import catalog_cache
+from app.models import AutoAd, AutoAdHistory
+from app.notifications import SCOPE_ADS, notify_data_changed
 
 logger = logging.getLogger(__name__)
 
+# Поля схемы, которые не являются колонками auto_ad
+NON_COLUMN_FIELDS = {"source_ad_id", "country_code", "scraped_at", "description", "image_urls"}
 
-async def get_or_create_make(session: AsyncSession, make_name: str) -> Optional[CarMake]:
-    if not make_name:
-        return None
-    slug = make_name.lower().replace(" ", "-")
-    result = await session.execute(select(CarMake).where(CarMake.slug == slug))
-    make = result.scalars().first()
-    if not make:
-        make = CarMake(name=make_name, slug=slug)
-        session.add(make)
-        await session.flush()
-        logger.info(f"Создана новая марка: {make_name}")
-    return make
-
-
-async def get_or_create_model(session: AsyncSession, make: CarMake, model_name: str) -> Optional[CarModel]:
-    if not model_name or not make:
-        return None
-    slug = f"{make.slug}-{model_name.lower().replace(' ', '-')}"
-    result = await session.execute(select(CarModel).where(CarModel.slug == slug))
-    model = result.scalars().first()
-    if not model:
-        model = CarModel(name=model_name, slug=slug, make_id=make.id)
-        session.add(model)
-        await session.flush()
-        logger.info(f"Создана новая модель: {model_name} для марки {make.name}")
-    return model
+# Колонки, которые не перезаписываются при обновлении существующего объявления
+UPSERT_IMMUTABLE_COLUMNS = {"id_ad", "url_ad", "source_name", "car_model_id"}
 
+# Дата публикации сохраняется при повторном обходе; из новой строки берется, только если ее не было
+UPSERT_KEEP_EXISTING_COLUMNS = {"createdAt"}
 
-async def process_ad_data(session: Session, ad_data: ScrapedAdSchema):
-    result = await session.execute(select(AutoAd).where(AutoAd.id_ad == ad_data.source_ad_id))
-    existing_ad: Optional[AutoAd] = result.scalars().first()
-
-    if existing_ad:
-        logger.info(f"Обновление данных для объявления ID: {ad_data.source_ad_id}")
-
-        update_data = ad_data.model_dump(by_alias=True, exclude_unset=True,
-                                         exclude={'source_ad_id', 'source_name', 'country_code', 'scraped_at',
-                                                  'description', 'image_urls', 'url_ad'})
-
-        # Убираем информацию о часовом поясе из createdAt перед обновлением
-        if 'createdAt' in update_data and update_data['createdAt'] and getattr(update_data['createdAt'], 'tzinfo',
-                                                                               None):
-            logger.info(f"Преобразование aware datetime в naive для {ad_data.source_ad_id}")
-            update_data['createdAt'] = update_data['createdAt']
-
-        price_changed = 'price' in update_data and existing_ad.price != update_data.get('price')
-
-        for key, value in update_data.items():
-            setattr(existing_ad, key, value)
-
-        if price_changed:
-            logger.info(
-                f"Цена изменилась для {ad_data.source_ad_id}: {existing_ad.price} -> {update_data.get('price')}")
-            history_entry = AutoAdHistory(
-                auto_ad_id=existing_ad.id_ad,
-                price=update_data.get('price'),
-                currencyCode=update_data.get('currencyCode'),
-                status="price_changed"
-            )
-            session.add(history_entry)
-        session.add(existing_ad)
-
-    else:
-        logger.info(f"Создание нового объявления ID: {ad_data.source_ad_id}")
-        make = await get_or_create_make(session, ad_data.make_str)
-        model = await get_or_create_model(session, make, ad_data.model_str)
-
-        new_ad_dict = ad_data.model_dump(
-            by_alias=True,
-            exclude_unset=True,
-            exclude={"source_ad_id", "country_code", "scraped_at", "description", "image_urls"}
-        )
+# asyncpg ограничивает запрос 32767 параметрами, поэтому очень большие пачки режутся на части
+UPSERT_CHUNK_SIZE = 1000
+
+
+async def get_or_create_make(make_name: Optional[str]) -> Optional[int]:
+    """Возвращает id марки из кэша справочников; при промахе марка создается."""
+    return await catalog_cache.get_make_id(make_name)
 
-        # Убираем информацию о часовом поясе из createdAt перед созданием
-        if 'createdAt' in new_ad_dict and new_ad_dict['createdAt'] and getattr(new_ad_dict['createdAt'], 'tzinfo',
-                                                                               None):
-            new_ad_dict['createdAt'] = new_ad_dict['createdAt']
-        elif 'createdAt' not in new_ad_dict or not new_ad_dict.get('createdAt'):
-            new_ad_dict['createdAt'] = datetime.utcnow()
 
-        new_ad = AutoAd(id_ad=ad_data.source_ad_id, **new_ad_dict)
-        new_ad.car_model_id = model.id if model else None
+async def get_or_create_model(make_name: Optional[str], model_name: Optional[str]) -> Optional[int]:
+    """Возвращает id модели из кэша справочников; при промахе модель (и марка) создается."""
+    return await catalog_cache.get_model_id(make_name, model_name)
 
-        session.add(new_ad)
 
-        history_entry = AutoAdHistory(
-            auto_ad_id=new_ad.id_ad,
-            price=new_ad.price,
-            currencyCode=new_ad.currencyCode,
-            status="active"
+async def process_ad_data(session: Session, ad_data: ScrapedAdSchema):
+    """Записывает одно объявление тем же set-based запросом, что и пачку."""
+    await process_ad_batch(session, [ad_data])
+
+
+async def resolve_car_model_ids(ads: List[ScrapedAdSchema]) -> Dict[Tuple[str, str], Optional[int]]:
+    """Находит (или создает) модели для всех уникальных пар марка/модель в пачке."""
+    model_ids: Dict[Tuple[str, str], Optional[int]] = {}
+    for ad_data in ads:
+        key = (ad_data.make_str, ad_data.model_str)
+        if key in model_ids:
+            continue
+        model_ids[key] = await get_or_create_model(ad_data.make_str, ad_data.model_str)
+    return model_ids
+
+
+def build_ad_row(ad_data: ScrapedAdSchema, car_model_id: Optional[int]) -> dict:
+    """Преобразует схему объявления в строку таблицы auto_ad."""
+    row = ad_data.model_dump(by_alias=True, exclude=NON_COLUMN_FIELDS)
+    row["id_ad"] = ad_data.source_ad_id
+    row["car_model_id"] = car_model_id
+    if row.get("price") is not None:
+        row["price"] = int(row["price"])
+    if not row.get("createdAt"):
+        row["createdAt"] = datetime.utcnow()
+    return row
+
+
+def build_upsert_statement(rows: List[dict], timestamp: datetime):
+    """
+    Строит один запрос для пачки:
+    INSERT ... ON CONFLICT (id_ad) DO UPDATE ... RETURNING, а в той же команде -
+    вставку в auto_ad_history для новых объявлений и объявлений с изменившейся ценой.
+    Все CTE видят один снимок данных, поэтому "previous" содержит цены до обновления.
+    """
+    ad_table = AutoAd.__table__
+    history_table = AutoAdHistory.__table__
+    ids = [row["id_ad"] for row in rows]
+
+    previous = (
+        select(ad_table.c.id_ad, ad_table.c.price.label("old_price"))
+        .where(ad_table.c.id_ad.in_(ids))
+        .cte("previous")
+    )
+
+    insert_stmt = pg_insert(ad_table).values(rows)
+    # Поля, которые паук в этот раз не нашел (NULL), не затирают сохраненные значения
+    update_columns = {
+        name: (
+            func.coalesce(ad_table.c[name], insert_stmt.excluded[name])
+            if name in UPSERT_KEEP_EXISTING_COLUMNS
+            else func.coalesce(insert_stmt.excluded[name], ad_table.c[name])
+        )
+        for name in rows[0]
+        if name not in UPSERT_IMMUTABLE_COLUMNS
+    }
+    upserted = (
+        insert_stmt
+        .on_conflict_do_update(index_elements=[ad_table.c.id_ad], set_=update_columns)
+        .returning(
+            ad_table.c.id_ad,
+            ad_table.c.price,
+            ad_table.c.currencyCode,
+            # xmax = 0 только у строк, вставленных этой командой
+            literal_column("(xmax = 0)").label("inserted"),
+        )
+        .cte("upserted")
+    )
+
+    history_rows = (
+        select(
+            upserted.c.id_ad,
+            literal(timestamp, type_=history_table.c.timestamp.type),
+            upserted.c.price,
+            upserted.c.currencyCode,
+            case((upserted.c.inserted, literal("active")), else_=literal("price_changed")),
         )
-        session.add(history_entry)
+        .select_from(upserted.outerjoin(previous, previous.c.id_ad == upserted.c.id_ad))
+        .where(or_(
+            upserted.c.inserted,
+            and_(upserted.c.price.isnot(None), previous.c.old_price.is_distinct_from(upserted.c.price)),
+        ))
+    )
+
+    return (
+        insert(history_table)
+        .from_select(["auto_ad_id", "timestamp", "price", "currencyCode", "status"], history_rows)
+        .returning(history_table.c.status)
+        .add_cte(previous)
+        .add_cte(upserted)
+    )
+
+
+async def upsert_ads_batch(session: AsyncSession, ads: List[ScrapedAdSchema]) -> Dict[str, int]:
+    """
+    Записывает пачку объявлений set-based запросом: один statement на пачку
+    (плюс поиск марок/моделей) вместо SELECT + UPDATE/INSERT + история на каждое объявление.
+    """
+    if not ads:
+        return {"inserted": 0, "updated": 0, "price_changed": 0}
+
+    model_ids = await resolve_car_model_ids(ads)
+    rows = [build_ad_row(ad, model_ids.get((ad.make_str, ad.model_str))) for ad in ads]
+    timestamp = datetime.utcnow()
+
+    inserted = 0
+    price_changed = 0
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+        result = await session.execute(build_upsert_statement(chunk, timestamp))
+        statuses = result.scalars().all()
+        inserted += sum(1 for status in statuses if status == "active")
+        price_changed += sum(1 for status in statuses if status == "price_changed")
+
+    stats = {"inserted": inserted, "updated": len(rows) - inserted, "price_changed": price_changed}
+    logger.info(
+        f"Пачка записана: новых {stats['inserted']}, обновлено {stats['updated']}, "
+        f"изменений цены {stats['price_changed']}"
+    )
+    return stats
+
+
+async def process_ad_batch(session: AsyncSession, ads: List[ScrapedAdSchema]) -> int:
+    """
+    Записывает пачку объявлений в рамках одной транзакции сессии.
+    Коммит выполняет вызывающая сторона (get_session), поэтому либо сохраняется вся пачка, либо ничего.
+    """
+    await upsert_ads_batch(session, ads)
+    if ads:
+        await notify_data_changed(session, SCOPE_ADS)
+    return len(ads)
@@ -0,0 +1,83 @@
+# services/data_processor/app/dlq.py
+"""
+Dead Letter Queue: сообщения, которые не удалось обработать, публикуются в отдельный
+топик без изменений, а причина ошибки передается в заголовках dlq.*.
+Повторная отправка в исходный топик - app/dlq_replay.py.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Protocol, Tuple
+
+from app.kafka_runtime import KafkaRecord
+
+logger = logging.getLogger(__name__)
+
+DLQ_HEADER_PREFIX = "dlq."
+# Ограничиваем текст ошибки, чтобы заголовки не раздували сообщение
+MAX_ERROR_LENGTH = 2000
+
+
+class Producer(Protocol):
+    """Подмножество API AIOKafkaProducer, которое используется DLQ (реализуется и InMemoryBroker)."""
+
+    async def send_and_wait(self, topic: str, value=None, key=None, partition=None,
+                            timestamp_ms=None, headers=None): ...
+
+
+def dlq_headers(record: KafkaRecord, error: BaseException, attempts: int, stage: str) -> List[Tuple[str, bytes]]:
+    """Исходные заголовки сообщения + метаданные ошибки (предыдущие dlq.* перезаписываются)."""
+    headers = [(name, value) for name, value in record.headers if not name.startswith(DLQ_HEADER_PREFIX)]
+    metadata = {
+        "original_topic": record.topic,
+        "partition": str(record.partition),
+        "offset": str(record.offset),
+        "stage": stage,
+        "error_type": type(error).__name__,
+        "error": str(error)[:MAX_ERROR_LENGTH],
+        "attempts": str(attempts),
+        "failed_at": datetime.now(timezone.utc).isoformat(),
+    }
+    headers.extend((DLQ_HEADER_PREFIX + name, value.encode("utf-8")) for name, value in metadata.items())
+    return headers
+
+
+def read_dlq_metadata(record: KafkaRecord) -> Dict[str, str]:
+    """Метаданные ошибки из заголовков сообщения DLQ."""
+    return {
+        name[len(DLQ_HEADER_PREFIX):]: value.decode("utf-8", errors="replace")
+        for name, value in record.headers
+        if name.startswith(DLQ_HEADER_PREFIX)
+    }
+
+
+class DeadLetterSink:
+    """Публикует необработанные сообщения в топик DLQ."""
+
+    def __init__(self, producer: Producer, topic: str):
+        self.producer = producer
+        self.topic = topic
+        self.sent = 0
+
+    async def send(self, record: KafkaRecord, error: BaseException, attempts: int, stage: str):
+        """
+        Ошибка отправки пробрасывается наружу: offset такого сообщения не будет зафиксирован,
+        и после перезапуска оно будет прочитано снова.
+        """
+        await self.producer.send_and_wait(
+            self.topic,
+            value=record.value,
+            key=record.key,
+            headers=dlq_headers(record, error, attempts, stage),
+        )
+        self.sent += 1
+        logger.warning(f"Сообщение {record.topic}[{record.partition}]@{record.offset} отправлено в {self.topic} "
+                       f"(стадия {stage}, попыток {attempts}): {type(error).__name__}: {error}")
+
+
+async def start_kafka_producer(bootstrap_servers: str) -> Producer:
+    """Создает и запускает AIOKafkaProducer для DLQ и replay."""
+    from aiokafka import AIOKafkaProducer
+
+    producer = AIOKafkaProducer(bootstrap_servers=bootstrap_servers.split(','), acks="all")
+    await producer.start()
+    return producer
@@ -0,0 +1,128 @@
+# services/data_processor/app/dlq_replay.py
+"""
+Повторная отправка сообщений из DLQ в исходный топик пачками.
+
+Запуск (например, после восстановления БД):
+    python -m app.dlq_replay --dlq-topic scraped_ads.dlq --batch-size 500
+    python -m app.dlq_replay --dlq-topic scraped_ads.dlq --dry-run
+
+Сообщения публикуются без изменений, а offset'ы DLQ фиксируются только после
+подтверждения отправки всей пачки, поэтому прерванный replay можно просто перезапустить.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from collections import Counter
+from typing import Optional
+
+from app.core.config import settings
+from app.dlq import DLQ_HEADER_PREFIX, Producer, read_dlq_metadata, start_kafka_producer
+from app.kafka_runtime import AIOKafkaSource, MessageSource
+
+logging.basicConfig(stream=sys.stdout, level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+REPLAY_CONSUMER_GROUP = "dlq-replay-group"
+REPLAY_HEADER = "dlq.replayed_from"
+
+
+async def replay(
+    source: MessageSource,
+    producer: Producer,
+    *,
+    batch_size: int = 500,
+    max_messages: Optional[int] = None,
+    target_topic: Optional[str] = None,
+    dry_run: bool = False,
+    idle_timeout_ms: int = 5000,
+) -> Counter:
+    """
+    Читает DLQ и публикует сообщения в target_topic (по умолчанию - в исходный топик
+    из заголовка dlq.original_topic). Завершается, когда DLQ дочитан или достигнут max_messages.
+    Возвращает количество сообщений по целевым топикам.
+    """
+    replayed: Counter = Counter()
+    total = 0
+
+    await source.start()
+    try:
+        while max_messages is None or total < max_messages:
+            limit = batch_size if max_messages is None else min(batch_size, max_messages - total)
+            records = await source.getmany(timeout_ms=idle_timeout_ms, max_records=limit)
+            if not records:
+                break
+
+            sends = []
+            offsets = {}
+            for record in records:
+                offsets[record.partition_key] = record.offset + 1
+                metadata = read_dlq_metadata(record)
+                topic = target_topic or metadata.get("original_topic")
+                if not topic:
+                    logger.error(f"Сообщение DLQ {record.partition}@{record.offset} без исходного топика, пропущено")
+                    continue
+
+                replayed[topic] += 1
+                if dry_run:
+                    logger.info(f"[dry-run] {record.partition}@{record.offset} -> {topic}: "
+                                f"{metadata.get('error_type')}: {metadata.get('error')}")
+                else:
+                    # Метаданные ошибки не переносим, оставляем ссылку на сообщение в DLQ
+                    headers = [(name, value) for name, value in record.headers
+                               if not name.startswith(DLQ_HEADER_PREFIX)]
+                    headers.append((REPLAY_HEADER, f"{record.topic}:{record.partition}:{record.offset}".encode()))
+                    sends.append(producer.send_and_wait(topic, value=record.value, key=record.key, headers=headers))
+
+            # Отправки пачки идут параллельно; offset'ы DLQ фиксируются только после подтверждения всех
+            await asyncio.gather(*sends)
+            if not dry_run:
+                await source.commit(offsets)
+
+            total += len(records)
+            logger.info(f"Переиграно {total} сообщений: {dict(replayed)}")
+    finally:
+        await source.stop()
+
+    return replayed
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Повторная отправка сообщений из DLQ в исходный топик")
+    parser.add_argument("--dlq-topic", default=settings.KAFKA_TOPIC_ADS_DLQ,
+                        help="топик DLQ (по умолчанию %(default)s)")
+    parser.add_argument("--target-topic", default=None,
+                        help="куда отправлять (по умолчанию - исходный топик из метаданных)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--max-messages", type=int, default=None)
+    parser.add_argument("--group-id", default=REPLAY_CONSUMER_GROUP)
+    parser.add_argument("--dry-run", action="store_true",
+                        help="только показать сообщения и ошибки, не отправлять и не коммитить")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    logger.info(f"Replay из {args.dlq_topic} пачками по {args.batch_size}")
+
+    source = AIOKafkaSource(args.dlq_topic, group_id=args.group_id,
+                            bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS)
+    producer = await start_kafka_producer(settings.KAFKA_BOOTSTRAP_SERVERS)
+    try:
+        replayed = await replay(
+            source,
+            producer,
+            batch_size=args.batch_size,
+            max_messages=args.max_messages,
+            target_topic=args.target_topic,
+            dry_run=args.dry_run,
+        )
+    finally:
+        await producer.stop()
+
+    logger.info(f"Replay завершен: {dict(replayed) or 'DLQ пуст'}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+# services/data_processor/app/in_memory_broker.py
+"""
+In-memory брокер для тестов рантайма консьюмеров без Kafka.
+
+Хранит топики как списки партиций и зафиксированные offset'ы по группам,
+повторяя семантику Kafka, нужную рантайму: чтение с последнего коммита,
+порядок внутри партиции и распределение по ключу.
+"""
+import asyncio
+import json
+import zlib
+from typing import Dict, List, Optional, Tuple, Union
+
+from app.kafka_runtime import KafkaRecord, PartitionKey
+
+
+class InMemoryBroker:
+    def __init__(self, partitions: int = 1):
+        self.partitions = partitions
+        self._topics: Dict[str, List[List[KafkaRecord]]] = {}
+        # (group_id, topic, partition) -> следующий offset к чтению
+        self.committed: Dict[Tuple[str, str, int], int] = {}
+
+    def _topic(self, topic: str) -> List[List[KafkaRecord]]:
+        return self._topics.setdefault(topic, [[] for _ in range(self.partitions)])
+
+    def produce(self, topic: str, value, key: Union[str, bytes, None] = None, partition: Optional[int] = None,
+                headers: Optional[List[Tuple[str, bytes]]] = None) -> KafkaRecord:
+        """Публикует сообщение. Словари сериализуются в JSON, как это делает пайплайн Scrapy."""
+        if isinstance(key, str):
+            key = key.encode()
+        if partition is None:
+            partition = zlib.crc32(key) % self.partitions if key else 0
+        if not isinstance(value, bytes):
+            value = json.dumps(value).encode("utf-8")
+
+        log = self._topic(topic)[partition]
+        record = KafkaRecord(
+            topic=topic,
+            partition=partition,
+            offset=len(log),
+            value=value,
+            key=key,
+            headers=list(headers or []),
+        )
+        log.append(record)
+        return record
+
+    async def send_and_wait(self, topic: str, value=None, key=None, partition=None, timestamp_ms=None, headers=None):
+        """Совместимо с AIOKafkaProducer.send_and_wait: брокер можно передать как producer."""
+        return self.produce(topic, value, key=key, partition=partition, headers=headers)
+
+    def records(self, topic: str) -> List[KafkaRecord]:
+        return [record for log in self._topic(topic) for record in log]
+
+    def source(self, topic: str, group_id: str) -> "InMemorySource":
+        return InMemorySource(self, topic, group_id)
+
+
+class InMemorySource:
+    """Реализация MessageSource поверх InMemoryBroker."""
+
+    def __init__(self, broker: InMemoryBroker, topic: str, group_id: str):
+        self.broker = broker
+        self.topic = topic
+        self.group_id = group_id
+        self._positions: Dict[int, int] = {}
+        self.paused = False
+
+    async def start(self):
+        # Как и Kafka, начинаем с последнего зафиксированного offset'а группы
+        self._positions = {
+            partition: self.broker.committed.get((self.group_id, self.topic, partition), 0)
+            for partition in range(self.broker.partitions)
+        }
+
+    async def stop(self):
+        pass
+
+    async def getmany(self, timeout_ms: int, max_records: int) -> List[KafkaRecord]:
+        records: List[KafkaRecord] = []
+        for partition, log in enumerate(self.broker._topic(self.topic) if not self.paused else []):
+            position = self._positions[partition]
+            chunk = log[position:position + max_records - len(records)]
+            records.extend(chunk)
+            self._positions[partition] = position + len(chunk)
+
+        if not records:
+            await asyncio.sleep(min(timeout_ms, 10) / 1000)
+        return records
+
+    async def commit(self, offsets: Dict[PartitionKey, int]):
+        for (topic, partition), offset in offsets.items():
+            self.broker.committed[(self.group_id, topic, partition)] = offset
+
+    async def pause(self):
+        self.paused = True
+
+    async def resume(self):
+        self.paused = False
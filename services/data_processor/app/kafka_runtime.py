@@ -0,0 +1,549 @@
+# services/data_processor/app/kafka_runtime.py
+"""
+Асинхронный рантайм консьюмеров Kafka, общий для consumer.py и status_consumer.py.
+
+Обработка разбита на стадии, соединенные ограниченными очередями:
+
+    fetch -> deserialize -> write (max_in_flight параллельных транзакций)
+
+Заполненная очередь останавливает предыдущую стадию (backpressure), поэтому при
+медленной БД консьюмер перестает забирать сообщения из брокера, а не копит их в памяти.
+Offset партиции фиксируется только до первого еще не обработанного сообщения,
+так что при падении процесса ни одно сообщение не теряется (доставка at-least-once).
+Пока БД недоступна, чтение приостанавливается, а пачка повторяется до восстановления.
+"""
+import asyncio
+import logging
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Protocol, Set, Tuple
+
+from app.metrics import counter, gauge, histogram
+from app.retry import RetryError, RetryPolicy
+
+if TYPE_CHECKING:
+    from app.dlq import DeadLetterSink
+
+logger = logging.getLogger(__name__)
+
+# (topic, partition)
+PartitionKey = Tuple[str, int]
+
+CONSUMER_MESSAGES = counter(
+    "consumer_messages_total", "Consumed messages by outcome (processed, invalid, failed, dead_lettered)",
+    ["consumer", "outcome"],
+)
+CONSUMER_BATCH_SIZE = histogram(
+    "consumer_batch_size", "Messages per write transaction", ["consumer"],
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+CONSUMER_STAGE_DURATION = histogram(
+    "consumer_stage_duration_seconds", "Time per batch in each pipeline stage (fetch, deserialize, write, commit)",
+    ["consumer", "stage"],
+)
+CONSUMER_PENDING = gauge("consumer_pending_messages", "Fetched messages not yet written or dead-lettered", ["consumer"])
+CONSUMER_FETCH_PAUSED = gauge(
+    "consumer_fetch_paused", "1 while fetching is paused because the database is unavailable", ["consumer"]
+)
+CONSUMER_LAG = gauge("consumer_lag_messages", "Messages behind the partition high watermark", ["group", "topic", "partition"])
+
+
+@dataclass
+class KafkaRecord:
+    """Сообщение брокера в виде, не зависящем от клиентской библиотеки."""
+    topic: str
+    partition: int
+    offset: int
+    value: bytes
+    key: Optional[bytes] = None
+    headers: List[Tuple[str, bytes]] = field(default_factory=list)
+    timestamp: Optional[int] = None
+
+    @property
+    def partition_key(self) -> PartitionKey:
+        return self.topic, self.partition
+
+
+class MessageSource(Protocol):
+    """Источник сообщений: реальный брокер (aiokafka) или InMemoryBroker в тестах."""
+
+    async def start(self) -> None: ...
+
+    async def stop(self) -> None: ...
+
+    async def getmany(self, timeout_ms: int, max_records: int) -> List[KafkaRecord]: ...
+
+    async def commit(self, offsets: Dict[PartitionKey, int]) -> None: ...
+
+    async def pause(self) -> None: ...
+
+    async def resume(self) -> None: ...
+
+
+class AIOKafkaSource:
+    """MessageSource поверх aiokafka. Автокоммит выключен: offset'ами управляет рантайм."""
+
+    def __init__(self, topic: str, group_id: str, bootstrap_servers: str, **consumer_options):
+        self.topic = topic
+        self.group_id = group_id
+        self.bootstrap_servers = bootstrap_servers
+        self.consumer_options = consumer_options
+        self._consumer = None
+
+    async def start(self):
+        from aiokafka import AIOKafkaConsumer
+
+        self._consumer = AIOKafkaConsumer(
+            self.topic,
+            bootstrap_servers=self.bootstrap_servers.split(','),
+            group_id=self.group_id,
+            auto_offset_reset='earliest',
+            enable_auto_commit=False,
+            **self.consumer_options,
+        )
+        await self._consumer.start()
+
+    async def stop(self):
+        if self._consumer is not None:
+            await self._consumer.stop()
+
+    async def getmany(self, timeout_ms: int, max_records: int) -> List[KafkaRecord]:
+        polled = await self._consumer.getmany(timeout_ms=timeout_ms, max_records=max_records)
+        await self._update_lag()
+        return [
+            KafkaRecord(
+                topic=message.topic,
+                partition=message.partition,
+                offset=message.offset,
+                value=message.value,
+                key=message.key,
+                headers=list(message.headers or []),
+                timestamp=message.timestamp,
+            )
+            for partition_records in polled.values()
+            for message in partition_records
+        ]
+
+    async def _update_lag(self):
+        """Отставание по назначенным партициям: high watermark минус позиция чтения."""
+        for tp in self._consumer.assignment():
+            highwater = self._consumer.highwater(tp)
+            if highwater is None:
+                continue
+            position = await self._consumer.position(tp)
+            CONSUMER_LAG.labels(self.group_id, tp.topic, str(tp.partition)).set(max(highwater - position, 0))
+
+    async def commit(self, offsets: Dict[PartitionKey, int]):
+        from aiokafka import TopicPartition
+
+        await self._consumer.commit({TopicPartition(topic, partition): offset
+                                     for (topic, partition), offset in offsets.items()})
+
+    async def pause(self):
+        # getmany продолжает вызываться: без него группа сочтет консьюмер зависшим
+        # (max_poll_interval_ms) и отберет партиции
+        self._consumer.pause(*self._consumer.assignment())
+
+    async def resume(self):
+        self._consumer.resume(*self._consumer.paused())
+
+
+class OffsetTracker:
+    """
+    Отслеживает обработанные сообщения по партициям. Стадии записи завершаются
+    не по порядку, поэтому коммитится offset первого незавершенного сообщения.
+    """
+
+    def __init__(self):
+        self._pending: Dict[PartitionKey, Set[int]] = {}
+        self._next: Dict[PartitionKey, int] = {}
+        self._committed: Dict[PartitionKey, int] = {}
+
+    def add(self, record: KafkaRecord):
+        key = record.partition_key
+        self._pending.setdefault(key, set()).add(record.offset)
+        self._next[key] = max(self._next.get(key, 0), record.offset + 1)
+
+    def done(self, record: KafkaRecord):
+        self._pending.get(record.partition_key, set()).discard(record.offset)
+
+    @property
+    def pending_count(self) -> int:
+        return sum(len(offsets) for offsets in self._pending.values())
+
+    def committable(self) -> Dict[PartitionKey, int]:
+        """Offset'ы, которые можно зафиксировать (следующее сообщение к чтению)."""
+        offsets = {}
+        for key, next_offset in self._next.items():
+            pending = self._pending.get(key)
+            position = min(pending) if pending else next_offset
+            if position > self._committed.get(key, -1):
+                offsets[key] = position
+        return offsets
+
+    def mark_committed(self, offsets: Dict[PartitionKey, int]):
+        self._committed.update(offsets)
+
+
+# Десериализатор: сырое сообщение -> объект. Исключение означает невалидное сообщение.
+Deserializer = Callable[[KafkaRecord], Any]
+# Обработчик пачки: список пар (сообщение, объект) -> запись в БД
+BatchHandler = Callable[[List[Tuple[KafkaRecord, Any]]], Awaitable[None]]
+# Ключ упорядочивания: объекты с одинаковым ключом обрабатываются одним воркером по порядку
+KeyFunc = Callable[[Any], str]
+
+# Маркер завершения для очередей между стадиями
+_STOP = object()
+
+
+@dataclass
+class WorkerStats:
+    """Счетчики одного воркера записи."""
+    processed: int = 0
+    batches: int = 0
+    busy_seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.processed / self.busy_seconds if self.busy_seconds > 0 else 0.0
+
+
+class ConsumerRuntime:
+    """
+    Конвейер fetch -> deserialize -> write с ограниченными очередями.
+
+    batch_size / max_wait_ms задают размер пачки, передаваемой обработчику;
+    max_in_flight - число воркеров записи (одновременно открытых транзакций) при заданном key;
+    queue_size - емкость очередей между стадиями (в пачках).
+
+    Ошибки записи: временные (обрыв соединения, failover) повторяются по политике retry,
+    а если она исчерпана - дальше, с задержкой не больше retry.max_delay, пока БД не
+    восстановится; чтение новых сообщений на это время приостанавливается, offset'ы пачки
+    не фиксируются, и в dead_letters она не уходит. Пачка с постоянной ошибкой
+    разбивается на отдельные сообщения, и в dead_letters уходят только те, что не
+    записываются поодиночке. Невалидные сообщения уходят в dead_letters сразу.
+    Без dead_letters такие сообщения только логируются.
+
+    Без key пишет один воркер: пачки из общей очереди, разобранные несколькими воркерами,
+    могли бы записать две версии одного объекта не по порядку. С key у каждого воркера
+    своя очередь, а объект попадает к воркеру crc32(key) % max_in_flight: обновления
+    одного ключа идут строго по порядку, разные ключи пишутся параллельно.
+    """
+
+    def __init__(
+        self,
+        source: MessageSource,
+        deserialize: Deserializer,
+        handle_batch: BatchHandler,
+        *,
+        batch_size: int = 500,
+        max_wait_ms: int = 1000,
+        max_in_flight: int = 4,
+        queue_size: int = 8,
+        key: Optional[KeyFunc] = None,
+        retry: Optional[RetryPolicy] = None,
+        dead_letters: Optional["DeadLetterSink"] = None,
+        name: str = "consumer",
+    ):
+        self.source = source
+        self.deserialize = deserialize
+        self.handle_batch = handle_batch
+        self.batch_size = batch_size
+        self.max_wait_ms = max_wait_ms
+        # Без ключа упорядочивания порядок записи сохраняет только один воркер
+        self.max_in_flight = max_in_flight if key is not None else 1
+        self.key = key
+        self.retry = retry or RetryPolicy(max_attempts=1)
+        self.dead_letters = dead_letters
+        self.name = name
+
+        self.offsets = OffsetTracker()
+        self._fetched: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._worker_queues = [asyncio.Queue(maxsize=queue_size) for _ in range(self.max_in_flight)]
+        self._commit_lock = asyncio.Lock()
+        self._stopping = asyncio.Event()
+        # Воркеры, ждущие восстановления БД; пока они есть, чтение приостановлено
+        self._stalled_writers = 0
+        self._fetch_paused = False
+
+        self.worker_stats = [WorkerStats() for _ in range(self.max_in_flight)]
+        self.processed = 0
+        self.invalid = 0
+        self.failed = 0
+        self.dead_lettered = 0
+
+    def stop(self):
+        """Просит рантайм завершиться: новые сообщения не читаются, очереди дорабатываются."""
+        self._stopping.set()
+
+    def stats(self) -> dict:
+        """Сводка по воркерам: пропускная способность и глубина очередей."""
+        return {
+            "processed": self.processed,
+            "invalid": self.invalid,
+            "failed": self.failed,
+            "dead_lettered": self.dead_lettered,
+            "pending": self.offsets.pending_count,
+            "workers": [
+                {
+                    "processed": worker.processed,
+                    "batches": worker.batches,
+                    "rate": round(worker.rate, 1),
+                    "queue_depth": self._worker_queues[worker_id].qsize(),
+                }
+                for worker_id, worker in enumerate(self.worker_stats)
+            ],
+        }
+
+    async def run(self, stop_when_idle: bool = False):
+        """
+        Запускает конвейер. С stop_when_idle=True рантайм завершается, как только
+        источник перестает отдавать сообщения (используется в тестах и для разовой дочитки).
+        """
+        await self.source.start()
+        mode = "по ключу" if self.key else "без ключа, по порядку"
+        logger.info(f"[{self.name}] Рантайм запущен: пачка {self.batch_size}, "
+                    f"воркеров записи {self.max_in_flight} ({mode})")
+        try:
+            writers = [asyncio.create_task(self._write_loop(i)) for i in range(self.max_in_flight)]
+            await asyncio.gather(
+                self._fetch_loop(stop_when_idle),
+                self._deserialize_loop(),
+                *writers,
+            )
+            await self._commit()
+        finally:
+            await self.source.stop()
+            logger.info(f"[{self.name}] Рантайм остановлен: {self.stats()}")
+
+    async def _fetch_batch(self) -> List[KafkaRecord]:
+        """Набирает до batch_size сообщений или ждет не дольше max_wait_ms."""
+        records: List[KafkaRecord] = []
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+
+        while len(records) < self.batch_size and not self._stopping.is_set():
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                break
+            polled = await self.source.getmany(timeout_ms=remaining_ms, max_records=self.batch_size - len(records))
+            if not polled and records:
+                break
+            records.extend(polled)
+
+        return records
+
+    async def _apply_backpressure(self):
+        """Приостанавливает чтение, пока есть воркеры, ждущие восстановления БД."""
+        if self._stalled_writers and not self._fetch_paused:
+            await self.source.pause()
+            self._fetch_paused = True
+            CONSUMER_FETCH_PAUSED.labels(self.name).set(1)
+            logger.warning(f"[{self.name}] БД недоступна, чтение сообщений приостановлено")
+        elif not self._stalled_writers and self._fetch_paused:
+            await self.source.resume()
+            self._fetch_paused = False
+            CONSUMER_FETCH_PAUSED.labels(self.name).set(0)
+            logger.info(f"[{self.name}] Чтение сообщений возобновлено")
+
+    async def _fetch_loop(self, stop_when_idle: bool):
+        try:
+            while not self._stopping.is_set():
+                await self._apply_backpressure()
+                started_at = time.monotonic()
+                records = await self._fetch_batch()
+                if not records:
+                    # Пустой ответ приостановленного источника не означает, что топик дочитан
+                    if stop_when_idle and not self._fetch_paused:
+                        break
+                    continue
+                CONSUMER_STAGE_DURATION.labels(self.name, "fetch").observe(time.monotonic() - started_at)
+                for record in records:
+                    self.offsets.add(record)
+                CONSUMER_PENDING.labels(self.name).set(self.offsets.pending_count)
+                # Блокируется, если десериализация не успевает
+                await self._fetched.put(records)
+        finally:
+            await self._fetched.put(_STOP)
+
+    def _worker_for(self, value: Any) -> int:
+        return zlib.crc32(str(self.key(value)).encode()) % self.max_in_flight
+
+    async def _dispatch(self, items: List[Tuple[KafkaRecord, Any]]):
+        """Передает пачку воркерам. Блокируется, если очередь нужного воркера заполнена."""
+        if self.key is None:
+            await self._worker_queues[0].put(items)
+            return
+
+        routed: Dict[int, List[Tuple[KafkaRecord, Any]]] = {}
+        for record, value in items:
+            routed.setdefault(self._worker_for(value), []).append((record, value))
+        for worker_id, worker_items in routed.items():
+            await self._worker_queues[worker_id].put(worker_items)
+
+    async def _deserialize_loop(self):
+        while True:
+            records = await self._fetched.get()
+            if records is _STOP:
+                break
+
+            started_at = time.monotonic()
+            items = []
+            for record in records:
+                try:
+                    items.append((record, self.deserialize(record)))
+                except Exception as e:
+                    self.invalid += 1
+                    CONSUMER_MESSAGES.labels(self.name, "invalid").inc()
+                    logger.error(f"[{self.name}] Невалидное сообщение (partition {record.partition}, "
+                                 f"offset {record.offset}): {e}")
+                    await self._dead_letter(record, e, attempts=1, stage="deserialize")
+                    self.offsets.done(record)
+            CONSUMER_STAGE_DURATION.labels(self.name, "deserialize").observe(time.monotonic() - started_at)
+
+            if items:
+                await self._dispatch(items)
+            else:
+                await self._commit()
+
+        for worker_id in range(self.max_in_flight):
+            await self._worker_queues[worker_id].put(_STOP)
+
+    async def _next_batch(self, queue: asyncio.Queue) -> Tuple[List[Tuple[KafkaRecord, Any]], bool]:
+        """
+        Ждет следующую пачку воркера и доклеивает к ней уже накопившиеся в очереди,
+        чтобы после всплеска нагрузки писать крупными транзакциями. Возвращает (пачка, стоп).
+        """
+        first = await queue.get()
+        if first is _STOP:
+            return [], True
+
+        items = list(first)
+        while len(items) < self.batch_size and not queue.empty():
+            more = queue.get_nowait()
+            if more is _STOP:
+                return items, True
+            items.extend(more)
+        return items, False
+
+    async def _write_loop(self, worker_id: int):
+        queue = self._worker_queues[worker_id]
+        worker = self.worker_stats[worker_id]
+        stopping = False
+
+        while not stopping:
+            items, stopping = await self._next_batch(queue)
+            if not items:
+                continue
+
+            started_at = time.monotonic()
+            written = await self._write(items)
+            if written is None:
+                # Рантайм остановлен до восстановления БД: сообщения перечитаются после перезапуска
+                continue
+            # Offset'ы отмечаются только после записи или отправки в DLQ; если упала и
+            # отправка в DLQ, исключение останавливает рантайм без коммита этих сообщений
+            for record, _ in items:
+                self.offsets.done(record)
+            worker.processed += written
+
+            elapsed = time.monotonic() - started_at
+            worker.batches += 1
+            worker.busy_seconds += elapsed
+            CONSUMER_BATCH_SIZE.labels(self.name).observe(len(items))
+            CONSUMER_STAGE_DURATION.labels(self.name, "write").observe(elapsed)
+            CONSUMER_PENDING.labels(self.name).set(self.offsets.pending_count)
+            await self._commit()
+            logger.info(f"[{self.name}] worker-{worker_id}: пачка {len(items)} за {elapsed:.3f}с, "
+                        f"{worker.rate:.0f} сообщ/с, очередь воркера {queue.qsize()}, "
+                        f"очередь чтения {self._fetched.qsize()}, "
+                        f"незавершенных сообщений {self.offsets.pending_count}")
+
+    async def _write(self, items: List[Tuple[KafkaRecord, Any]]) -> Optional[int]:
+        """
+        Записывает пачку с повторами и DLQ. Возвращает число записанных сообщений
+        или None, если рантайм остановлен раньше, чем восстановилась БД.
+        """
+        if self._stalled_writers and self._stopping.is_set():
+            return None
+
+        outages = 0
+        try:
+            while True:
+                try:
+                    await self.retry.call(self.handle_batch, items, description=f"{self.name}, пачка {len(items)}")
+                    break
+                except RetryError as e:
+                    if not e.transient:
+                        return await self._write_rejected(items, e)
+                    # Failover или перезапуск Postgres длятся дольше политики повторов.
+                    # Пачка не уходит в DLQ: переигрывание оттуда нарушило бы порядок
+                    # обновлений одного объявления
+                    if not outages:
+                        self._stalled_writers += 1
+                    outages += 1
+                    if not await self._wait_for_database(e, outages):
+                        return None
+        finally:
+            if outages:
+                self._stalled_writers -= 1
+
+        if outages:
+            logger.info(f"[{self.name}] БД доступна, пачка из {len(items)} сообщений записана")
+        self.processed += len(items)
+        CONSUMER_MESSAGES.labels(self.name, "processed").inc(len(items))
+        return len(items)
+
+    async def _wait_for_database(self, error: RetryError, outages: int) -> bool:
+        """Ждет перед следующим циклом повторов; False - рантайм остановлен во время ожидания."""
+        delay = self.retry.delay(self.retry.max_attempts + outages)
+        logger.error(f"[{self.name}] БД недоступна (циклов повторов {outages}), "
+                     f"следующий через {delay:.1f}с: {error.error}")
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            return True
+        logger.warning(f"[{self.name}] Остановка до восстановления БД: offset'ы незаписанных сообщений не фиксируются")
+        return False
+
+    async def _write_rejected(self, items: List[Tuple[KafkaRecord, Any]], error: RetryError) -> Optional[int]:
+        """Постоянная ошибка: отдельное сообщение уходит в DLQ, пачка пишется поштучно."""
+        if len(items) == 1:
+            logger.error(f"[{self.name}] Не удалось записать сообщение (попыток {error.attempts}): {error.error}")
+            self.failed += 1
+            CONSUMER_MESSAGES.labels(self.name, "failed").inc()
+            record, _ = items[0]
+            await self._dead_letter(record, error.error, error.attempts, stage="write")
+            return 0
+
+        logger.error(f"[{self.name}] Пачка из {len(items)} сообщений отклонена ({error.error}), "
+                     f"переходим к поштучной записи")
+        written = 0
+        for item in items:
+            item_written = await self._write([item])
+            if item_written is None:
+                return None
+            written += item_written
+        return written
+
+    async def _dead_letter(self, record: KafkaRecord, error: BaseException, attempts: int, stage: str):
+        if self.dead_letters is None:
+            return
+        await self.dead_letters.send(record, error, attempts, stage)
+        self.dead_lettered += 1
+        CONSUMER_MESSAGES.labels(self.name, "dead_lettered").inc()
+
+    async def _commit(self):
+        async with self._commit_lock:
+            offsets = self.offsets.committable()
+            if not offsets:
+                return
+            started_at = time.monotonic()
+            try:
+                await self.source.commit(offsets)
+            except Exception as e:
+                # Например, ребалансировка группы: сообщения будут перечитаны, запись идемпотентна
+                logger.error(f"[{self.name}] Не удалось зафиксировать offset'ы {offsets}: {e}")
+                return
+            self.offsets.mark_committed(offsets)
+            CONSUMER_STAGE_DURATION.labels(self.name, "commit").observe(time.monotonic() - started_at)
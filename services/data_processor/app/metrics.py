@@ -0,0 +1,106 @@
+# services/data_processor/app/metrics.py
+"""
+Метрики Prometheus, общие для api_service, data_processor и scrapy_runner.
+
+Как и models.py, модуль копируется в data_processor (app/metrics.py), откуда его
+импортирует scrapy_runner: изменения вносятся в обе копии.
+
+Пакет prometheus_client необязателен: без него метрики - пустые объекты с тем же
+интерфейсом, а /metrics не публикуется.
+"""
+import logging
+from typing import Callable, Sequence, Tuple
+
+try:
+    import prometheus_client
+except ImportError:  # без prometheus_client метрики не собираются
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+METRICS_AVAILABLE = prometheus_client is not None
+
+# Интервалы гистограмм длительности, секунды
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Типы SQL-запросов для db_statements_total; остальные считаются как OTHER
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "COPY", "REFRESH", "BEGIN", "COMMIT", "ROLLBACK"}
+
+
+class _NoopMetric:
+    """Заглушка метрики без prometheus_client"""
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        pass
+
+
+_NOOP_METRIC = _NoopMetric()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()):
+    if prometheus_client is None:
+        return _NOOP_METRIC
+    return prometheus_client.Counter(name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()):
+    if prometheus_client is None:
+        return _NOOP_METRIC
+    return prometheus_client.Gauge(name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DURATION_BUCKETS):
+    if prometheus_client is None:
+        return _NOOP_METRIC
+    return prometheus_client.Histogram(name, documentation, labelnames, buckets=buckets)
+
+
+def start_metrics_server(port: int) -> bool:
+    """Отдельный HTTP-сервер /metrics (процессы без веб-фреймворка)"""
+    if prometheus_client is None:
+        logger.warning("prometheus_client не установлен, метрики не публикуются")
+        return False
+    prometheus_client.start_http_server(port)
+    logger.info(f"Метрики Prometheus: http://0.0.0.0:{port}/metrics")
+    return True
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Тело и Content-Type ответа /metrics (для встраивания в веб-приложение)"""
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
+
+
+DB_STATEMENTS = counter("db_statements_total", "SQL statements executed, by operation", ["operation"])
+
+
+def statement_operation(statement: str) -> str:
+    words = statement.lstrip(" \n\t(").split(None, 1)
+    operation = words[0].upper() if words else "OTHER"
+    return operation if operation in SQL_OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine) -> None:
+    """Счетчик запросов движка SQLAlchemy (синхронного или асинхронного) по типу"""
+    if prometheus_client is None:
+        return
+    from sqlalchemy import event
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        DB_STATEMENTS.labels(statement_operation(statement)).inc()
+
+    event.listen(getattr(engine, "sync_engine", engine), "before_cursor_execute", count_statement)
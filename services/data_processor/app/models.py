@@ -1,6 +1,8 @@
 # services/data_processor/app/models.py
 from datetime import datetime
-from sqlalchemy import Column, DateTime
+from sqlalchemy import BigInteger, Column, DateTime, Index, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 from typing import List, Optional
 from sqlmodel import SQLModel, Field, Relationship
 
@@ -27,8 +29,41 @@ class CarModel(SQLModel, table=True):
     ads: List["AutoAd"] = Relationship(back_populates="car_model")
 
 
+# Нормализованный ключ марки: как slug в car_make и значение марки у источника
+AUTO_AD_MAKE_KEY_SQL = "lower(replace(make_name, ' ', '-'))"
+
+# Текстовые фильтры API: режим выбирается для каждого фильтра, поэтому у каждой колонки
+# есть индекс и для точного сравнения без учета регистра, и для поиска подстроки (pg_trgm)
+AUTO_AD_TEXT_FILTER_COLUMNS = ("make_name", "model_name", "fuel_type", "gearbox", "city", "region")
+AUTO_AD_LOWER_INDEX_COLUMNS = AUTO_AD_TEXT_FILTER_COLUMNS
+AUTO_AD_TRGM_INDEX_COLUMNS = AUTO_AD_TEXT_FILTER_COLUMNS
+
+# Полнотекстовый вектор объявления: заполняется триггером БД, читается только поиском
+AUTO_AD_SEARCH_VECTOR = Column("search_vector", TSVECTOR, nullable=True)
+
+
 class AutoAd(SQLModel, table=True):
     __tablename__ = "auto_ad"
+    __table_args__ = (
+        # Проход статусов по марке: активные объявления источника с точным ключом марки
+        Index(
+            "ix_auto_ad_active_source_make_key",
+            "source_name",
+            text(AUTO_AD_MAKE_KEY_SQL),
+            postgresql_where=text("sold_at IS NULL"),
+        ),
+        # Keyset-пагинация списка объявлений: сортировка по колонке с id_ad для равных значений
+        Index("ix_auto_ad_created_at_id_ad", "createdAt", "id_ad"),
+        Index("ix_auto_ad_price_id_ad", "price", "id_ad"),
+        *(Index(f"ix_auto_ad_{name}_lower", text(f"lower({name})")) for name in AUTO_AD_LOWER_INDEX_COLUMNS),
+        *(
+            Index(f"ix_auto_ad_{name}_trgm", name, postgresql_using="gin", postgresql_ops={name: "gin_trgm_ops"})
+            for name in AUTO_AD_TRGM_INDEX_COLUMNS
+        ),
+        Index("ix_auto_ad_search_vector", "search_vector", postgresql_using="gin"),
+    )
+    # Отложенная загрузка: списки и карточки объявлений вектор не читают
+    __mapper_args__ = {"properties": {"search_vector": deferred(AUTO_AD_SEARCH_VECTOR)}}
 
     id_ad: str = Field(default=None, primary_key=True, index=True)
     make_name: Optional[str] = Field(default=None, alias="make")
@@ -53,6 +88,7 @@ class AutoAd(SQLModel, table=True):
     createdAt: datetime = Field(sa_column=Column(DateTime(timezone=True)))
     sold_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True)))
     source_name: Optional[str] = Field(default=None, index=True)
+    search_vector: Optional[str] = Field(default=None, sa_column=AUTO_AD_SEARCH_VECTOR, exclude=True)
 
     car_model_id: Optional[int] = Field(default=None, foreign_key="car_model.id", index=True)
     car_model: Optional["CarModel"] = Relationship(back_populates="ads")
@@ -73,4 +109,47 @@ class AutoAdHistory(SQLModel, table=True):
     currencyCode: Optional[str] = Field(default=None, max_length=3)
     status: Optional[str] = Field(default=None)
 
-    auto_ad: Optional[AutoAd] = Relationship(back_populates="history")
\ No newline at end of file
+    auto_ad: Optional[AutoAd] = Relationship(back_populates="history")
+
+class ActiveIdsChunk(SQLModel, table=True):
+    """Полученные части списка активных ID марки (chunked-протокол статус-апдейтера)."""
+    __tablename__ = "active_ids_chunk"
+    # Служебные данные, которые можно потерять: после сбоя БД число частей не сойдется,
+    # и проход марки будет пропущен, а не пометит живые объявления проданными
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    run_id: str = Field(primary_key=True)
+    source_name: str = Field(primary_key=True)
+    make_key: str = Field(primary_key=True)
+    chunk_index: int = Field(primary_key=True)
+    id_count: int = Field(default=0)
+    received_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class ActiveIdsStaging(SQLModel, table=True):
+    """Активные ID из частей запуска до прихода финального маркера марки."""
+    __tablename__ = "active_ids_staging"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    run_id: str = Field(primary_key=True)
+    source_name: str = Field(primary_key=True)
+    make_key: str = Field(primary_key=True)
+    ad_id: str = Field(primary_key=True)
+
+
+class StatsSnapshot(SQLModel, table=True):
+    """Время последнего обновления материализованных витрин статистики (stats_*)."""
+    __tablename__ = "stats_snapshot"
+
+    view_name: str = Field(primary_key=True)
+    refreshed_at: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
+    duration_ms: int = Field(default=0)
+
+
+class DataVersion(SQLModel, table=True):
+    """Версия области данных (ads, stats): растет с каждой транзакцией, изменившей данные."""
+    __tablename__ = "data_version"
+
+    scope: str = Field(primary_key=True)
+    version: int = Field(sa_column=Column(BigInteger, nullable=False))
+    changed_at: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
@@ -0,0 +1,42 @@
+# services/data_processor/app/notifications.py
+"""
+Версия данных и уведомления API об изменениях через PostgreSQL NOTIFY.
+
+Транзакция, изменившая данные области, увеличивает data_version.version области и
+вызывает pg_notify с полезной нагрузкой "область:версия:время". Уведомление уходит
+только после коммита (и не уходит при откате). Строка версии остается заблокированной
+до коммита, поэтому версии растут в порядке коммитов, а не начала транзакций; чтобы
+не задерживать параллельных писателей, bump делается последним запросом транзакции.
+"""
+from sqlalchemy import cast, func, select, String, update
+
+from app.models import DataVersion
+
+# Тот же канал слушает api_service (app/core/data_changes.py)
+DATA_CHANGED_CHANNEL = "euroautodatahub_data_changed"
+
+# Области: ads - объявления (запись, пометка проданных), stats - витрины статистики
+SCOPE_ADS = "ads"
+SCOPE_STATS = "stats"
+
+
+def data_changed_statement(scope: str):
+    bumped = (
+        update(DataVersion)
+        .where(DataVersion.scope == scope)
+        .values(
+            version=DataVersion.version + 1,
+            changed_at=func.greatest(DataVersion.changed_at, func.clock_timestamp()),
+        )
+        .returning(DataVersion.version, DataVersion.changed_at)
+        .cte("bumped")
+    )
+    payload = func.concat_ws(
+        ":", scope, cast(bumped.c.version, String), cast(func.extract("epoch", bumped.c.changed_at), String)
+    )
+    return select(func.pg_notify(DATA_CHANGED_CHANNEL, payload)).select_from(bumped)
+
+
+async def notify_data_changed(session_or_connection, scope: str) -> None:
+    """Увеличивает версию области и ставит уведомление в текущую транзакцию."""
+    await session_or_connection.execute(data_changed_statement(scope))
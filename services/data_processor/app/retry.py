@@ -0,0 +1,97 @@
+# services/data_processor/app/retry.py
+"""
+Повтор операций с БД при временных ошибках (failover Postgres, обрыв соединения,
+deadlock, конфликт сериализации) с экспоненциальной задержкой и джиттером.
+"""
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from asyncpg.exceptions import PostgresConnectionError
+from asyncpg.exceptions import InterfaceError as AsyncpgInterfaceError
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# SQLSTATE, после которых имеет смысл повторить транзакцию целиком
+TRANSIENT_SQLSTATES = {
+    "40001",  # serialization_failure
+    "40P01",  # deadlock_detected
+    "53300",  # too_many_connections
+    "55P03",  # lock_not_available
+    "57P01",  # admin_shutdown (перезапуск/failover)
+    "57P02",  # crash_shutdown
+    "57P03",  # cannot_connect_now (реплика поднимается)
+    "08000", "08001", "08003", "08004", "08006",  # ошибки соединения
+}
+
+
+def is_transient_db_error(error: BaseException) -> bool:
+    """Можно ли ожидать, что повтор той же операции через некоторое время пройдет успешно."""
+    if isinstance(error, (ConnectionError, asyncio.TimeoutError, PostgresConnectionError, AsyncpgInterfaceError)):
+        return True
+    if isinstance(error, DBAPIError):
+        if error.connection_invalidated:
+            return True
+        if getattr(error.orig, "sqlstate", None) in TRANSIENT_SQLSTATES:
+            return True
+        return isinstance(error, (OperationalError, InterfaceError))
+    return getattr(error, "sqlstate", None) in TRANSIENT_SQLSTATES
+
+
+class RetryError(Exception):
+    """Операция не выполнена: ошибка постоянная или исчерпаны попытки."""
+
+    def __init__(self, error: BaseException, attempts: int, transient: bool):
+        super().__init__(str(error))
+        self.error = error
+        self.attempts = attempts
+        self.transient = transient
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 5
+    base_delay: float = 0.2
+    max_delay: float = 10.0
+    is_transient: Callable[[BaseException], bool] = is_transient_db_error
+
+    def delay(self, attempt: int) -> float:
+        """Задержка перед попыткой attempt + 1: экспонента с джиттером 50-100%."""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def call(self, func: Callable[..., Awaitable[T]], *args, description: Optional[str] = None) -> T:
+        """
+        Выполняет func(*args). Временные ошибки повторяются до max_attempts раз,
+        постоянные сразу пробрасываются как RetryError.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await func(*args)
+            except Exception as e:
+                transient = self.is_transient(e)
+                if not transient or attempt >= self.max_attempts:
+                    raise RetryError(e, attempt, transient) from e
+
+                delay = self.delay(attempt)
+                logger.warning(f"Временная ошибка{f' ({description})' if description else ''}, "
+                               f"попытка {attempt}/{self.max_attempts}, повтор через {delay:.2f}с: {e}")
+                await asyncio.sleep(delay)
+
+
+def db_retry_policy() -> RetryPolicy:
+    """Политика повторов транзакций из настроек сервиса."""
+    return RetryPolicy(
+        max_attempts=settings.DB_RETRY_MAX_ATTEMPTS,
+        base_delay=settings.DB_RETRY_BASE_DELAY_MS / 1000,
+        max_delay=settings.DB_RETRY_MAX_DELAY_MS / 1000,
+    )
@@ -53,7 +53,15 @@ class ScrapedAdSchema(BaseModel):
 class ActiveIdsSchema(BaseModel):
     """
     Схема для валидации сообщения со списком активных ID.
+    Без run_id сообщение содержит все ID марки; с run_id - это часть chunked-протокола:
+    части с chunk_index и финальный маркер (is_final) с числом частей и признаком полноты.
     """
     source_name: str
     ad_ids: Set[str]
-    make_str: str
\ No newline at end of file
+    make_str: str
+
+    run_id: Optional[str] = None
+    chunk_index: Optional[int] = None
+    chunk_count: Optional[int] = None
+    is_final: bool = False
+    is_complete: bool = True
\ No newline at end of file
@@ -0,0 +1,122 @@
+# services/data_processor/app/stats_refresh.py
+"""
+Обновление материализованных витрин статистики (stats_*), которые читает /api/v1/stats.
+
+Запуск:
+    python -m app.stats_refresh            # обновлять каждые STATS_REFRESH_INTERVAL_SECONDS
+    python -m app.stats_refresh --once     # обновить один раз (cron, после обхода)
+
+Витрины обновляются через REFRESH MATERIALIZED VIEW CONCURRENTLY: чтение API не
+блокируется, а в витрине меняются только изменившиеся строки. Одновременно обновление
+выполняет только один процесс (advisory lock), время обновления каждой витрины
+записывается в stats_snapshot - по нему API сообщает возраст данных.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.config import settings
+from app.db_session import engine
+from app.models import StatsSnapshot
+from app.notifications import SCOPE_STATS, notify_data_changed
+
+logging.basicConfig(stream=sys.stdout, level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Витрины создаются миграциями a1c4e7b9d3f2, c4e7a9b2d5f3 и e8b3f6a1c9d4 (api_service)
+STATS_VIEWS = (
+    "stats_global",
+    "stats_price_median",
+    "stats_price_histogram",
+    "stats_make",
+    "stats_make_model",
+    "stats_region",
+    "stats_price_bucket",
+    "stats_year",
+    "stats_daily",
+    "stats_facet_values",
+    "stats_filter_ranges",
+)
+
+# Обновляется, только если включен STATS_EXACT_MEDIAN
+EXACT_MEDIAN_VIEW = "stats_price_median"
+
+# Ключ pg_advisory_lock для обновления витрин
+STATS_REFRESH_LOCK_ID = 0x57A75
+
+
+async def refresh_view(conn: AsyncConnection, view_name: str) -> int:
+    """Обновляет одну витрину и фиксирует время обновления; возвращает длительность в мс."""
+    started = time.monotonic()
+    await conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name}"))
+    duration_ms = int((time.monotonic() - started) * 1000)
+
+    stmt = pg_insert(StatsSnapshot).values(
+        view_name=view_name, refreshed_at=func.now(), duration_ms=duration_ms
+    )
+    await conn.execute(stmt.on_conflict_do_update(
+        index_elements=["view_name"],
+        set_={"refreshed_at": stmt.excluded.refreshed_at, "duration_ms": stmt.excluded.duration_ms},
+    ))
+    return duration_ms
+
+
+async def refresh_stats_views() -> bool:
+    """
+    Обновляет все витрины статистики. Возвращает False, если обновление уже
+    выполняет другой процесс.
+    """
+    # Каждая витрина обновляется в своей транзакции, advisory lock держится на уровне соединения
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        locked = await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": STATS_REFRESH_LOCK_ID})
+        if not locked:
+            logger.info("Витрины статистики уже обновляет другой процесс, пропускаем")
+            return False
+        try:
+            for view_name in STATS_VIEWS:
+                if view_name == EXACT_MEDIAN_VIEW and not settings.STATS_EXACT_MEDIAN:
+                    continue
+                duration_ms = await refresh_view(conn, view_name)
+                logger.info(f"Витрина {view_name} обновлена за {duration_ms} мс")
+            # Кэши /stats в API сбрасываются после обновления всех витрин
+            await notify_data_changed(conn, SCOPE_STATS)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": STATS_REFRESH_LOCK_ID})
+    return True
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Обновление материализованных витрин статистики")
+    parser.add_argument("--once", action="store_true", help="обновить один раз и завершиться")
+    parser.add_argument("--interval", type=int, default=settings.STATS_REFRESH_INTERVAL_SECONDS,
+                        help="интервал между обновлениями, секунд (по умолчанию %(default)s)")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    if args.once:
+        await refresh_stats_views()
+        return
+
+    logger.info(f"Обновление витрин статистики каждые {args.interval} с")
+    while True:
+        try:
+            await refresh_stats_views()
+        except Exception as e:
+            # Ошибка одного цикла не останавливает планировщик: API продолжает отдавать
+            # предыдущий снимок, возраст которого виден в ответах
+            logger.error(f"Ошибка обновления витрин статистики: {e}", exc_info=True)
+        await asyncio.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,13 +3,15 @@ import asyncio
 import json
 import logging
 import sys
-
-from kafka import KafkaConsumer
-from pydantic import ValidationError
+from typing import List, Tuple
 
 from app.core.config import settings
 from app.db_session import get_session #
-from app.db_updater import update_sold_ads # Наша новая функция
+from app.db_updater import process_active_ids_chunk, update_sold_ads # Наша новая функция
+from app.dlq import DeadLetterSink, Producer, start_kafka_producer
+from app.kafka_runtime import AIOKafkaSource, ConsumerRuntime, KafkaRecord, MessageSource
+from app.metrics import start_metrics_server
+from app.retry import db_retry_policy
 from app.schemas import ActiveIdsSchema
 
 # Настройка логирования
@@ -21,45 +23,76 @@ KAFKA_TOPIC_ACTIVE_IDS = "active_car_ids"
 KAFKA_CONSUMER_GROUP_STATUS = "status-updater-group"
 
 
+def deserialize_active_ids(record: KafkaRecord) -> ActiveIdsSchema:
+    # Валидируем данные через нашу новую схему
+    return ActiveIdsSchema.model_validate(json.loads(record.value))
+
+
+def active_ids_key(active_data: ActiveIdsSchema) -> str:
+    return f"{active_data.source_name}:{active_data.make_str}"
+
+
+async def write_active_ids(items: List[Tuple[KafkaRecord, ActiveIdsSchema]]):
+    """
+    Каждое сообщение обрабатывается в своей транзакции.
+    Ошибки повторяет или отправляет в DLQ рантайм.
+    """
+    for record, active_data in items:
+        # Добавляем информацию о марке в лог
+        logger.info(f"Обработка активных ID для источника: {active_data.source_name}, "
+                    f"марка: {active_data.make_str}, ID: {len(active_data.ad_ids)} "
+                    f"(partition {record.partition}, offset {record.offset})")
+        async with get_session() as session:
+            if active_data.run_id:
+                # Часть или финальный маркер chunked-протокола
+                await process_active_ids_chunk(session, active_data)
+            else:
+                # Вызываем функцию обновления
+                await update_sold_ads(session, active_data)
+            await session.commit()
+
+        logger.info(f"Успешно обработано сообщение марки {active_data.make_str}")
+
+
+def build_runtime(source: MessageSource, dlq_producer: Producer) -> ConsumerRuntime:
+    # Сообщения крупные (до нескольких тысяч ID), поэтому пачка из одного сообщения.
+    # Марки обрабатываются параллельно, а части одной марки - одним воркером по порядку,
+    # чтобы финальный маркер не обогнал свои части
+    return ConsumerRuntime(
+        source,
+        deserialize_active_ids,
+        write_active_ids,
+        batch_size=1,
+        max_wait_ms=settings.CONSUMER_BATCH_MAX_WAIT_MS,
+        max_in_flight=settings.CONSUMER_MAX_IN_FLIGHT,
+        queue_size=settings.CONSUMER_QUEUE_SIZE,
+        key=active_ids_key,
+        retry=db_retry_policy(),
+        dead_letters=DeadLetterSink(dlq_producer, settings.KAFKA_TOPIC_ACTIVE_IDS_DLQ),
+        name="status",
+    )
+
+
 async def main():
     """Главная асинхронная функция запуска консьюмера статусов."""
     logger.info("Запуск Kafka Status Consumer...")
     logger.info(f"Подключение к Kafka: {settings.KAFKA_BOOTSTRAP_SERVERS}") #
     logger.info(f"Прослушивание топика: {KAFKA_TOPIC_ACTIVE_IDS}")
 
-    consumer = KafkaConsumer(
+    if settings.METRICS_ENABLED:
+        start_metrics_server(settings.METRICS_PORT)
+
+    source = AIOKafkaSource(
         KAFKA_TOPIC_ACTIVE_IDS, # Слушаем новый топик!
-        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS.split(','), #
         group_id=KAFKA_CONSUMER_GROUP_STATUS, # Новая группа!
-        auto_offset_reset='earliest',
-        value_deserializer=lambda x: json.loads(x.decode('utf-8')),
-        enable_auto_commit=True,
+        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
     )
-
-    for message in consumer:
-        logger.info(f"Получено сообщение со списком активных ID из partition {message.partition}")
-        try:
-            # Валидируем данные через нашу новую схему
-            active_data = ActiveIdsSchema.model_validate(message.value)
-            
-            # Добавляем информацию о марке в лог
-            logger.info(f"Обработка активных ID для источника: {active_data.source_name}, "
-                       f"марка: {active_data.make_str}, ID: {len(active_data.ad_ids)}")
-
-            session_generator = get_session()
-            async with session_generator as session:
-                # Вызываем функцию обновления
-                await update_sold_ads(session, active_data)
-                await session.commit()
-                
-                logger.info(f"Успешно обработана марка {active_data.make_str}")
-
-        except ValidationError as e:
-            logger.error(f"Ошибка валидации данных: {e.errors()}")
-            logger.error(f"Проблемное сообщение: {message.value}")
-        except Exception as e:
-            logger.exception(f"Произошла непредвиденная ошибка при обработке марки: {e}")
+    dlq_producer = await start_kafka_producer(settings.KAFKA_BOOTSTRAP_SERVERS)
+    try:
+        await build_runtime(source, dlq_producer).run()
+    finally:
+        await dlq_producer.stop()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+# services/data_processor/benchmarks/status_update_by_make.py
+"""
+Бенчмарк прохода статусов по марке: ILIKE '%марка%' против точного ключа марки
+(индекс ix_auto_ad_active_source_make_key).
+
+Наполняет auto_ad синтетическими объявлениями отдельного источника (марки из --makes
+и фоновые марки), для каждой марки выполняет build_mark_sold_statement с обоими условиями
+в откатываемой транзакции и печатает медианное время, число затронутых строк и тип
+сканирования из EXPLAIN. Строка "ds" показывает лишние совпадения ILIKE с "ds-automobiles".
+
+Запуск из services/data_processor (нужна БД с примененными миграциями):
+    python -m benchmarks.status_update_by_make --ads-per-make 20000 --repeat 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from app.db_session import get_session
+from app.db_updater import build_mark_sold_statement, copy_active_ids, make_condition
+from app.models import AutoAd
+
+BENCH_SOURCE = "benchmark.local"
+DEFAULT_MAKES = ["volkswagen", "bmw", "audi", "mini", "mercedes-benz", "alfa-romeo", "ds", "ds-automobiles"]
+
+
+def legacy_condition(make_str: str):
+    return AutoAd.make_name.ilike(f"%{make_str}%")
+
+
+async def seed(makes, ads_per_make: int, background_makes: int):
+    async with get_session() as session:
+        await session.execute(
+            text(
+                "INSERT INTO auto_ad (id_ad, make_name, source_name, url_ad, price, \"currencyCode\", \"createdAt\") "
+                "SELECT 'bench-' || m || '-' || g, m, :source, 'bench-url-' || m || '-' || g, 1000 + g, 'PLN', now() "
+                "FROM unnest(CAST(:makes AS text[])) AS m, generate_series(1, :n) AS g "
+                "ON CONFLICT (id_ad) DO UPDATE SET sold_at = NULL"
+            ),
+            {"source": BENCH_SOURCE, "makes": list(makes) + [f"other-{i}" for i in range(background_makes)],
+             "n": ads_per_make},
+        )
+        await session.execute(text("ANALYZE auto_ad"))
+
+
+async def cleanup():
+    async with get_session() as session:
+        await session.execute(text("DELETE FROM auto_ad_history WHERE auto_ad_id LIKE 'bench-%'"))
+        await session.execute(text("DELETE FROM auto_ad WHERE source_name = :source"), {"source": BENCH_SOURCE})
+
+
+async def scan_type(condition) -> str:
+    query = (
+        select(AutoAd.id_ad)
+        .where(AutoAd.source_name == BENCH_SOURCE)
+        .where(AutoAd.sold_at.is_(None))
+        .where(condition)
+    )
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    async with get_session() as session:
+        plan = (await session.execute(text(f"EXPLAIN {sql}"))).scalars().all()
+    for line in plan:
+        for node in ("Index Only Scan", "Index Scan", "Bitmap Heap Scan", "Seq Scan"):
+            if node in line:
+                return node
+    return plan[0]
+
+
+async def run_once(make: str, active_ids, condition):
+    """Полный проход марки (COPY + UPDATE/INSERT) в транзакции, которая затем откатывается."""
+    async with get_session() as session:
+        started_at = time.perf_counter()
+        await copy_active_ids(session, active_ids)
+        result = await session.execute(
+            build_mark_sold_statement(BENCH_SOURCE, make, datetime.utcnow(), make_clause=condition)
+        )
+        elapsed = time.perf_counter() - started_at
+        rowcount = result.rowcount
+        await session.rollback()
+    return elapsed, rowcount
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--makes", nargs="+", default=DEFAULT_MAKES)
+    parser.add_argument("--ads-per-make", type=int, default=20000)
+    parser.add_argument("--background-makes", type=int, default=30,
+                        help="дополнительные марки того же объема, чтобы таблица была похожа на рабочую")
+    parser.add_argument("--active-ratio", type=float, default=0.95,
+                        help="доля объявлений марки, оставшихся активными в проходе")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="не удалять синтетические объявления")
+    args = parser.parse_args()
+
+    await seed(args.makes, args.ads_per_make, args.background_makes)
+    try:
+        print(f"{'марка':<16}{'вариант':<10}{'скан':<20}{'строк':>8}{'медиана, мс':>14}")
+        for make in args.makes:
+            active_count = int(args.ads_per_make * args.active_ratio)
+            active_ids = [f"bench-{make}-{i}" for i in range(1, active_count + 1)]
+            for label, condition in (("ilike", legacy_condition(make)), ("make_key", make_condition(make))):
+                timings = []
+                rowcount = 0
+                for _ in range(args.repeat):
+                    elapsed, rowcount = await run_once(make, active_ids, condition)
+                    timings.append(elapsed)
+                scan = await scan_type(condition)
+                print(f"{make:<16}{label:<10}{scan:<20}{rowcount:>8}{statistics.median(timings) * 1000:>14.1f}")
+    finally:
+        if not args.keep:
+            await cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy.dialects.postgresql import Insert
+
+from app.catalog_cache import CatalogCache, make_slug, model_slug
+
+
+def result(scalar=None, rows=()):
+    return MagicMock(
+        scalar=MagicMock(return_value=scalar),
+        scalar_one=MagicMock(return_value=scalar),
+        all=MagicMock(return_value=list(rows)),
+    )
+
+
+def make_cache(*results, max_size=10):
+    """Кэш с фабрикой сессий, чьи execute по очереди возвращают results."""
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=list(results))
+
+    @asynccontextmanager
+    async def session_factory():
+        yield session
+
+    return CatalogCache(max_size=max_size, session_factory=session_factory), session
+
+
+def executed(session) -> list:
+    return [call.args[0] for call in session.execute.await_args_list]
+
+
+class TestCatalogCache:
+    """Тесты кэша справочников марок и моделей."""
+
+    def test_slugs(self):
+        assert make_slug("Alfa Romeo") == "alfa-romeo"
+        assert model_slug("Alfa Romeo", "Giulia Quadrifoglio") == "alfa-romeo-giulia-quadrifoglio"
+
+    def test_miss_inserts_then_hits(self):
+        cache, session = make_cache(result(scalar=5))
+
+        assert asyncio.run(cache.get_make_id("BMW")) == 5
+        assert asyncio.run(cache.get_make_id("bmw")) == 5
+
+        assert len(executed(session)) == 1
+        assert isinstance(executed(session)[0], Insert)
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    def test_conflict_falls_back_to_select(self):
+        # ON CONFLICT DO NOTHING RETURNING не вернул строку - марку уже создал другой процесс
+        cache, session = make_cache(result(scalar=None), result(scalar=9))
+
+        assert asyncio.run(cache.get_make_id("Audi")) == 9
+
+        insert_stmt, select_stmt = executed(session)
+        assert isinstance(insert_stmt, Insert)
+        assert not isinstance(select_stmt, Insert)
+        assert asyncio.run(cache.get_make_id("Audi")) == 9
+
+    def test_model_miss_resolves_make(self):
+        cache, session = make_cache(result(scalar=3), result(scalar=30))
+
+        assert asyncio.run(cache.get_model_id("Audi", "A4")) == 30
+        assert asyncio.run(cache.get_make_id("Audi")) == 3
+        assert len(executed(session)) == 2
+
+    def test_lru_eviction_bound(self):
+        cache, session = make_cache(*(result(scalar=i) for i in range(1, 5)), max_size=2)
+
+        for make in ("Audi", "BMW"):
+            asyncio.run(cache.get_make_id(make))
+        # Audi использована последней, вытесняется BMW
+        asyncio.run(cache.get_make_id("Audi"))
+        asyncio.run(cache.get_make_id("Fiat"))
+
+        assert cache.stats()["makes"] == 2
+        assert asyncio.run(cache.get_make_id("Audi")) == 1
+        assert asyncio.run(cache.get_make_id("BMW")) == 4
+        assert len(executed(session)) == 4
+
+    def test_empty_names_skip_lookup(self):
+        cache, session = make_cache()
+
+        assert asyncio.run(cache.get_make_id(None)) is None
+        assert asyncio.run(cache.get_model_id("Audi", "")) is None
+        assert executed(session) == []
+
+    def test_warm_loads_makes_and_models(self):
+        cache, session = make_cache(
+            result(rows=[("audi", 1), ("bmw", 2)]),
+            result(rows=[("audi-a4", 10)]),
+        )
+
+        asyncio.run(cache.warm())
+
+        assert asyncio.run(cache.get_make_id("BMW")) == 2
+        assert asyncio.run(cache.get_model_id("Audi", "A4")) == 10
+        assert len(executed(session)) == 2
+
+    def test_invalidate_one_slug_or_all(self):
+        cache, session = make_cache(
+            result(rows=[("audi", 1), ("bmw", 2)]),
+            result(rows=[("audi-a4", 10)]),
+            result(scalar=None),
+            result(scalar=1),
+        )
+        asyncio.run(cache.warm())
+
+        cache.invalidate("audi")
+        assert cache.stats()["makes"] == 1
+        assert asyncio.run(cache.get_make_id("Audi")) == 1
+        assert len(executed(session)) == 4
+
+        cache.invalidate()
+        assert cache.stats()["makes"] == 0 and cache.stats()["models"] == 0
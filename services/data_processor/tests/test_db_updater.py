@@ -0,0 +1,59 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy.sql.dml import Insert
+
+from app.db_updater import finalize_active_ids_run
+from app.schemas import ActiveIdsSchema
+
+
+def mock_session(received_chunks: int, sold: int = 3):
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=MagicMock(scalar_one=MagicMock(return_value=received_chunks), rowcount=sold))
+    return session
+
+
+def final_marker(chunk_count: int, is_complete: bool = True) -> ActiveIdsSchema:
+    return ActiveIdsSchema(
+        source_name="otomoto.pl", make_str="bmw", ad_ids=set(), run_id="run-1",
+        chunk_index=chunk_count, chunk_count=chunk_count, is_final=True, is_complete=is_complete,
+    )
+
+
+def history_inserts(session) -> list:
+    return [
+        call.args[0] for call in session.execute.await_args_list
+        if isinstance(call.args[0], Insert) and call.args[0].table.name == "auto_ad_history"
+    ]
+
+
+class TestFinalizeActiveIdsRun:
+    """Тесты финального маркера chunked-протокола активных ID."""
+
+    def test_complete_run_marks_sold(self):
+        session = mock_session(received_chunks=2)
+
+        sold = asyncio.run(finalize_active_ids_run(session, final_marker(2), "bmw"))
+
+        assert sold == 3
+        assert len(history_inserts(session)) == 1
+
+    def test_empty_run_marks_nothing_sold(self):
+        session = mock_session(received_chunks=0)
+
+        sold = asyncio.run(finalize_active_ids_run(session, final_marker(0), "bmw"))
+
+        assert sold == 0
+        assert history_inserts(session) == []
+
+    def test_missing_chunks_mark_nothing_sold(self):
+        session = mock_session(received_chunks=1)
+
+        assert asyncio.run(finalize_active_ids_run(session, final_marker(2), "bmw")) == 0
+        assert history_inserts(session) == []
+
+    def test_incomplete_run_marks_nothing_sold(self):
+        session = mock_session(received_chunks=2)
+
+        assert asyncio.run(finalize_active_ids_run(session, final_marker(2, is_complete=False), "bmw")) == 0
+        assert history_inserts(session) == []
@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql
+
+from app.db_writer import build_ad_row, build_upsert_statement
+from app.schemas import ScrapedAdSchema
+
+
+def make_ad(**overrides):
+    values = {
+        "source_ad_id": "ad-1",
+        "url_ad": "https://example.com/ad-1",
+        "source_name": "otomoto",
+        "country_code": "PL",
+        "scraped_at": datetime(2024, 5, 2),
+        "price": 45999.9,
+        "currencyCode": "PLN",
+        "make_name": "Audi",
+        "model_name": "A4",
+    }
+    values.update(overrides)
+    return ScrapedAdSchema(**values)
+
+
+def compile_sql(statement) -> str:
+    return " ".join(str(statement.compile(dialect=postgresql.dialect())).split())
+
+
+class TestBuildAdRow:
+    """Тесты преобразования схемы объявления в строку auto_ad."""
+
+    def test_columns_and_ids(self):
+        row = build_ad_row(make_ad(), car_model_id=7)
+
+        assert row["id_ad"] == "ad-1"
+        assert row["car_model_id"] == 7
+        assert row["make_name"] == "Audi"
+        assert "source_ad_id" not in row
+        assert "image_urls" not in row
+
+    def test_price_coerced_to_int(self):
+        assert build_ad_row(make_ad(), None)["price"] == 45999
+        assert build_ad_row(make_ad(price=None), None)["price"] is None
+
+    def test_created_at_defaults_to_now(self):
+        before = datetime.utcnow()
+        row = build_ad_row(make_ad(), None)
+
+        assert before <= row["createdAt"] <= datetime.utcnow()
+
+    def test_created_at_from_source_kept(self):
+        posted = datetime(2024, 5, 1, 12, 0)
+
+        assert build_ad_row(make_ad(createdAt=posted), None)["createdAt"] == posted
+
+
+class TestBuildUpsertStatement:
+    """Тесты SQL пакетного upsert."""
+
+    def setup_method(self):
+        rows = [build_ad_row(make_ad(), 7), build_ad_row(make_ad(source_ad_id="ad-2", price=None), 7)]
+        self.sql = compile_sql(build_upsert_statement(rows, datetime(2024, 5, 1)))
+
+    def test_conflict_target_is_id_ad(self):
+        assert "ON CONFLICT (id_ad) DO UPDATE SET" in self.sql
+
+    def test_immutable_columns_not_updated(self):
+        update_set = self.sql.split("DO UPDATE SET", 1)[1].split("RETURNING", 1)[0]
+
+        for column in ("id_ad", "url_ad", "source_name", "car_model_id"):
+            assert f" {column} =" not in update_set
+
+    def test_created_at_keeps_existing_value(self):
+        assert '"createdAt" = coalesce(auto_ad."createdAt", excluded."createdAt")' in self.sql
+
+    def test_null_scraped_fields_do_not_overwrite(self):
+        assert "price = coalesce(excluded.price, auto_ad.price)" in self.sql
+        assert "make_name = coalesce(excluded.make_name, auto_ad.make_name)" in self.sql
+
+    def test_history_filter_skips_null_price(self):
+        assert (
+            "WHERE upserted.inserted OR upserted.price IS NOT NULL "
+            "AND previous.old_price IS DISTINCT FROM upserted.price"
+        ) in self.sql
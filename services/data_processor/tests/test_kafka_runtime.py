@@ -0,0 +1,300 @@
+import asyncio
+import json
+
+import pytest
+
+from sqlalchemy.exc import OperationalError
+
+from app.dlq import DeadLetterSink, read_dlq_metadata
+from app.dlq_replay import replay
+from app.in_memory_broker import InMemoryBroker
+from app.kafka_runtime import ConsumerRuntime, KafkaRecord, OffsetTracker
+from app.retry import RetryPolicy
+
+TOPIC = "scraped_ads"
+GROUP = "test-group"
+DLQ_TOPIC = "scraped_ads.dlq"
+
+
+def make_runtime(broker, handler, **options):
+    options.setdefault("max_wait_ms", 50)
+    return ConsumerRuntime(
+        broker.source(TOPIC, GROUP),
+        lambda record: json.loads(record.value),
+        handler,
+        **options,
+    )
+
+
+def produce_ads(broker, count):
+    for i in range(count):
+        broker.produce(TOPIC, {"source_ad_id": str(i)}, key=str(i))
+
+
+class TestOffsetTracker:
+    """Тесты расчета offset'ов для коммита."""
+
+    def test_commit_stops_at_first_pending(self):
+        tracker = OffsetTracker()
+        records = [KafkaRecord(TOPIC, 0, offset, b"{}") for offset in range(3)]
+        for record in records:
+            tracker.add(record)
+
+        tracker.done(records[1])
+        tracker.done(records[2])
+        assert tracker.committable() == {(TOPIC, 0): 0}
+
+        tracker.done(records[0])
+        assert tracker.committable() == {(TOPIC, 0): 3}
+
+    def test_committed_offsets_not_repeated(self):
+        tracker = OffsetTracker()
+        record = KafkaRecord(TOPIC, 0, 0, b"{}")
+        tracker.add(record)
+        tracker.done(record)
+        tracker.mark_committed(tracker.committable())
+        assert tracker.committable() == {}
+
+
+class TestConsumerRuntime:
+    """Тесты конвейера на in-memory брокере."""
+
+    def test_all_messages_processed_and_committed(self):
+        broker = InMemoryBroker(partitions=3)
+        produce_ads(broker, 50)
+        seen = []
+
+        async def handler(items):
+            seen.extend(value["source_ad_id"] for _, value in items)
+
+        asyncio.run(make_runtime(broker, handler, batch_size=7).run(stop_when_idle=True))
+
+        assert sorted(seen, key=int) == [str(i) for i in range(50)]
+        committed = sum(offset for (group, _, _), offset in broker.committed.items() if group == GROUP)
+        assert committed == 50
+
+    def test_invalid_message_is_skipped_and_committed(self):
+        broker = InMemoryBroker()
+        broker.produce(TOPIC, b"not json")
+        produce_ads(broker, 2)
+        seen = []
+
+        async def handler(items):
+            seen.extend(value["source_ad_id"] for _, value in items)
+
+        runtime = make_runtime(broker, handler)
+        asyncio.run(runtime.run(stop_when_idle=True))
+
+        assert seen == ["0", "1"]
+        assert runtime.invalid == 1
+        assert broker.committed[(GROUP, TOPIC, 0)] == 3
+
+    def test_metrics_count_outcomes_and_stages(self):
+        prometheus_client = pytest.importorskip("prometheus_client")
+        broker = InMemoryBroker()
+        broker.produce(TOPIC, b"not json")
+        produce_ads(broker, 4)
+
+        def sample(name, **labels):
+            return prometheus_client.REGISTRY.get_sample_value(name, {"consumer": "metrics-test", **labels}) or 0
+
+        async def handler(items):
+            pass
+
+        asyncio.run(make_runtime(broker, handler, batch_size=2, name="metrics-test").run(stop_when_idle=True))
+
+        assert sample("consumer_messages_total", outcome="processed") == 4
+        assert sample("consumer_messages_total", outcome="invalid") == 1
+        assert sample("consumer_batch_size_sum") == 4
+        assert sample("consumer_stage_duration_seconds_count", stage="write") == sample("consumer_batch_size_count")
+        assert sample("consumer_pending_messages") == 0
+
+    def test_several_transactions_in_flight(self):
+        broker = InMemoryBroker()
+        produce_ads(broker, 40)
+        in_flight = 0
+        max_seen = 0
+
+        async def handler(items):
+            nonlocal in_flight, max_seen
+            in_flight += 1
+            max_seen = max(max_seen, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+        runtime = make_runtime(broker, handler, batch_size=5, max_in_flight=3,
+                               key=lambda value: value["source_ad_id"])
+        asyncio.run(runtime.run(stop_when_idle=True))
+
+        assert 1 < max_seen <= 3
+
+    def test_without_key_single_writer_keeps_order(self):
+        broker = InMemoryBroker()
+        for version in range(20):
+            broker.produce(TOPIC, {"source_ad_id": "a", "version": version})
+        versions = []
+        writers = set()
+
+        async def handler(items):
+            writers.add(id(asyncio.current_task()))
+            # Чем меньше пачка, тем дольше запись - параллельные воркеры обогнали бы друг друга
+            await asyncio.sleep(0.01 / len(items))
+            versions.extend(value["version"] for _, value in items)
+
+        runtime = make_runtime(broker, handler, batch_size=3, max_in_flight=4)
+        asyncio.run(runtime.run(stop_when_idle=True))
+
+        assert versions == list(range(20))
+        assert len(writers) == 1
+        assert len(runtime.stats()["workers"]) == 1
+
+    def test_restart_resumes_from_committed_offset(self):
+        broker = InMemoryBroker()
+        produce_ads(broker, 5)
+
+        async def noop(items):
+            pass
+
+        asyncio.run(make_runtime(broker, noop).run(stop_when_idle=True))
+        produce_ads(broker, 2)
+        seen = []
+
+        async def handler(items):
+            seen.extend(record.offset for record, _ in items)
+
+        asyncio.run(make_runtime(broker, handler).run(stop_when_idle=True))
+        assert seen == [5, 6]
+
+    def test_keyed_workers_keep_order_per_key(self):
+        broker = InMemoryBroker(partitions=2)
+        for version in range(5):
+            for ad_id in ("a", "b", "c", "d"):
+                broker.produce(TOPIC, {"source_ad_id": ad_id, "version": version}, key=ad_id)
+        versions = {}
+        workers_by_key = {}
+
+        async def handler(items):
+            for _, value in items:
+                versions.setdefault(value["source_ad_id"], []).append(value["version"])
+                workers_by_key.setdefault(value["source_ad_id"], set()).add(id(asyncio.current_task()))
+            await asyncio.sleep(0.001)
+
+        runtime = make_runtime(broker, handler, batch_size=3, max_in_flight=3,
+                               key=lambda value: value["source_ad_id"])
+        asyncio.run(runtime.run(stop_when_idle=True))
+
+        assert all(seen == list(range(5)) for seen in versions.values())
+        assert all(len(tasks) == 1 for tasks in workers_by_key.values())
+        assert sum(worker["processed"] for worker in runtime.stats()["workers"]) == 20
+
+
+class TestRetryAndDeadLetters:
+    """Тесты повторов и DLQ."""
+
+    def test_transient_error_is_retried(self):
+        broker = InMemoryBroker()
+        produce_ads(broker, 3)
+        calls = 0
+
+        async def flaky(items):
+            nonlocal calls
+            calls += 1
+            if calls < 3:
+                raise OperationalError("INSERT", {}, ConnectionError("connection reset"))
+
+        runtime = make_runtime(broker, flaky, retry=RetryPolicy(max_attempts=5, base_delay=0.001),
+                               dead_letters=DeadLetterSink(broker, DLQ_TOPIC))
+        asyncio.run(runtime.run(stop_when_idle=True))
+
+        assert calls == 3
+        assert runtime.processed == 3
+        assert broker.records(DLQ_TOPIC) == []
+
+    def test_database_outage_pauses_without_dead_letters(self):
+        broker = InMemoryBroker()
+        produce_ads(broker, 10)
+        calls = 0
+
+        async def unavailable(items):
+            nonlocal calls
+            calls += 1
+            raise OperationalError("INSERT", {}, ConnectionError("connection refused"))
+
+        runtime = make_runtime(broker, unavailable, batch_size=5,
+                               retry=RetryPolicy(max_attempts=2, base_delay=0.001, max_delay=0.002),
+                               dead_letters=DeadLetterSink(broker, DLQ_TOPIC))
+
+        async def run_during_outage():
+            task = asyncio.create_task(runtime.run())
+            # Много циклов повторов подряд - дольше любой политики повторов
+            while calls < 50:
+                await asyncio.sleep(0.01)
+            assert runtime.source.paused
+            runtime.stop()
+            await task
+
+        asyncio.run(run_during_outage())
+
+        assert broker.records(DLQ_TOPIC) == []
+        # Зафиксированная позиция не сдвинулась с первого сообщения
+        assert broker.committed.get((GROUP, TOPIC, 0), 0) == 0
+        assert runtime.failed == 0 and runtime.processed == 0
+
+        # После перезапуска с доступной БД сообщения перечитываются и записываются по порядку
+        written = []
+
+        async def handler(items):
+            written.extend(value["source_ad_id"] for _, value in items)
+
+        asyncio.run(make_runtime(broker, handler, max_in_flight=1).run(stop_when_idle=True))
+        assert written == [str(i) for i in range(10)]
+        assert broker.committed[(GROUP, TOPIC, 0)] == 10
+
+    def test_database_recovery_resumes_fetching(self):
+        broker = InMemoryBroker()
+        produce_ads(broker, 3)
+        calls = 0
+
+        async def recovers(items):
+            nonlocal calls
+            calls += 1
+            if calls <= 30:
+                raise OperationalError("INSERT", {}, ConnectionError("connection refused"))
+
+        runtime = make_runtime(broker, recovers,
+                               retry=RetryPolicy(max_attempts=2, base_delay=0.001, max_delay=0.002),
+                               dead_letters=DeadLetterSink(broker, DLQ_TOPIC))
+        asyncio.run(runtime.run(stop_when_idle=True))
+
+        assert runtime.processed == 3
+        assert broker.records(DLQ_TOPIC) == []
+        assert broker.committed[(GROUP, TOPIC, 0)] == 3
+        assert not runtime.source.paused
+
+    def test_poison_message_goes_to_dlq_and_replays(self):
+        broker = InMemoryBroker()
+        produce_ads(broker, 4)
+        broker.produce(TOPIC, b"not json")
+        poisoned = {"2"}
+        written = []
+
+        async def handler(items):
+            if any(value["source_ad_id"] in poisoned for _, value in items):
+                raise ValueError("bad ad")
+            written.extend(value["source_ad_id"] for _, value in items)
+
+        runtime = make_runtime(broker, handler, dead_letters=DeadLetterSink(broker, DLQ_TOPIC))
+        asyncio.run(runtime.run(stop_when_idle=True))
+
+        assert sorted(written) == ["0", "1", "3"]
+        assert broker.committed[(GROUP, TOPIC, 0)] == 5
+        dead = {read_dlq_metadata(record)["stage"]: record for record in broker.records(DLQ_TOPIC)}
+        assert set(dead) == {"write", "deserialize"}
+        assert read_dlq_metadata(dead["write"])["offset"] == "2"
+        assert read_dlq_metadata(dead["write"])["error_type"] == "ValueError"
+
+        # После исправления причины сообщения возвращаются в исходный топик
+        replayed = asyncio.run(replay(broker.source(DLQ_TOPIC, "replay"), broker, idle_timeout_ms=10))
+        assert replayed == {TOPIC: 2}
+        assert {record.value for record in broker.records(TOPIC)[-2:]} == {dead["write"].value, b"not json"}
+        assert broker.committed[("replay", DLQ_TOPIC, 0)] == 2
@@ -0,0 +1,118 @@
+# services/scrapy_spiders/car_scrapers/car_scrapers/extensions.py
+"""
+Метрики Prometheus для scrapy_runner: /metrics на PROMETHEUS_PORT (по умолчанию 8000).
+
+Раз в PROMETHEUS_UPDATE_INTERVAL секунд из статистики краулера и error_stats паука
+считаются страницы и объявления в минуту и доля ответов 403 за прошедший интервал.
+Длительность обхода каждой марки приходит сигналом make_finished.
+
+Общий модуль метрик лежит в data_processor (app.metrics, в PYTHONPATH scrapy_runner);
+без него или без prometheus_client расширение отключается.
+"""
+import logging
+import time
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from .signals import make_finished
+
+try:
+    from app.metrics import METRICS_AVAILABLE, gauge, histogram, start_metrics_server
+except ImportError:  # нет data_processor в PYTHONPATH
+    METRICS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+if METRICS_AVAILABLE:
+    PAGES_PER_MINUTE = gauge("scrapy_pages_per_minute", "Responses received per minute over the last interval", ["spider"])
+    ITEMS_PER_MINUTE = gauge("scrapy_items_per_minute", "Items scraped per minute over the last interval", ["spider"])
+    FORBIDDEN_RATIO = gauge("scrapy_forbidden_ratio", "Share of 403 responses over the last interval", ["spider"])
+    PAGES_TOTAL = gauge("scrapy_pages", "Responses received since spider start", ["spider"])
+    ITEMS_TOTAL = gauge("scrapy_items", "Items scraped since spider start", ["spider"])
+    SPIDER_ERRORS = gauge("scrapy_spider_errors", "Spider error counters (error_stats) since start", ["spider", "error"])
+    MAKE_DURATION = histogram(
+        "scrapy_make_duration_seconds", "Time to crawl one make", ["spider"],
+        buckets=(10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200),
+    )
+    MAKE_LAST_DURATION = gauge("scrapy_make_last_duration_seconds", "Duration of the last crawl of a make", ["spider", "make"])
+    MAKE_LAST_ADS = gauge("scrapy_make_last_ads", "Active ads found in the last crawl of a make", ["spider", "make"])
+
+
+class PrometheusStatsExtension:
+    """Публикует статистику краулера и паука в Prometheus"""
+
+    def __init__(self, crawler, port: int, interval: float):
+        self.crawler = crawler
+        self.port = port
+        self.interval = interval
+        self._task = None
+        self._last = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("PROMETHEUS_ENABLED", True):
+            raise NotConfigured
+        if not METRICS_AVAILABLE:
+            logger.warning("Метрики Prometheus отключены: нет app.metrics или prometheus_client")
+            raise NotConfigured
+
+        extension = cls(
+            crawler,
+            port=crawler.settings.getint("PROMETHEUS_PORT", 8000),
+            interval=crawler.settings.getfloat("PROMETHEUS_UPDATE_INTERVAL", 15),
+        )
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.make_finished, signal=make_finished)
+        return extension
+
+    def spider_opened(self, spider):
+        try:
+            start_metrics_server(self.port)
+        except OSError as e:
+            # Например, порт занят другим запуском на той же машине
+            logger.warning(f"Не удалось открыть /metrics на порту {self.port}: {e}")
+        self._last = self._snapshot(spider)
+        self._task = task.LoopingCall(self.update, spider)
+        self._task.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        if self._task and self._task.running:
+            self._task.stop()
+        self.update(spider)
+
+    def _snapshot(self, spider):
+        stats = self.crawler.stats
+        error_stats = getattr(spider, "error_stats", {})
+        return (
+            time.monotonic(),
+            stats.get_value("response_received_count", 0),
+            stats.get_value("item_scraped_count", 0),
+            error_stats.get("forbidden_403", 0),
+        )
+
+    def update(self, spider):
+        """Скорости за интервал с прошлого обновления и накопленные счетчики"""
+        now, pages, items, forbidden = current = self._snapshot(spider)
+        last_time, last_pages, last_items, last_forbidden = self._last or current
+        self._last = current
+
+        elapsed = now - last_time
+        if elapsed > 0:
+            PAGES_PER_MINUTE.labels(spider.name).set((pages - last_pages) / elapsed * 60)
+            ITEMS_PER_MINUTE.labels(spider.name).set((items - last_items) / elapsed * 60)
+        # Ответы 403 паук получает как обычные (handle_httpstatus_list) и учитывает в response_received_count
+        interval_pages = pages - last_pages
+        FORBIDDEN_RATIO.labels(spider.name).set((forbidden - last_forbidden) / interval_pages if interval_pages else 0)
+
+        PAGES_TOTAL.labels(spider.name).set(pages)
+        ITEMS_TOTAL.labels(spider.name).set(items)
+        for error, count in getattr(spider, "error_stats", {}).items():
+            SPIDER_ERRORS.labels(spider.name, error).set(count)
+
+    def make_finished(self, spider, make_name, duration, ads_count, is_complete):
+        MAKE_DURATION.labels(spider.name).observe(duration)
+        MAKE_LAST_DURATION.labels(spider.name, make_name).set(duration)
+        MAKE_LAST_ADS.labels(spider.name, make_name).set(ads_count)
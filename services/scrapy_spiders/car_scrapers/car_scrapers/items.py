@@ -84,4 +84,10 @@ class ActiveIdsItem(scrapy.Item):
     active_ids = scrapy.Field()
     timestamp = scrapy.Field()
     source_name = scrapy.Field()
-    ad_ids = scrapy.Field()
\ No newline at end of file
+    ad_ids = scrapy.Field()
+    # Chunked-протокол: части одного запуска и финальный маркер марки
+    run_id = scrapy.Field()
+    chunk_index = scrapy.Field()
+    chunk_count = scrapy.Field()
+    is_final = scrapy.Field()
+    is_complete = scrapy.Field()
\ No newline at end of file
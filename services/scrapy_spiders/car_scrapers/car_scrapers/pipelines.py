@@ -49,30 +49,9 @@ class KafkaPipeline:
 
 
     def close_spider(self, spider):
-        if hasattr(spider, 'scraped_ids') and hasattr(spider, 'name'):
-            if spider.scraped_ids: # Проверяем, что есть ID для отправки
-                self.logger.info(f"KafkaPipeline: Паук {spider.name} завершает работу. Собрано {len(spider.scraped_ids)} уникальных ID для отправки из close_spider.")
-                try:
-                    # Создаем экземпляр ActiveIdsItem
-                    active_ids_item = ActiveIdsItem()
-                    active_ids_item['source_name'] = 'otomoto.pl'
-                    active_ids_item['ad_ids'] = list(spider.scraped_ids)
-
-                    # Вызываем self.process_item для отправки этого item через существующую логику
-                    # Убеждаемся, что продюсер еще активен
-                    if self.producer:
-                        self.logger.info(f"KafkaPipeline: Передача ActiveIdsItem в self.process_item из close_spider для {spider.name}.")
-                        self.process_item(active_ids_item, spider) # process_item сам залогирует результат отправки
-                    else:
-                        self.logger.warning(f"KafkaPipeline: KafkaProducer не был доступен в close_spider для отправки ActiveIdsItem через process_item для {spider.name}.")
-
-                except Exception as e:
-                    self.logger.error(f"KafkaPipeline: Ошибка при подготовке/обработке ActiveIdsItem из close_spider для {spider.name}: {e}", exc_info=True)
-            else:
-                self.logger.info(f"KafkaPipeline: У паука {spider.name} нет scraped_ids для отправки из close_spider.")
-        else:
-            self.logger.warning(f"KafkaPipeline: Паук {spider.name} не имеет атрибутов 'scraped_ids' или 'name'. Невозможно отправить ActiveIdsItem из close_spider.")
-
+        # Активные ID отправляются по маркам частями из самого паука (chunked-протокол),
+        # общий список за весь запуск больше не отправляется: он не ограничен по размеру
+        # и не может быть обработан консьюмером статусов без марки.
         if self.producer:
             try:
                 self.logger.info(f"KafkaPipeline: Flushing and closing KafkaProducer для паука {spider.name}.")
@@ -104,11 +83,16 @@ class KafkaPipeline:
 
             elif isinstance(item, ActiveIdsItem):
                 topic = self.kafka_topic_active_ids
-                # В качестве ключа можно использовать имя паука/источника
-                message_key = item_dict.get('source_name').encode('utf-8')
+                # Ключ источник+марка: все части марки попадают в одну партицию и читаются по порядку
+                message_key = f"{item_dict.get('source_name')}:{item_dict.get('make_str')}".encode('utf-8')
 
                 future = self.producer.send(topic, key=message_key, value=item_dict)
-                self.logger.info(f"Список из {len(item_dict.get('ad_ids', []))} активных ID отправлен в топик {topic}")
+                if item_dict.get('is_final'):
+                    self.logger.info(f"Финальный маркер марки {item_dict.get('make_str')} отправлен в топик {topic}: "
+                                     f"частей {item_dict.get('chunk_count')}, полная={item_dict.get('is_complete')}")
+                else:
+                    self.logger.info(f"Часть {item_dict.get('chunk_index')} из {len(item_dict.get('ad_ids', []))} "
+                                     f"активных ID отправлена в топик {topic}")
 
             else:
                 # Если появится какой-то другой тип item, просто его пропустим
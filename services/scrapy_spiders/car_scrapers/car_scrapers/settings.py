@@ -64,8 +64,14 @@ DOWNLOADER_MIDDLEWARES = {
 EXTENSIONS = {
     'scrapy.extensions.logstats.LogStats': None,
     'scrapy.extensions.corestats.CoreStats': 543,
+    'car_scrapers.extensions.PrometheusStatsExtension': 550,
 }
 
+# Метрики Prometheus (/metrics, порт из monitoring/prometheus.yml)
+PROMETHEUS_ENABLED = True
+PROMETHEUS_PORT = 8000
+PROMETHEUS_UPDATE_INTERVAL = 15
+
 RETRY_ENABLED = True
 RETRY_TIMES = 2
 RETRY_HTTP_CODES = [500, 502, 503, 504, 408, 429]
@@ -96,6 +102,9 @@ KAFKA_TOPIC_ADS = 'parsed_car_ads'
 # Имя топика для отправки списка активных ID
 KAFKA_TOPIC_ACTIVE_IDS = 'active_car_ids'
 
+# Максимум ID в одном сообщении активных ID (марка отправляется несколькими частями)
+ACTIVE_IDS_CHUNK_SIZE = 5000
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
 AUTOTHROTTLE_ENABLED = True
@@ -0,0 +1,5 @@
+# services/scrapy_spiders/car_scrapers/car_scrapers/signals.py
+"""Сигналы проекта (в дополнение к scrapy.signals)."""
+
+# Обход марки завершен: spider, make_name, duration (секунды), ads_count, is_complete
+make_finished = object()
@@ -9,11 +9,13 @@ from rich.table import Table
 import json
 import math
 import time
+import uuid
 import scrapy
 import urllib.parse as up
 from collections import OrderedDict
 from datetime import datetime, timezone
 from ..items import ParsedAdItem, ActiveIdsItem
+from ..signals import make_finished
 from ..utils.make_loader import MakeLoader
 from typing import Optional, AsyncGenerator
 from scrapy import Request
@@ -57,6 +59,7 @@ class OtomotoSpider(scrapy.Spider):
         spider.pause_duration = crawler.settings.getint('PAUSE_DURATION', 300)
         spider.graphql_retry_delay = crawler.settings.getint('GRAPHQL_RETRY_DELAY', 5)
         spider.graphql_max_retries = crawler.settings.getint('GRAPHQL_MAX_RETRIES', 3)
+        spider.active_ids_chunk_size = crawler.settings.getint('ACTIVE_IDS_CHUNK_SIZE', 5000)
         
         spider.logger.info(f"Настройки 403: лимит={spider.max_consecutive_403}, пауза={spider.pause_duration}с")
         spider.logger.info(f"Настройки GraphQL: повтор через {spider.graphql_retry_delay}с, макс повторов={spider.graphql_max_retries}")
@@ -79,6 +82,10 @@ class OtomotoSpider(scrapy.Spider):
         self.current_make_name = None
         self.current_make_active_ids = set()
 
+        # Идентификатор запуска для chunked-протокола активных ID
+        self.run_id = uuid.uuid4().hex
+        self.active_ids_chunk_size = 5000
+
         # Добавляем статистику для Rich
         self.stats_start_time = time.time()
         self.last_stats_update = time.time()
@@ -109,7 +116,10 @@ class OtomotoSpider(scrapy.Spider):
         # Для отслеживания состояния
         self.current_make_total_pages = 0
         self.current_make_processed_pages = 0
+        # Страницы марки, пропущенные из-за ошибок: марка с пропусками не считается полной
+        self.current_make_failed_pages = 0
         self.make_completion_lock = False
+        self.current_make_started_at = time.time()
         
         # Статистика ошибок
         self.error_stats = {
@@ -251,7 +261,9 @@ class OtomotoSpider(scrapy.Spider):
         self.current_make_active_ids = set()
         self.current_make_total_pages = 0
         self.current_make_processed_pages = 0
+        self.current_make_failed_pages = 0
         self.make_completion_lock = False
+        self.current_make_started_at = time.time()
         
         # Обновляем основной прогресс
         if self.main_task is not None:
@@ -336,6 +348,7 @@ class OtomotoSpider(scrapy.Spider):
                 return
             else:
                 # Пропускаем текущую марку и переходим к следующей
+                self.current_make_failed_pages += 1
                 yield from self._handle_make_completion()
                 return
         
@@ -347,6 +360,7 @@ class OtomotoSpider(scrapy.Spider):
         except json.JSONDecodeError:
             self.logger.error(f"Не удалось декодировать JSON с {response.url}")
             self.error_stats['json_decode_errors'] += 1
+            self.current_make_failed_pages += 1
             yield from self._handle_make_completion()
             return
 
@@ -356,6 +370,7 @@ class OtomotoSpider(scrapy.Spider):
                 yield retry_request
                 return
             else:
+                self.current_make_failed_pages += 1
                 yield from self._handle_make_completion()
                 return
 
@@ -363,6 +378,7 @@ class OtomotoSpider(scrapy.Spider):
         if not advert_search_data:
             self.logger.error(f"Ключ 'advertSearch' не найден")
             self.error_stats['missing_data_errors'] += 1
+            self.current_make_failed_pages += 1
             yield from self._handle_make_completion()
             return
 
@@ -430,7 +446,7 @@ class OtomotoSpider(scrapy.Spider):
                 return
             else:
                 # Пропускаем страницу и продолжаем
-                yield from self._handle_page_completion()
+                yield from self._handle_page_failure()
                 return
         
         # Если запрос успешен, сбрасываем счетчик 403 ошибок
@@ -441,7 +457,7 @@ class OtomotoSpider(scrapy.Spider):
         except json.JSONDecodeError:
             self.logger.error(f"Не удалось декодировать JSON на странице {page_num} с {response.url}")
             self.error_stats['json_decode_errors'] += 1
-            yield from self._handle_page_completion()
+            yield from self._handle_page_failure()
             return
 
         if 'errors' in data:
@@ -450,14 +466,14 @@ class OtomotoSpider(scrapy.Spider):
                 yield retry_request
                 return
             else:
-                yield from self._handle_page_completion()
+                yield from self._handle_page_failure()
                 return
 
         advert_search_data = data.get('data', {}).get('advertSearch')
         if not advert_search_data:
             self.logger.error(f"Ключ 'advertSearch' не найден в JSON на странице {page_num}: {response.text[:500]}")
             self.error_stats['missing_data_errors'] += 1
-            yield from self._handle_page_completion()
+            yield from self._handle_page_failure()
             return
 
         edges = advert_search_data.get('edges', [])
@@ -553,6 +569,11 @@ class OtomotoSpider(scrapy.Spider):
         yield from self._handle_page_completion()
 
 
+    def _handle_page_failure(self):
+        """Страница пропущена из-за ошибки: учитываем ее, чтобы марка не считалась полной"""
+        self.current_make_failed_pages += 1
+        yield from self._handle_page_completion()
+
     def _handle_page_completion(self):
         """Обрабатывает завершение страницы"""
         self.current_make_processed_pages += 1
@@ -611,18 +632,23 @@ class OtomotoSpider(scrapy.Spider):
                 )
             
             self.logger.info(f"Завершен парсинг марки {self.current_make_name}: {len(self.current_make_active_ids)} ID")
+
+            # Длительность марки для метрик (car_scrapers.extensions.PrometheusStatsExtension)
+            if hasattr(self, 'crawler'):
+                self.crawler.signals.send_catch_log(
+                    signal=make_finished,
+                    spider=self,
+                    make_name=self.current_make_name,
+                    duration=time.time() - self.current_make_started_at,
+                    ads_count=len(self.current_make_active_ids),
+                    is_complete=self.current_make_failed_pages == 0,
+                )
         
-            # Отправляем ActiveIdsItem
-            active_ids_item = ActiveIdsItem(
-                source_name="otomoto.pl",  # Используем то же имя, что и для обычных объявлений
-                make_str=self.current_make_name,
-                ad_ids=list(self.current_make_active_ids)
-            )
-            
+            # Отправляем активные ID частями и финальный маркер
             dummy_request = scrapy.Request(
                 url='data:,',
                 callback=self._send_active_ids_item,
-                meta={'active_ids_item': active_ids_item},
+                meta={'active_ids_items': self._build_active_ids_items()},
                 dont_filter=True
             )
             yield dummy_request
@@ -691,10 +717,52 @@ class OtomotoSpider(scrapy.Spider):
             self.logger.info(f"Ошибки: 403={self.error_stats['forbidden_403']}, GraphQL={self.error_stats['graphql_errors']}")
 
 
+    def _build_active_ids_items(self):
+        """
+        Разбивает активные ID марки на части по active_ids_chunk_size и добавляет финальный
+        маркер с числом частей. is_complete=False, если часть страниц марки пропущена из-за
+        ошибок или не найдено ни одного объявления: тогда консьюмер не помечает отсутствующие
+        объявления проданными.
+        """
+        ad_ids = sorted(self.current_make_active_ids)
+        chunk_size = max(self.active_ids_chunk_size, 1)
+        chunks = [ad_ids[i:i + chunk_size] for i in range(0, len(ad_ids), chunk_size)]
+        is_complete = self.current_make_failed_pages == 0 and bool(ad_ids)
+
+        if not ad_ids:
+            self.logger.warning(f"Марка {self.current_make_name}: не найдено ни одного объявления. "
+                                f"Объявления марки не будут помечены проданными")
+        elif not is_complete:
+            self.logger.warning(f"Марка {self.current_make_name} обработана не полностью: "
+                                f"пропущено страниц {self.current_make_failed_pages}. "
+                                f"Объявления марки не будут помечены проданными")
+
+        items = [
+            ActiveIdsItem(
+                source_name="otomoto.pl",  # Используем то же имя, что и для обычных объявлений
+                make_str=self.current_make_name,
+                run_id=self.run_id,
+                chunk_index=chunk_index,
+                ad_ids=chunk,
+                is_final=False,
+            )
+            for chunk_index, chunk in enumerate(chunks)
+        ]
+        items.append(ActiveIdsItem(
+            source_name="otomoto.pl",
+            make_str=self.current_make_name,
+            run_id=self.run_id,
+            chunk_index=len(chunks),
+            ad_ids=[],
+            is_final=True,
+            chunk_count=len(chunks),
+            is_complete=is_complete,
+        ))
+        return items
+
     def _send_active_ids_item(self, response):
-        """Отправляет ActiveIdsItem через pipeline"""
-        active_ids_item = response.meta.get('active_ids_item')
-        if active_ids_item:
+        """Отправляет части ActiveIdsItem через pipeline"""
+        for active_ids_item in response.meta.get('active_ids_items', []):
             yield active_ids_item
 
 
@@ -0,0 +1,47 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+prometheus_client = pytest.importorskip("prometheus_client")
+
+from ..extensions import PrometheusStatsExtension
+
+
+def sample(name, **labels):
+    return prometheus_client.REGISTRY.get_sample_value(name, {"spider": "otomoto", **labels})
+
+
+@pytest.fixture
+def extension():
+    crawler = MagicMock()
+    crawler.stats.get_value.side_effect = lambda key, default=None: crawler.stats_values.get(key, default)
+    crawler.stats_values = {}
+    return PrometheusStatsExtension(crawler, port=0, interval=15)
+
+
+class TestPrometheusStatsExtension:
+    """Тесты метрик scrapy_runner."""
+
+    def test_rates_over_interval(self, extension, simple_spider):
+        """Тест: Скорости и доля 403 считаются по приросту с прошлого обновления."""
+        extension._last = (time.monotonic() - 60, 100, 10, 5)
+        extension.crawler.stats_values = {"response_received_count": 300, "item_scraped_count": 70}
+        simple_spider.error_stats["forbidden_403"] = 25
+
+        extension.update(simple_spider)
+
+        assert sample("scrapy_pages_per_minute") == pytest.approx(200, rel=0.01)
+        assert sample("scrapy_items_per_minute") == pytest.approx(60, rel=0.01)
+        assert sample("scrapy_forbidden_ratio") == pytest.approx(0.1)
+        assert sample("scrapy_spider_errors", error="forbidden_403") == 25
+
+    def test_make_duration(self, extension, simple_spider):
+        """Тест: Длительность марки попадает в гистограмму и в метрику марки."""
+        before = sample("scrapy_make_duration_seconds_count") or 0
+
+        extension.make_finished(simple_spider, "bmw", duration=42.0, ads_count=1200, is_complete=True)
+
+        assert sample("scrapy_make_duration_seconds_count") == before + 1
+        assert sample("scrapy_make_last_duration_seconds", make="bmw") == 42.0
+        assert sample("scrapy_make_last_ads", make="bmw") == 1200
@@ -319,3 +319,41 @@ def test_spider_build_url(simple_spider):
         
         for attr in required_attrs:
             assert hasattr(OtomotoSpider, attr)
+
+
+class TestActiveIdsChunks:
+    """Тесты отправки активных ID частями."""
+
+    def test_active_ids_split_into_chunks(self, simple_spider):
+        """Тест: Активные ID марки отправляются частями и финальным маркером."""
+        simple_spider.current_make_name = 'bmw'
+        simple_spider.current_make_active_ids = {str(i) for i in range(5)}
+        simple_spider.active_ids_chunk_size = 2
+
+        items = simple_spider._build_active_ids_items()
+
+        assert [len(item['ad_ids']) for item in items] == [2, 2, 1, 0]
+        assert [item['chunk_index'] for item in items] == [0, 1, 2, 3]
+        assert {item['run_id'] for item in items} == {simple_spider.run_id}
+        final = items[-1]
+        assert final['is_final'] and final['chunk_count'] == 3 and final['is_complete']
+
+    def test_active_ids_incomplete_after_failed_page(self, simple_spider):
+        """Тест: После пропущенной страницы марка отмечается неполной."""
+        simple_spider.current_make_name = 'bmw'
+        simple_spider.current_make_active_ids = {'1'}
+        simple_spider.current_make_failed_pages = 1
+
+        final = simple_spider._build_active_ids_items()[-1]
+
+        assert final['is_final'] and not final['is_complete']
+
+    def test_empty_make_is_incomplete(self, simple_spider):
+        """Тест: Марка без единого объявления отмечается неполной."""
+        simple_spider.current_make_name = 'bmw'
+        simple_spider.current_make_active_ids = set()
+
+        items = simple_spider._build_active_ids_items()
+
+        assert len(items) == 1
+        assert items[0]['is_final'] and items[0]['chunk_count'] == 0 and not items[0]['is_complete']
@@ -16,7 +16,7 @@ if os.path.isdir(data_processor_path) and data_processor_path not in sys.path:
     sys.path.insert(0, data_processor_path)
 
 try:
-    from app.db_session import get_session
+    from app.db_session import engine, get_session
     from sqlalchemy import text
     DB_AVAILABLE = True
 except ImportError as e:
@@ -114,6 +114,10 @@ class MakeLoader:
         except Exception as e:
             self.logger.error(f"Ошибка при загрузке марок из базы данных: {e}")
             raise
+        finally:
+            # Соединения пула привязаны к циклу событий asyncio.run: закрываем их, чтобы
+            # не держать во время обхода и не переиспользовать в следующем asyncio.run
+            await engine.dispose()
         
     
     def refresh_cache(self) -> List[str]: